@@ -1 +1,4 @@
-from mimir_helpers import MimirMetadata, MimirDocumentHit, MimirDocumentToken, MimirResult, MimirHelper
\ No newline at end of file
+from .mimir_helpers import MimirMetadata, MimirDocumentHit, MimirDocumentToken, MimirDocumentTokens, MimirDocumentHits, MimirResult, MimirSnippet, MimirHelper
+from .mimir_cache import MimirDocumentCache, MimirQueryCache
+from .mimir_metrics import MimirMetrics
+from .mimir_governor import MimirGovernor, MimirRetry
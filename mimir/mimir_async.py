@@ -0,0 +1,338 @@
+"""
+	asyncio counterparts of MimirHelper and MimirResultSet.
+
+	Requires Python 3.7+ and aiohttp.
+"""
+import asyncio, io, time, weakref
+from collections import deque
+from contextlib import asynccontextmanager
+from urllib.parse import urljoin
+
+try:
+	import aiohttp
+except ImportError:
+	aiohttp = None
+
+from .mimir_helpers import MimirResult, _parseMessage, _parseValue, \
+	_parseMetadata, _parseHits, _parseTokens, _CallTimer, _QUERY_ID
+
+class AsyncMimirHelper(object):
+	def __init__(self, endpoint, timeout = None, concurrency = 100, session = None,
+			metrics = None):
+		"""
+			Creates an asyncio helper for the given search endpoint.
+
+			Requests are made through a non-blocking aiohttp session. No more than
+			concurrency requests are in flight at once, however many coroutines
+			are waiting on this helper.
+
+			Must be created from within a running event loop.
+
+			@param timeout total seconds to wait for each request, None waits forever
+			@param concurrency maximum number of requests in flight
+			@param session an existing aiohttp.ClientSession to use. It is not
+				closed by shutdown.
+			@param metrics a MimirMetrics to record every call in, as for MimirHelper
+		"""
+		if aiohttp is None:
+			raise ImportError("AsyncMimirHelper requires the aiohttp library")
+
+		self.endpoint = endpoint
+		self.timeout = aiohttp.ClientTimeout(total = timeout)
+		self.semaphore = asyncio.Semaphore(concurrency)
+		self.metrics = metrics
+
+		self.ownsSession = session is None
+		if session is None:
+			session = aiohttp.ClientSession(
+				connector = aiohttp.TCPConnector(limit = concurrency))
+		self.session = session
+
+	async def __aenter__(self):
+		return self
+
+	async def __aexit__(self, excType, excValue, traceback):
+		await self.shutdown()
+
+	async def shutdown(self):
+		"""
+			Closes the connections held by this helper.
+
+			Not to be confused with close, which releases a query on the server.
+		"""
+		if self.ownsSession:
+			await self.session.close()
+
+	async def __get(self, path, params, timer):
+		"""
+			Issues a GET against the endpoint and returns the raw response body.
+
+			@throws aiohttp.ClientError if there was a problem with the request,
+				including an error status
+		"""
+		params = {key: str(value) for key, value in params.items()}
+
+		async with self.semaphore:
+			timer.start = timer.opened = time.time()
+			async with self.session.get(urljoin(self.endpoint, path),
+					params = params, timeout = self.timeout) as response:
+				response.raise_for_status()
+				timer.opened = time.time()
+				content = await response.read()
+				timer.readSeconds = time.time() - timer.opened
+				timer.bytes = len(content)
+				return content
+
+	async def __fetch(self, path, params, parse):
+		"""
+			Issues a GET and returns parse applied to the raw response body,
+			recording the call in metrics. Time spent waiting for a free slot
+			under concurrency is not counted.
+		"""
+		timer = _CallTimer(path)
+		error = True
+		try:
+			value = parse(await self.__get(path, params, timer))
+			error = False
+			return value
+		finally:
+			if self.metrics is not None:
+				timer.record(self.metrics, error)
+
+	async def __queryMimir(self, path, **params):
+		"""
+			Runs a mimir query on the given path with the given parameters
+
+			@returns XML Element for the data field of the response
+
+			@throws aiohttp.ClientError if there was a problem with the request
+			@throws MimirException if there was a problem with the mimir query or
+					response could not be read
+			@throws xml.etree.ElementTree.ParseError if parse was not possible on response
+		"""
+		return await self.__fetch(path, params, lambda content: _parseMessage(io.BytesIO(content)))
+
+	async def wait(self, queryId):
+		"""Waits for the indicated query to finish."""
+		return await self.__queryMimir("documentsCountSync", queryId = queryId)
+
+	async def close(self, queryId):
+		"""Releases the given queryId"""
+		return await self.__queryMimir("close", queryId = queryId)
+
+	@asynccontextmanager
+	async def query(self, query):
+		"""
+			Posts a query in an async contextmanager that closes the query when
+			done, after closing any of its result iterators left open
+		"""
+		queryId = await self.postQuery(query)
+		resultSet = None
+		try:
+			await self.wait(queryId)
+			resultSet = AsyncMimirResultSet(self, queryId)
+			yield resultSet
+		finally:
+			if resultSet is not None:
+				await resultSet.closeIterators()
+			await self.close(queryId)
+
+	async def postQuery(self, query):
+		"""Starts a new query of the given value, and returns the queryId."""
+		result = await self.__queryMimir("postQuery", queryString = query)
+		return result.find(_QUERY_ID).text
+
+	async def documentsCurrentCount(self, queryId):
+		"""Asks Mimir how many results there are available."""
+		return _parseValue(await self.__queryMimir("documentsCurrentCount", queryId = queryId))
+
+	async def documentsCount(self, queryId):
+		"""Asks Mimir how many results there are in total. -1 if not completed."""
+		return _parseValue(await self.__queryMimir("documentsCount", queryId = queryId))
+
+	async def documentMetadata(self, queryId, rank, fieldNames = []):
+		"""Returns the metadata for the given document, including any additional fieldNames"""
+		if fieldNames != []:
+			result = await self.__queryMimir("documentMetadata", queryId = queryId,
+				rank = rank, fieldNames = ",".join(fieldNames))
+		else:
+			result = await self.__queryMimir("documentMetadata", queryId = queryId, rank = rank)
+
+		return _parseMetadata(result)
+
+	async def documentId(self, queryId, rank):
+		"""Returns the id for the given document"""
+		return _parseValue(await self.__queryMimir("documentId", queryId = queryId, rank = rank))
+
+	async def documentHits(self, queryId, rank):
+		"""Returns the hits for the given document"""
+		return _parseHits(await self.__queryMimir("documentHits", queryId = queryId, rank = rank))
+
+	async def documentTextTokens(self, queryId, rank, termPosition = 0, length = None):
+		"""Returns the text for the given document as series of MimirDocumentTokens"""
+		if length is not None:
+			result = await self.__queryMimir("documentText", queryId = queryId,
+				rank = rank, termPosition = termPosition, length = length)
+		else:
+			result = await self.__queryMimir("documentText", queryId = queryId,
+				rank = rank, termPosition = termPosition)
+
+		return _parseTokens(result)
+
+	async def documentText(self, queryId, rank, termPosition = 0, length = None):
+		"""Returns the text for the given document as a string"""
+		tokens = await self.documentTextTokens(queryId, rank, termPosition, length)
+		return tokens.text
+
+	async def renderDocument(self, queryId, rank):
+		"""Returns the HTML for the result text of the given document as a string"""
+		return await self.__fetch("renderDocument", {"queryId": queryId, "rank": rank},
+			lambda content: content.decode("utf-8"))
+
+	async def renderDocumentById(self, documentId):
+		"""Returns the HTML for the entire document by Id"""
+		return await self.__fetch("renderDocument", {"documentId": documentId},
+			lambda content: content.decode("utf-8"))
+
+	async def metadata(self, query, fieldNames = [], window = 16):
+		"""Returns an async iterable for the query which yields the selected metadata."""
+		async with self.query(query) as resultSet:
+			async for result in resultSet.metadata(fieldNames, window):
+				yield result
+
+	async def ids(self, query, window = 16):
+		"""Returns an async iterable for the query which yields the document IDs."""
+		async with self.query(query) as resultSet:
+			async for result in resultSet.ids(window):
+				yield result
+
+	async def results(self, query, metadataFieldNames = [], window = 16):
+		"""Returns an async iterable for the query which yields the complete results objects."""
+		async with self.query(query) as resultSet:
+			async for result in resultSet.results(metadataFieldNames, window):
+				yield result
+
+async def _fetchInOrder(fetchers, ranks, window):
+	"""
+		Async counterpart of mimir_helpers._fetchInOrder. Runs every fetcher
+		against every rank as tasks, with at most window ranks in flight, and
+		yields a tuple of fetched values per rank in rank order.
+	"""
+	window = max(window, 1)
+	pending = deque()
+	try:
+		for rank in ranks:
+			pending.append(asyncio.gather(*[fetcher(rank) for fetcher in fetchers]))
+			if len(pending) >= window:
+				yield tuple(await pending.popleft())
+
+		while pending:
+			yield tuple(await pending.popleft())
+	finally:
+		for future in pending:
+			future.cancel()
+		# Retrieve the cancelled results, so that none are reported as lost
+		await asyncio.gather(*pending, return_exceptions = True)
+
+class AsyncMimirResultSet(object):
+	def __init__(self, mimirHelper, queryId):
+		self.mimirHelper = mimirHelper
+		self.queryId = queryId
+		self.iterators = weakref.WeakSet()
+
+	async def close(self):
+		"""Releases the query"""
+		return await self.mimirHelper.close(self.queryId)
+
+	def __track(self, iterator):
+		"""Remembers iterator, so that closeIterators can close it"""
+		self.iterators.add(iterator)
+		return iterator
+
+	async def closeIterators(self):
+		"""
+			Closes every result iterator of this result set that is still open,
+			cancelling the fetches they have in flight
+		"""
+		for iterator in list(self.iterators):
+			await iterator.aclose()
+
+	async def documentsCurrentCount(self):
+		"""Asks Mimir how many results there are available."""
+		return await self.mimirHelper.documentsCurrentCount(self.queryId)
+
+	async def documentsCount(self):
+		"""Asks Mimir how many results there are in total. -1 if not completed."""
+		return await self.mimirHelper.documentsCount(self.queryId)
+
+	async def documentMetadata(self, rank, fieldNames = []):
+		"""Returns the metadata for the given document, including any additional fieldNames"""
+		return await self.mimirHelper.documentMetadata(self.queryId, rank, fieldNames)
+
+	async def documentId(self, rank):
+		"""Returns the id for the given document"""
+		return await self.mimirHelper.documentId(self.queryId, rank)
+
+	async def documentHits(self, rank):
+		"""Returns the hits for the given document"""
+		return await self.mimirHelper.documentHits(self.queryId, rank)
+
+	async def documentTextTokens(self, rank, termPosition = 0, length = None):
+		"""Returns the text for the given document as series of MimirDocumentTokens"""
+		return await self.mimirHelper.documentTextTokens(self.queryId, rank, termPosition, length)
+
+	async def documentText(self, rank, termPosition = 0, length = None):
+		"""Returns the text for the given document as a string"""
+		return await self.mimirHelper.documentText(self.queryId, rank, termPosition, length)
+
+	async def renderDocument(self, rank):
+		"""Returns the HTML for the result text of the given document as a string"""
+		return await self.mimirHelper.renderDocument(self.queryId, rank)
+
+	def metadata(self, fieldNames = [], window = 16):
+		"""
+			Returns an async iterable for the query which yields the selected metadata.
+
+			Up to window ranks are fetched concurrently.
+		"""
+		return self.__track(self.__metadata(fieldNames, window))
+
+	async def __metadata(self, fieldNames, window):
+		fetchers = [lambda rank: self.documentMetadata(rank, fieldNames)]
+		async for (metadata,) in _fetchInOrder(fetchers,
+				range(0, await self.documentsCount()), window):
+			yield metadata
+
+	def ids(self, window = 16):
+		"""
+			Returns an async iterable for the query which yields the document IDs.
+
+			Up to window ranks are fetched concurrently.
+		"""
+		return self.__track(self.__ids(window))
+
+	async def __ids(self, window):
+		async for (documentId,) in _fetchInOrder([self.documentId],
+				range(0, await self.documentsCount()), window):
+			yield documentId
+
+	def results(self, metadataFieldNames = [], window = 16):
+		"""
+			Returns an async iterable for the query which yields the complete results objects.
+
+			The metadata, id, text and hits of up to window ranks are fetched
+			concurrently. Results are yielded in rank order.
+		"""
+		return self.__track(self.__results(metadataFieldNames, window))
+
+	async def __results(self, metadataFieldNames, window):
+		fetchers = [lambda rank: self.documentMetadata(rank, metadataFieldNames),
+					self.documentId,
+					self.documentTextTokens,
+					self.documentHits]
+		async for parts in _fetchInOrder(fetchers,
+				range(0, await self.documentsCount()), window):
+			yield MimirResult(*parts)
+
+	def __aiter__(self):
+		return self.results()
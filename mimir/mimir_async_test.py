@@ -0,0 +1,81 @@
+import asyncio, gc, unittest
+from mimir.mimir_async import *
+from mimir.mimir_fake import MimirFakeServer
+from mimir.mimir_helpers import MimirException, MimirResult
+
+class TestAsyncMimirHelpers(unittest.IsolatedAsyncioTestCase):
+	async def asyncSetUp(self):
+		self.fake = MimirFakeServer(documents=20)
+		self.mimir = AsyncMimirHelper(self.fake.start(), concurrency=8)
+
+	async def asyncTearDown(self):
+		await self.mimir.shutdown()
+		self.fake.shutdown()
+
+	async def testPostQueryValid(self):
+		queryId = await self.mimir.postQuery("{UserID}")
+		self.assertIsInstance(queryId, str)
+		self.assertNotEqual(len(queryId), 0)
+		await self.mimir.close(queryId)
+		self.assertEqual(self.fake.queries, {})
+
+	async def testPostQueryInvalid(self):
+		with self.assertRaises(MimirException):
+			await self.mimir.postQuery("{UserID")
+
+	async def testQuery(self):
+		async with self.mimir.query("{UserID}") as resultSet:
+			self.assertEqual(await resultSet.documentsCount(), 20)
+		self.assertEqual(self.fake.queries, {})
+
+	async def testIterateResultsSet(self):
+		async with self.mimir.query("{Hashtag}") as resultSet:
+			ids = [await resultSet.documentId(rank) for rank in range(10)]
+			seen = []
+			async for result in resultSet:
+				self.assertIsInstance(result, MimirResult)
+				seen.append(result.documentId)
+				if len(seen) == 10:
+					break
+			self.assertEqual(ids, seen)
+			self.assertEqual(ids, [self.fake.documentIdAt(rank) for rank in range(10)])
+
+class TestAsyncMimirFakeServer(unittest.IsolatedAsyncioTestCase):
+	async def asyncSetUp(self):
+		self.fake = MimirFakeServer(documents=100, latency=0.01)
+		self.fake.start()
+		self.mimir = AsyncMimirHelper(self.fake.endpoint, concurrency=8)
+		self.errors = []
+		asyncio.get_running_loop().set_exception_handler(
+			lambda loop, context: self.errors.append(context))
+
+	async def asyncTearDown(self):
+		await self.mimir.shutdown()
+		self.fake.shutdown()
+
+	async def testResults(self):
+		async with self.mimir.query("{Hashtag}") as resultSet:
+			ids = [result.documentId async for result in resultSet.results(window=8)]
+		self.assertEqual(ids, [self.fake.documentIdAt(rank) for rank in range(100)])
+		self.assertEqual(self.fake.queries, {})
+
+	async def testOpenIteratorsClosedWithQuery(self):
+		async with self.mimir.query("{Hashtag}") as resultSet:
+			iterator = resultSet.results(window=16)
+			await iterator.__anext__()
+		with self.assertRaises(StopAsyncIteration):
+			await iterator.__anext__()
+		self.assertEqual(self.fake.queries, {})
+
+		gc.collect()
+		await asyncio.sleep(0.05)
+		self.assertEqual(self.errors, [])
+
+	async def testErrorStatus(self):
+		async with self.mimir.query("{Hashtag}") as resultSet:
+			self.fake.errorRate = 1.0
+			with self.assertRaises(aiohttp.ClientResponseError):
+				await resultSet.documentId(0)
+
+if __name__ == '__main__':
+    unittest.main()
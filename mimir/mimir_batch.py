@@ -0,0 +1,132 @@
+import threading
+try:
+	from Queue import Queue
+except ImportError:
+	from queue import Queue
+from array import array
+from multiprocessing.pool import ThreadPool
+
+from .mimir_helpers import MimirHelper, MimirException
+
+FETCHES = ("count", "ids", "metadata", "results")
+
+class MimirBatch(object):
+	"""
+		Runs many queries against one Mimir server concurrently.
+
+		Each query is posted, waited for, fetched and closed by one of
+		maxOpenQueries worker threads, so no more than maxOpenQueries queries
+		are open on the server at once, while the posting, searching and
+		fetching of different queries overlap. Every query is closed once
+		fetched, failed or cancelled.
+
+		Use as a context manager, or call shutdown when done, which cancels
+		whatever has not finished.
+	"""
+	def __init__(self, helper, maxOpenQueries = 8):
+		"""
+			@param helper a MimirHelper, or the endpoint to make one for, which 
+				is shut down with the batch
+			@param maxOpenQueries number of queries open on the server at once
+		"""
+		self.ownsHelper = not isinstance(helper, MimirHelper)
+		if self.ownsHelper:
+			helper = MimirHelper(helper, poolMaxsize = maxOpenQueries)
+		self.helper = helper
+		self.pool = ThreadPool(maxOpenQueries)
+		self.cancelled = threading.Event()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, excType, excValue, traceback):
+		self.shutdown()
+
+	def cancel(self):
+		"""
+			Stops every query that has not finished. Queries not yet started are
+			never posted, and running ones stop between results and are closed.
+		"""
+		self.cancelled.set()
+
+	def shutdown(self):
+		"""
+			Cancels whatever has not finished, and waits for every query to be 
+			closed. A helper made by the batch is shut down too.
+		"""
+		self.cancel()
+		self.pool.close()
+		self.pool.join()
+		if self.ownsHelper:
+			self.helper.shutdown()
+
+	def __check(self, fetch, kwargs):
+		if fetch not in FETCHES:
+			raise ValueError("Unknown fetch %r, expected one of %r" % (fetch, FETCHES))
+		if kwargs.get("fields") is not None:
+			raise ValueError("Projected results cannot be fetched once their query is closed")
+
+	def __checkCancelled(self, stopped):
+		if self.cancelled.is_set() or (stopped is not None and stopped.is_set()):
+			raise MimirException("Batch cancelled")
+
+	def __run(self, query, fetch, kwargs, stopped = None):
+		self.__checkCancelled(stopped)
+		with self.helper.query(query) as resultSet:
+			if fetch == "count":
+				return resultSet.documentsCount()
+
+			items = array("l") if fetch == "ids" else []
+			for item in getattr(resultSet, fetch)(**kwargs):
+				self.__checkCancelled(stopped)
+				items.append(item)
+			return items
+
+	def submit(self, query, fetch = "count", **kwargs):
+		"""
+			Queues a query, and returns a multiprocessing AsyncResult whose get
+			returns its total count, or all its ids, metadata or results, and
+			raises whatever the query raised.
+
+			@param fetch what to fetch for the query, one of FETCHES
+			@param kwargs passed to the MimirResultSet method for fetch, eg
+				workers to also fetch the ranks of each query concurrently
+		"""
+		self.__check(fetch, kwargs)
+		return self.pool.apply_async(self.__run, (query, fetch, kwargs))
+
+	def run(self, queries, fetch = "count", ordered = False, **kwargs):
+		"""
+			Runs every query, and returns an iterable which yields (query, value,
+			error) for each, where value is as for submit, or error is the
+			exception the query failed with.
+
+			Stopping the iteration early cancels the queries it has not yielded.
+
+			@param ordered whether to yield in the order of queries, rather than
+				as each finishes
+		"""
+		self.__check(fetch, kwargs)
+		stopped = threading.Event()
+		finished = Queue()
+
+		def run(query):
+			try:
+				outcome = (query, self.__run(query, fetch, kwargs, stopped), None)
+			except Exception as e:
+				outcome = (query, None, e)
+			finished.put(outcome)
+			return outcome
+
+		pending = [self.pool.apply_async(run, (query,)) for query in queries]
+		try:
+			if ordered:
+				for result in pending:
+					yield result.get()
+			else:
+				for _ in pending:
+					yield finished.get()
+		finally:
+			stopped.set()
+			for result in pending:
+				result.wait()
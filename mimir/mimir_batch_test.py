@@ -0,0 +1,65 @@
+import unittest
+from mimir.mimir_batch import *
+from mimir.mimir_fake import MimirFakeServer
+from mimir.mimir_helpers import MimirHelper, MimirException
+
+class TestMimirBatch(unittest.TestCase):
+	def setUp(self):
+		self.fake = MimirFakeServer(documents=10, searchTime=0.05)
+		self.fake.start()
+		self.batch = MimirBatch(self.fake.endpoint, maxOpenQueries=4)
+
+	def tearDown(self):
+		self.batch.shutdown()
+		self.fake.shutdown()
+
+	def testRunCounts(self):
+		queries = ["{Token%d}" % i for i in range(10)] + ["{Token"]
+		outcomes = list(self.batch.run(queries))
+		self.assertEqual(sorted(query for query, value, error in outcomes), sorted(queries))
+		for query, value, error in outcomes:
+			if query == "{Token":
+				self.assertIsInstance(error, MimirException)
+			else:
+				self.assertIsNone(error)
+				self.assertEqual(value, 10)
+		self.assertEqual(self.fake.queries, {})
+
+	def testRunOrderedResults(self):
+		queries = ["{Token%d}" % i for i in range(5)]
+		outcomes = list(self.batch.run(queries, "results", ordered=True, workers=2))
+		self.assertEqual([query for query, value, error in outcomes], queries)
+		self.assertEqual(len(outcomes[0][1]), 10)
+		self.assertTrue(outcomes[0][1][0].text)
+
+	def testSubmit(self):
+		ids = self.batch.submit("{Token}", "ids")
+		count = self.batch.submit("{Token}")
+		self.assertEqual(len(ids.get()), 10)
+		self.assertEqual(count.get(), 10)
+		with self.assertRaises(MimirException):
+			self.batch.submit("{Token").get()
+		with self.assertRaises(ValueError):
+			self.batch.submit("{Token}", "hits")
+
+	def testStopEarlyClosesQueries(self):
+		outcomes = self.batch.run(["{Token%d}" % i for i in range(20)], "metadata")
+		next(outcomes)
+		outcomes.close()
+		self.assertEqual(self.fake.queries, {})
+		self.assertEqual(self.batch.submit("{Token}").get(), 10)
+
+	def testShutdownOwnedHelperOnly(self):
+		shutdowns = []
+		self.batch.helper.shutdown = lambda: shutdowns.append("owned")
+		self.batch.shutdown()
+		self.assertEqual(shutdowns, ["owned"])
+
+		helper = MimirHelper(self.fake.endpoint)
+		helper.shutdown = lambda: shutdowns.append("given")
+		with MimirBatch(helper) as batch:
+			self.assertEqual(batch.submit("{Token}").get(), 10)
+		self.assertEqual(shutdowns, ["owned"])
+
+if __name__ == '__main__':
+    unittest.main()
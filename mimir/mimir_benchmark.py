@@ -0,0 +1,233 @@
+"""
+	Benchmarks of MimirHelper against a local MimirFakeServer.
+
+	Measures documents per second, time to the first result and peak memory
+	of iterating a query's ids, metadata, results and document text, for
+	each corpus size. Results can be saved as a baseline, and later runs
+	compared against it:
+
+		python -m mimir.mimir_benchmark --save baseline.json
+		python -m mimir.mimir_benchmark --baseline baseline.json
+
+	The second form exits with status 1 if anything regressed.
+
+	--decode instead times the CPU cost of decoding documentText and
+	documentHits responses, with each installed XML backend.
+"""
+import argparse, io, json, multiprocessing, sys, time
+try:
+	import tracemalloc
+except ImportError:
+	tracemalloc = None
+
+from . import mimir_helpers
+from .mimir_helpers import MimirHelper, _fetchInOrder, _iterData, _packTokens, _packHits, \
+	_parseMessage
+from .mimir_fake import MimirFakeServer
+
+OPERATIONS = ("ids", "metadata", "results", "documentText")
+
+QUERY = "{Token}"
+
+_cpuTime = getattr(time, "process_time", time.clock if hasattr(time, "clock") else time.time)
+
+def _serve(options, endpoints):
+	fake = MimirFakeServer(**options)
+	endpoints.put(fake.start())
+	while True:
+		time.sleep(3600)
+
+def _startServer(options):
+	"""
+		Starts a MimirFakeServer in a separate process, so that it does not
+		compete with the client for the interpreter or show in its memory.
+
+		@returns the process and the endpoint
+	"""
+	endpoints = multiprocessing.Queue()
+	process = multiprocessing.Process(target = _serve, args = (options, endpoints))
+	process.daemon = True
+	process.start()
+	return process, endpoints.get(timeout = 30)
+
+def _iterate(helper, operation, workers):
+	if operation == "documentText":
+		with helper.query(QUERY) as resultSet:
+			count = int(resultSet.documentsCount())
+			for rank, (text,) in _fetchInOrder([resultSet.documentText], range(count), workers):
+				yield text
+	else:
+		for item in getattr(helper, operation)(QUERY, workers = workers):
+			yield item
+
+def _run(helper, operation, workers):
+	"""Returns the documents iterated, total seconds and seconds to the first document"""
+	start = time.time()
+	first = None
+	documents = 0
+	for item in _iterate(helper, operation, workers):
+		if first is None:
+			first = time.time() - start
+		documents += 1
+	return documents, time.time() - start, first
+
+def benchmark(endpoint, operation, workers = 4):
+	"""
+		Times one operation against the endpoint.
+
+		The operation is run twice: once for time, and once to measure the
+		peak memory allocated while it runs, as tracing allocations slows it
+		down. Peak memory needs tracemalloc, and is None without it.
+
+		@param operation one of OPERATIONS
+		@returns dict of documents, seconds, docsPerSecond, firstResultSeconds
+			and peakBytes
+	"""
+	if operation not in OPERATIONS:
+		raise ValueError("Unknown operation %r, expected one of %r" % (operation, OPERATIONS))
+
+	with MimirHelper(endpoint, poolMaxsize = workers) as helper:
+		documents, seconds, first = _run(helper, operation, workers)
+
+		peakBytes = None
+		if tracemalloc is not None:
+			tracemalloc.start()
+			try:
+				_run(helper, operation, workers)
+				peakBytes = tracemalloc.get_traced_memory()[1]
+			finally:
+				tracemalloc.stop()
+
+	return {"documents": documents, "seconds": seconds,
+		"docsPerSecond": documents / seconds if seconds else 0.0,
+		"firstResultSeconds": first, "peakBytes": peakBytes}
+
+def run(sizes = (100, 1000), operations = OPERATIONS, workers = 4, latency = 0.0,
+		documentLength = 200):
+	"""
+		Benchmarks every operation for every corpus size, each size served by
+		its own fake server.
+
+		@param latency seconds the fake server adds to every response
+		@returns dict of "operation/size" to the results of benchmark
+	"""
+	results = {}
+	for size in sizes:
+		process, endpoint = _startServer({"documents": size, "latency": latency,
+			"documentLength": documentLength})
+		try:
+			for operation in operations:
+				results["%s/%d" % (operation, size)] = benchmark(endpoint, operation, workers)
+		finally:
+			process.terminate()
+			process.join()
+	return results
+
+def decode(documentLength = 200, hitsPerDocument = 20, repeat = 500, backends = None):
+	"""
+		Times the CPU cost of decoding one documentText and one documentHits
+		response, as MimirHelper does, without any network traffic.
+
+		@param backends names of the XML backends to time, defaults to all
+			those installed
+		@returns dict of "path/backend" to CPU seconds per response
+	"""
+	fake = MimirFakeServer(documentLength = documentLength, hitsPerDocument = hitsPerDocument)
+	queryId = _parseMessage(io.BytesIO(fake.postQuery({"queryString": QUERY}))).find(
+		mimir_helpers._QUERY_ID).text
+	params = {"queryId": queryId, "rank": "0"}
+	responses = {
+		"documentText": (fake.documentText(params), _packTokens),
+		"documentHits": (fake.documentHits(params), _packHits),
+	}
+
+	current = mimir_helpers.xmlBackend()
+	results = {}
+	try:
+		for backend in backends or sorted(mimir_helpers.XML_BACKENDS):
+			mimir_helpers.setXmlBackend(backend)
+			for path, (body, pack) in sorted(responses.items()):
+				start = _cpuTime()
+				for _ in range(repeat):
+					pack(_iterData(io.BytesIO(body)))
+				results["%s/%s" % (path, backend)] = (_cpuTime() - start) / repeat
+	finally:
+		mimir_helpers.setXmlBackend(current)
+	return results
+
+def compare(results, baseline, tolerance = 0.25, slack = 0.005):
+	"""
+		Compares benchmark results against a baseline from an earlier run.
+
+		@param tolerance fraction by which a measure may be worse than its
+			baseline before it counts as a regression
+		@param slack seconds of noise allowed on top of the tolerance for
+			time to the first result, which is very short on a local server
+		@returns list of messages describing each regression, empty if none
+	"""
+	regressions = []
+	for key in sorted(results):
+		if key not in baseline:
+			continue
+		current, base = results[key], baseline[key]
+
+		if current["docsPerSecond"] < base["docsPerSecond"] * (1 - tolerance):
+			regressions.append("%s: %.1f documents/second, baseline %.1f" %
+				(key, current["docsPerSecond"], base["docsPerSecond"]))
+
+		if (current["firstResultSeconds"] is not None and base["firstResultSeconds"] is not None and
+				current["firstResultSeconds"] > base["firstResultSeconds"] * (1 + tolerance) + slack):
+			regressions.append("%s: %.4fs to first result, baseline %.4fs" %
+				(key, current["firstResultSeconds"], base["firstResultSeconds"]))
+
+		if (current["peakBytes"] is not None and base["peakBytes"] is not None and
+				current["peakBytes"] > base["peakBytes"] * (1 + tolerance)):
+			regressions.append("%s: %d bytes peak memory, baseline %d" %
+				(key, current["peakBytes"], base["peakBytes"]))
+	return regressions
+
+def main(args = None):
+	"""Command line entry point for run"""
+	parser = argparse.ArgumentParser(description = "Benchmark the Mimir client against a local fake server")
+	parser.add_argument("--sizes", default = "100,1000", help = "comma separated corpus sizes (default: %(default)s)")
+	parser.add_argument("--operations", default = ",".join(OPERATIONS),
+		help = "comma separated operations to run (default: %(default)s)")
+	parser.add_argument("--workers", type = int, default = 4)
+	parser.add_argument("--latency", type = float, default = 0.0, help = "seconds added to every response")
+	parser.add_argument("--document-length", type = int, default = 200)
+	parser.add_argument("--baseline", help = "JSON results of an earlier run to compare against")
+	parser.add_argument("--tolerance", type = float, default = 0.25)
+	parser.add_argument("--save", help = "file to save the results to, as a new baseline")
+	parser.add_argument("--decode", action = "store_true",
+		help = "time decoding responses with each XML backend instead")
+	options = parser.parse_args(args)
+
+	if options.decode:
+		results = decode(options.document_length)
+		for key in sorted(results):
+			print("%-24s %10.1f us/response" % (key, results[key] * 1e6))
+		return
+
+	results = run([int(size) for size in options.sizes.split(",") if size],
+		[operation for operation in options.operations.split(",") if operation],
+		options.workers, options.latency, options.document_length)
+
+	for key in sorted(results):
+		result = results[key]
+		print("%-20s %10.1f docs/s %8.4fs first %12s bytes peak" % (key, result["docsPerSecond"],
+			result["firstResultSeconds"] or 0.0, result["peakBytes"]))
+
+	if options.save:
+		with open(options.save, "w") as f:
+			json.dump(results, f, indent = 2, sort_keys = True)
+
+	if options.baseline:
+		with open(options.baseline) as f:
+			regressions = compare(results, json.load(f), options.tolerance)
+		for regression in regressions:
+			print("REGRESSION " + regression)
+		if regressions:
+			sys.exit(1)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,71 @@
+import unittest
+from mimir.mimir_benchmark import *
+from mimir.mimir_fake import MimirFakeServer
+from mimir.mimir_helpers import MimirHelper, MimirException, XML_BACKENDS
+
+class TestMimirFakeServer(unittest.TestCase):
+	def setUp(self):
+		self.fake = MimirFakeServer(documents=20, documentLength=30, metadataFields=("author",))
+		self.mimir = MimirHelper(self.fake.start())
+
+	def tearDown(self):
+		self.mimir.shutdown()
+		self.fake.shutdown()
+
+	def testResults(self):
+		with self.mimir.query("{Token}") as resultSet:
+			self.assertEqual(resultSet.documentsCount(), 20)
+			results = list(resultSet.results(["author"], workers=4))
+		self.assertEqual(len(results), 20)
+		self.assertEqual(len(set(result.documentId for result in results)), 20)
+		self.assertEqual(results[3].documentId, self.fake.documentIdAt(3))
+		self.assertEqual(results[3].text, u" ".join(self.fake.words(results[3].documentId)))
+		self.assertEqual(len(results[3].hits), 2)
+		self.assertIn("author", results[3].metadata.metadata)
+
+	def testPartialText(self):
+		with self.mimir.query("{Token}") as resultSet:
+			tokens = resultSet.documentTextTokens(0, termPosition=5, length=3)
+		self.assertEqual([token.position for token in tokens if not token.isSpace], [5, 6, 7])
+
+	def testErrors(self):
+		with self.assertRaises(MimirException):
+			self.mimir.postQuery("{Token")
+		with self.assertRaises(MimirException):
+			self.mimir.documentId("unknown", 0)
+		with self.mimir.query("{Token}") as resultSet:
+			with self.assertRaises(MimirException):
+				resultSet.documentId(20)
+		self.assertEqual(self.fake.queries, {})
+
+	def testSearchTime(self):
+		self.fake.searchTime = 0.5
+		with self.mimir.query("{Token}", wait=False) as resultSet:
+			self.assertEqual(resultSet.documentsCount(), -1)
+			self.assertEqual(len(list(resultSet.ids(stream=True))), 20)
+
+class TestMimirBenchmark(unittest.TestCase):
+	def testBenchmark(self):
+		with MimirFakeServer(documents=10, documentLength=20) as fake:
+			for operation in OPERATIONS:
+				result = benchmark(fake.endpoint, operation, workers=2)
+				self.assertEqual(result["documents"], 10)
+				self.assertGreater(result["docsPerSecond"], 0)
+				self.assertGreater(result["firstResultSeconds"], 0)
+
+	def testDecode(self):
+		results = decode(documentLength=20, hitsPerDocument=2, repeat=2)
+		self.assertEqual(sorted(results), sorted("%s/%s" % (path, backend)
+			for path in ("documentText", "documentHits") for backend in XML_BACKENDS))
+
+	def testCompare(self):
+		baseline = {"ids/100": {"docsPerSecond": 1000.0, "firstResultSeconds": 0.01, "peakBytes": 1000}}
+		self.assertEqual(compare(baseline, baseline), [])
+		slower = {"ids/100": {"docsPerSecond": 500.0, "firstResultSeconds": 0.01, "peakBytes": 2000},
+			"ids/1000": {"docsPerSecond": 1.0, "firstResultSeconds": 1.0, "peakBytes": None}}
+		regressions = compare(slower, baseline)
+		self.assertEqual(len(regressions), 2)
+		self.assertTrue(all(regression.startswith("ids/100:") for regression in regressions))
+
+if __name__ == '__main__':
+    unittest.main()
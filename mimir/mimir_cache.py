@@ -0,0 +1,308 @@
+import os, threading, hashlib, tempfile, time
+try:
+	import cPickle as pickle
+except ImportError:
+	import pickle
+from collections import OrderedDict
+
+class MimirDocumentCache(object):
+	"""
+		Cache of per-document data, such as text and metadata, for MimirHelper.
+
+		Keys are tuples whose second item is the documentId, eg
+		("text", documentId) or ("metadata", documentId, fieldNames). Entries
+		are kept in a bounded in-memory LRU tier, and optionally also pickled
+		to files in a directory so they survive between processes.
+
+		Any object with the same get, put and invalidate methods can be given
+		to MimirHelper instead.
+
+		Safe to share between threads.
+	"""
+	def __init__(self, maxEntries = 1000, directory = None):
+		"""
+			@param maxEntries number of entries kept in memory
+			@param directory where to keep the on-disk tier, None for memory only
+		"""
+		self.maxEntries = maxEntries
+		self.directory = directory
+		self.entries = OrderedDict()
+		self.lock = threading.Lock()
+		self.hits = 0
+		self.diskHits = 0
+		self.misses = 0
+
+		if directory is not None and not os.path.isdir(directory):
+			os.makedirs(directory)
+
+	def __path(self, key):
+		digest = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+		return os.path.join(self.directory, "%s-%s.pickle" % (key[1], digest))
+
+	def __remember(self, key, value):
+		"""Adds to the memory tier, evicting the least recently used. Needs the lock."""
+		self.entries.pop(key, None)
+		self.entries[key] = value
+		while len(self.entries) > self.maxEntries:
+			self.entries.popitem(last = False)
+
+	def get(self, key):
+		"""Returns the cached value for key, or None if it is not cached"""
+		with self.lock:
+			if key in self.entries:
+				value = self.entries.pop(key)
+				self.entries[key] = value
+				self.hits += 1
+				return value
+
+		if self.directory is not None:
+			try:
+				with open(self.__path(key), "rb") as f:
+					value = pickle.load(f)
+			except (IOError, OSError, EOFError, pickle.UnpicklingError):
+				pass
+			else:
+				with self.lock:
+					self.__remember(key, value)
+					self.hits += 1
+					self.diskHits += 1
+				return value
+
+		with self.lock:
+			self.misses += 1
+		return None
+
+	def put(self, key, value):
+		"""Caches value under key"""
+		with self.lock:
+			self.__remember(key, value)
+
+		if self.directory is not None:
+			handle, tempPath = tempfile.mkstemp(dir = self.directory)
+			with os.fdopen(handle, "wb") as f:
+				pickle.dump(value, f, pickle.HIGHEST_PROTOCOL)
+			os.rename(tempPath, self.__path(key))
+
+	def invalidate(self, documentId = None):
+		"""Drops everything cached for documentId, or the whole cache if None"""
+		with self.lock:
+			if documentId is None:
+				self.entries.clear()
+			else:
+				for key in [k for k in self.entries if k[1] == documentId]:
+					del self.entries[key]
+
+		if self.directory is not None:
+			prefix = None if documentId is None else "%s-" % documentId
+			for name in os.listdir(self.directory):
+				if name.endswith(".pickle") and (prefix is None or name.startswith(prefix)):
+					try:
+						os.remove(os.path.join(self.directory, name))
+					except OSError:
+						pass
+
+	def stats(self):
+		"""Returns a dict of hit and miss counts and the number of entries in memory"""
+		with self.lock:
+			return {"hits": self.hits, "diskHits": self.diskHits,
+				"misses": self.misses, "entries": len(self.entries)}
+
+class MimirQueryResults(object):
+	"""
+		The completed results of a query: the documentId at every rank and, 
+		if they were kept, the hits of every rank.
+	"""
+	__slots__ = ("documentIds", "hits", "created")
+
+	def __init__(self, documentIds, hits = None):
+		self.documentIds = documentIds
+		self.hits = hits
+		self.created = time.time()
+
+	@property
+	def count(self):
+		return len(self.documentIds)
+
+class MimirQueryHandle(object):
+	"""A live server-side query shared between users of a MimirQueryCache"""
+	__slots__ = ("key", "queryId", "refs", "waited", "lastUsed", "lock")
+
+	def __init__(self, key):
+		self.key = key
+		self.queryId = None
+		self.refs = 0
+		self.waited = False
+		self.lastUsed = time.time()
+		self.lock = threading.Lock()
+
+class MimirQueryCache(object):
+	"""
+		Opt-in cache of repeated queries for MimirHelper.
+
+		Keeps the completed results of recently seen query strings, so that 
+		iterating the ids of a query again needs no requests, for up to ttl 
+		seconds and maxQueries queries.
+
+		With handleTtl set, the server-side queryId of each query is also kept 
+		open and shared by everyone running the same query string. Handles are 
+		reference counted, and are closed in the background once they have 
+		been unused for handleTtl seconds or are evicted by maxHandles.
+
+		Query strings are normalised by collapsing whitespace.
+
+		Safe to share between threads.
+	"""
+	def __init__(self, maxQueries = 100, ttl = 600, cacheHits = False, 
+			handleTtl = None, maxHandles = 10):
+		"""
+			@param maxQueries number of completed queries to keep
+			@param ttl seconds to keep completed queries, None for ever
+			@param cacheHits whether to keep the hits of every rank as well as ids
+			@param handleTtl seconds to keep unused queryIds open, None to close 
+				them as soon as they are released
+			@param maxHandles number of unused queryIds to keep open
+		"""
+		self.maxQueries = maxQueries
+		self.ttl = ttl
+		self.cacheHits = cacheHits
+		self.handleTtl = handleTtl
+		self.maxHandles = maxHandles
+
+		self.results = OrderedDict()
+		self.handles = {}
+		self.lock = threading.Lock()
+		self.hits = 0
+		self.misses = 0
+		self.handlesReused = 0
+
+	@staticmethod
+	def normalise(query):
+		return u" ".join(query.split())
+
+	def getResults(self, query):
+		"""Returns the MimirQueryResults for query, or None if not cached or expired"""
+		key = self.normalise(query)
+		with self.lock:
+			results = self.results.pop(key, None)
+			if results is not None and (self.ttl is None or 
+					time.time() - results.created < self.ttl):
+				self.results[key] = results
+				self.hits += 1
+				return results
+
+			self.misses += 1
+			return None
+
+	def putResults(self, query, documentIds, hits = None):
+		"""
+			Caches the completed results of query, evicting the oldest if full.
+
+			@param documentIds the documentId at every rank
+			@param hits the hits at every rank, dropped unless cacheHits is set
+			@returns the MimirQueryResults cached
+		"""
+		key = self.normalise(query)
+		results = MimirQueryResults(documentIds, hits if self.cacheHits else None)
+		with self.lock:
+			self.results.pop(key, None)
+			self.results[key] = results
+			while len(self.results) > self.maxQueries:
+				self.results.popitem(last = False)
+		return results
+
+	def acquire(self, query, post):
+		"""
+			Returns a MimirQueryHandle for query, calling post(query) to start a 
+			new server-side query if no handle is open. Every acquire must be 
+			matched by a release.
+		"""
+		key = self.normalise(query)
+		with self.lock:
+			handle = self.handles.get(key)
+			if handle is None:
+				handle = self.handles[key] = MimirQueryHandle(key)
+			handle.refs += 1
+
+		try:
+			with handle.lock:
+				if handle.queryId is None:
+					handle.queryId = post(query)
+				else:
+					with self.lock:
+						self.handlesReused += 1
+		except Exception:
+			self.release(handle, None)
+			raise
+
+		return handle
+
+	def release(self, handle, close):
+		"""
+			Gives back a handle taken by acquire. Once no one is using it, 
+			close(queryId) is called straight away if the handle is not being 
+			kept, letting any error propagate, or else in the background when it 
+			expires or is evicted.
+		"""
+		key = handle.key
+		with self.lock:
+			handle.refs -= 1
+			handle.lastUsed = time.time()
+			if handle.refs > 0:
+				return
+
+			closeNow = None
+			expired = []
+			if self.handles.get(key) is not handle:
+				closeNow = handle
+			elif handle.queryId is None or not self.handleTtl:
+				closeNow = self.handles.pop(key)
+			else:
+				idle = sorted((h.lastUsed, k) for k, h in self.handles.items() if h.refs == 0)
+				for lastUsed, idleKey in idle[:max(len(idle) - self.maxHandles, 0)]:
+					expired.append(self.handles.pop(idleKey))
+				timer = threading.Timer(self.handleTtl, self.__expire, (key, handle, close))
+				timer.daemon = True
+				timer.start()
+
+		for idleHandle in expired:
+			self.__closeInBackground(idleHandle, close)
+		if closeNow is not None and closeNow.queryId is not None and close is not None:
+			close(closeNow.queryId)
+
+	def __expire(self, key, handle, close):
+		with self.lock:
+			if (self.handles.get(key) is not handle or handle.refs > 0 or 
+					time.time() - handle.lastUsed < self.handleTtl):
+				return
+			del self.handles[key]
+		self.__closeInBackground(handle, close)
+
+	def __closeInBackground(self, handle, close):
+		"""Closes an idle handle's queryId on a background thread, ignoring failures"""
+		if handle.queryId is None or close is None:
+			return
+
+		def closeQuietly():
+			try:
+				close(handle.queryId)
+			except Exception:
+				pass
+
+		thread = threading.Thread(target = closeQuietly)
+		thread.daemon = True
+		thread.start()
+
+	def invalidate(self, query = None):
+		"""Drops the completed results of query, or of every query if None"""
+		with self.lock:
+			if query is None:
+				self.results.clear()
+			else:
+				self.results.pop(self.normalise(query), None)
+
+	def stats(self):
+		"""Returns a dict of hit and miss counts and the numbers of queries and handles held"""
+		with self.lock:
+			return {"hits": self.hits, "misses": self.misses, 
+				"handlesReused": self.handlesReused, "queries": len(self.results), 
+				"handles": len(self.handles)}
@@ -0,0 +1,172 @@
+import unittest, tempfile, shutil, time
+from mimir.mimir_cache import *
+from mimir.mimir_fake import MimirFakeServer
+from mimir.mimir_helpers import MimirMetadata, MimirDocumentTokens, MimirDocumentToken, \
+	MimirException, MimirHelper
+
+class TestMimirDocumentCache(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+
+	def tearDown(self):
+		shutil.rmtree(self.directory)
+
+	def testMissThenHit(self):
+		cache = MimirDocumentCache()
+		self.assertIsNone(cache.get(("text", 1)))
+		cache.put(("text", 1), u"hello")
+		self.assertEqual(cache.get(("text", 1)), u"hello")
+		self.assertEqual(cache.stats()["hits"], 1)
+		self.assertEqual(cache.stats()["misses"], 1)
+
+	def testLeastRecentlyUsedEvicted(self):
+		cache = MimirDocumentCache(maxEntries=2)
+		cache.put(("text", 1), u"one")
+		cache.put(("text", 2), u"two")
+		cache.get(("text", 1))
+		cache.put(("text", 3), u"three")
+		self.assertIsNone(cache.get(("text", 2)))
+		self.assertEqual(cache.get(("text", 1)), u"one")
+		self.assertEqual(cache.get(("text", 3)), u"three")
+
+	def testDiskTierSurvivesNewCache(self):
+		tokens = MimirDocumentTokens.fromTokens([MimirDocumentToken(u"a", 0),
+			MimirDocumentToken(u" ", isSpace=True)])
+		metadata = MimirMetadata(u"title", u"uri", {"author": u"me"})
+		cache = MimirDocumentCache(directory=self.directory)
+		cache.put(("text", 7), tokens)
+		cache.put(("metadata", 7, ()), metadata)
+
+		reopened = MimirDocumentCache(directory=self.directory)
+		self.assertEqual(reopened.get(("text", 7)).text, u"a ")
+		self.assertEqual(reopened.get(("metadata", 7, ())).metadata, {"author": u"me"})
+		self.assertEqual(reopened.stats()["diskHits"], 2)
+
+	def testInvalidateDocument(self):
+		cache = MimirDocumentCache(directory=self.directory)
+		cache.put(("text", 1), u"one")
+		cache.put(("metadata", 1, ()), u"meta")
+		cache.put(("text", 2), u"two")
+		cache.invalidate(1)
+		self.assertIsNone(cache.get(("text", 1)))
+		self.assertIsNone(cache.get(("metadata", 1, ())))
+		self.assertEqual(cache.get(("text", 2)), u"two")
+
+		cache.invalidate()
+		self.assertIsNone(cache.get(("text", 2)))
+
+class TestMimirQueryCache(unittest.TestCase):
+	def setUp(self):
+		self.posted = []
+		self.closed = []
+
+	def post(self, query):
+		self.posted.append(query)
+		return "query-%d" % len(self.posted)
+
+	def close(self, queryId):
+		self.closed.append(queryId)
+
+	def waitForClose(self, count):
+		for i in range(100):
+			if len(self.closed) >= count:
+				return
+			time.sleep(0.01)
+
+	def testResultsNormalisedAndExpire(self):
+		cache = MimirQueryCache(ttl=0.05)
+		cache.putResults("{Token}  ", [1, 2, 3])
+		self.assertEqual(cache.getResults(" {Token}").count, 3)
+		time.sleep(0.1)
+		self.assertIsNone(cache.getResults("{Token}"))
+
+	def testResultsBounded(self):
+		cache = MimirQueryCache(maxQueries=1)
+		cache.putResults("{A}", [1])
+		cache.putResults("{B}", [2])
+		self.assertIsNone(cache.getResults("{A}"))
+		self.assertEqual(list(cache.getResults("{B}").documentIds), [2])
+
+	def testHitsOnlyKeptWhenAsked(self):
+		cache = MimirQueryCache()
+		cache.putResults("{A}", [1], [["hit"]])
+		self.assertIsNone(cache.getResults("{A}").hits)
+
+		cache = MimirQueryCache(cacheHits=True)
+		cache.putResults("{A}", [1], [["hit"]])
+		self.assertEqual(cache.getResults("{A}").hits, [["hit"]])
+
+	def testHandleSharedAndClosedWhenReleased(self):
+		cache = MimirQueryCache()
+		first = cache.acquire("{A}", self.post)
+		second = cache.acquire("{A}", self.post)
+		self.assertEqual(first.queryId, second.queryId)
+		self.assertEqual(len(self.posted), 1)
+
+		cache.release(first, self.close)
+		self.assertEqual(self.closed, [])
+		cache.release(second, self.close)
+		self.assertEqual(self.closed, ["query-1"])
+
+	def testCloseErrorsPropagateWithoutHandleTtl(self):
+		def fail(queryId):
+			raise MimirException("Query ID %s not known!" % queryId)
+
+		cache = MimirQueryCache()
+		handle = cache.acquire("{A}", self.post)
+		with self.assertRaises(MimirException):
+			cache.release(handle, fail)
+		self.assertEqual(cache.stats()["handles"], 0)
+
+	def testIdleHandleReusedThenExpired(self):
+		cache = MimirQueryCache(handleTtl=0.05)
+		cache.release(cache.acquire("{A}", self.post), self.close)
+		cache.release(cache.acquire("{A}", self.post), self.close)
+		self.assertEqual(len(self.posted), 1)
+		self.assertEqual(cache.stats()["handlesReused"], 1)
+
+		self.waitForClose(1)
+		self.assertEqual(self.closed, ["query-1"])
+		self.assertEqual(cache.stats()["handles"], 0)
+
+	def testIdleHandlesEvicted(self):
+		cache = MimirQueryCache(handleTtl=60, maxHandles=1)
+		cache.release(cache.acquire("{A}", self.post), self.close)
+		cache.release(cache.acquire("{B}", self.post), self.close)
+		self.waitForClose(1)
+		self.assertEqual(self.closed, ["query-1"])
+
+class TestMimirHelperQueryCache(unittest.TestCase):
+	def setUp(self):
+		self.fake = MimirFakeServer(documents=50)
+		self.mimir = MimirHelper(self.fake.start(), queryCache=MimirQueryCache())
+
+	def tearDown(self):
+		self.mimir.shutdown()
+		self.fake.shutdown()
+
+	def testCountedPerQuery(self):
+		ids = list(self.mimir.ids("{Token}"))
+		self.assertEqual(len(ids), 50)
+		stats = self.mimir.queryCache.stats()
+		self.assertEqual((stats["hits"], stats["misses"]), (0, 1))
+
+		requests = self.fake.requests
+		self.assertEqual(list(self.mimir.ids("{Token}")), ids)
+		self.assertEqual(self.fake.requests, requests)
+		with self.mimir.query("{Token}") as resultSet:
+			self.assertEqual([resultSet.documentId(rank) for rank in range(50)], ids)
+		stats = self.mimir.queryCache.stats()
+		self.assertEqual((stats["hits"], stats["misses"]), (2, 1))
+
+	def testResultsRecorded(self):
+		with self.mimir.query("{Other}") as resultSet:
+			results = list(resultSet.results())
+		self.assertEqual([result.documentId for result in results],
+			list(self.mimir.ids("{Other}")))
+		stats = self.mimir.queryCache.stats()
+		self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+		self.assertIsNone(self.mimir.queryCache.getResults("{Other}").hits)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,201 @@
+"""
+	Parallel, resumable export of every result of a query to files.
+
+	Can also be run from the command line, see main:
+
+		python -m mimir.mimir_export http://mymimirendpoint.example.com/search/ "{Token}" out/
+"""
+import argparse, gzip, json, os, threading
+from multiprocessing.pool import ThreadPool
+
+from .mimir_helpers import MimirHelper, MimirResult, MimirException, RESULT_FIELDS
+
+try:
+	import pyarrow
+	import pyarrow.parquet
+except ImportError:
+	pyarrow = None
+
+FORMATS = ("jsonl", "parquet")
+
+CHECKPOINT = "checkpoint"
+
+def _record(result, rank, fields):
+	"""Turns the chosen fields of a result into a JSON-friendly dict"""
+	record = {"rank": rank}
+	if "id" in fields:
+		record["documentId"] = result.documentId
+	if "metadata" in fields:
+		metadata = result.metadata
+		record["documentTitle"] = metadata.documentTitle
+		record["documentURI"] = metadata.documentURI
+		record["metadata"] = metadata.metadata
+	if "hits" in fields:
+		record["hits"] = [[hit.termPosition, hit.length] for hit in result.hits]
+	if "tokens" in fields:
+		record["text"] = result.text
+	return record
+
+def _partPath(output, start, format, compress):
+	name = "part-%012d.%s" % (start, format)
+	if compress and format == "jsonl":
+		name += ".gz"
+	return os.path.join(output, name)
+
+def _writePart(path, records, format, compress):
+	"""Writes a part file under a temporary name, then moves it into place"""
+	tempPath = path + ".tmp"
+	if format == "parquet":
+		pyarrow.parquet.write_table(pyarrow.Table.from_pylist(records), tempPath,
+			compression = "snappy" if compress else "none")
+	else:
+		opener = gzip.open if compress else open
+		with opener(tempPath, "wb") as f:
+			for record in records:
+				f.write((json.dumps(record) + "\n").encode("utf-8"))
+	os.rename(tempPath, path)
+
+def _readCheckpoint(path, header):
+	"""
+		Returns the set of chunk starts already exported according to the
+		checkpoint file, or None if there is no checkpoint.
+
+		@throws MimirException if the checkpoint is for a different export
+	"""
+	if not os.path.exists(path):
+		return None
+
+	with open(path) as f:
+		# Only lines ending in a newline were recorded completely. A partial
+		# last line means the export died while recording a chunk, which
+		# will simply be fetched again.
+		lines = f.read().split("\n")[:-1]
+
+	if not lines or json.loads(lines[0]) != header:
+		raise MimirException("Checkpoint %s is for a different export" % path)
+
+	done = set()
+	for line in lines[1:]:
+		if line.strip().isdigit():
+			done.add(int(line))
+	return done
+
+def export(helper, query, output, fields = RESULT_FIELDS, metadataFieldNames = [],
+		chunkSize = 1000, workers = 4, format = "jsonl", compress = False):
+	"""
+		Exports every result of the query to part files in the output directory.
+
+		The rank range is split into chunks of chunkSize ranks, which are
+		fetched by a pool of workers and written to one part file each, as
+		JSON Lines (optionally gzipped) or as Parquet (needs pyarrow). Each
+		finished chunk is recorded in a checkpoint file, so running the same
+		export into the same directory again resumes where it stopped, without
+		fetching finished chunks again. This relies on the server returning
+		the query's results in the same order each time.
+
+		@param helper a MimirHelper, or the endpoint to make one for
+		@param fields parts of each result to export, from RESULT_FIELDS.
+			"tokens" is exported as the document's text.
+		@returns dict with the count of results and of chunks written and skipped
+
+		@throws RequestException if there was a problem with the request
+		@throws MimirException if there was a problem with the mimir query,
+			response could not be read or the checkpoint is for another export
+		@throws xml.etree.ElementTree.ParseError if parse was not possible on response
+	"""
+	if format not in FORMATS:
+		raise ValueError("Unknown format %r, expected one of %r" % (format, FORMATS))
+	if format == "parquet" and pyarrow is None:
+		raise ImportError("Exporting to parquet requires the pyarrow library")
+	for field in fields:
+		if field not in RESULT_FIELDS:
+			raise ValueError("Unknown result field %r, expected one of %r" %
+				(field, RESULT_FIELDS))
+
+	ownsHelper = not isinstance(helper, MimirHelper)
+	if ownsHelper:
+		helper = MimirHelper(helper, poolMaxsize = workers)
+
+	try:
+		return _export(helper, query, output, fields, metadataFieldNames, chunkSize,
+			workers, format, compress)
+	finally:
+		if ownsHelper:
+			helper.shutdown()
+
+def _export(helper, query, output, fields, metadataFieldNames, chunkSize, workers,
+		format, compress):
+	"""Runs an export with a MimirHelper, see export"""
+	if not os.path.isdir(output):
+		os.makedirs(output)
+
+	with helper.query(query) as resultSet:
+		count = int(resultSet.documentsCount())
+		header = {"query": query, "count": count, "fields": sorted(fields),
+			"metadataFieldNames": sorted(metadataFieldNames), "chunkSize": chunkSize,
+			"format": format, "compress": compress}
+
+		checkpointPath = os.path.join(output, CHECKPOINT)
+		done = _readCheckpoint(checkpointPath, header)
+		if done is None:
+			done = set()
+			with open(checkpointPath, "w") as f:
+				f.write(json.dumps(header) + "\n")
+
+		starts = [start for start in range(0, count, chunkSize) if start not in done]
+		lock = threading.Lock()
+
+		def exportChunk(start):
+			records = []
+			for rank in range(start, min(start + chunkSize, count)):
+				result = MimirResult.lazy(resultSet, rank, metadataFieldNames)
+				records.append(_record(result, rank, fields))
+
+			_writePart(_partPath(output, start, format, compress), records, format, compress)
+
+			with lock:
+				with open(checkpointPath, "a") as f:
+					f.write("%d\n" % start)
+					f.flush()
+					os.fsync(f.fileno())
+
+		pool = ThreadPool(max(workers, 1))
+		try:
+			for _ in pool.imap_unordered(exportChunk, starts):
+				pass
+		finally:
+			pool.terminate()
+			pool.join()
+
+	return {"count": count, "chunks": len(starts), "skipped": len(done)}
+
+def main(args = None):
+	"""Command line entry point for export"""
+	parser = argparse.ArgumentParser(description = "Export every result of a Mimir query to files")
+	parser.add_argument("endpoint", help = "search endpoint, with its trailing slash")
+	parser.add_argument("query", help = "the query to export")
+	parser.add_argument("output", help = "directory for the part files and checkpoint")
+	parser.add_argument("--fields", default = ",".join(RESULT_FIELDS),
+		help = "comma separated parts of each result to export (default: %(default)s)")
+	parser.add_argument("--metadata-fields", default = "",
+		help = "comma separated additional metadata fields")
+	parser.add_argument("--chunk-size", type = int, default = 1000)
+	parser.add_argument("--workers", type = int, default = 4)
+	parser.add_argument("--format", choices = FORMATS, default = "jsonl")
+	parser.add_argument("--compress", action = "store_true", help = "gzip JSON Lines, snappy for parquet")
+	parser.add_argument("--timeout", type = float, default = None)
+	options = parser.parse_args(args)
+
+	helper = MimirHelper(options.endpoint, timeout = options.timeout,
+		poolMaxsize = options.workers)
+	with helper:
+		summary = export(helper, options.query, options.output,
+			fields = [f for f in options.fields.split(",") if f],
+			metadataFieldNames = [f for f in options.metadata_fields.split(",") if f],
+			chunkSize = options.chunk_size, workers = options.workers,
+			format = options.format, compress = options.compress)
+
+	print("Exported %(count)d results: %(chunks)d chunks written, %(skipped)d already done" % summary)
+
+if __name__ == "__main__":
+	main()
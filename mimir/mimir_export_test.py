@@ -0,0 +1,77 @@
+import unittest, tempfile, shutil, os, json
+from mimir.mimir_export import *
+from mimir.mimir_export import _readCheckpoint
+from mimir.mimir_fake import MimirFakeServer
+
+class _InterruptedHelper(MimirHelper):
+	"""Fails the export when it reaches the given rank, as if it were killed"""
+	def __init__(self, endpoint, failRank):
+		MimirHelper.__init__(self, endpoint)
+		self.failRank = failRank
+
+	def documentId(self, queryId, rank):
+		if int(rank) == self.failRank:
+			raise MimirException("Interrupted at rank %d" % rank)
+		return MimirHelper.documentId(self, queryId, rank)
+
+class TestMimirExport(unittest.TestCase):
+	def setUp(self):
+		self.output = tempfile.mkdtemp()
+
+	def tearDown(self):
+		shutil.rmtree(self.output)
+
+	def testCheckpointResume(self):
+		path = os.path.join(self.output, CHECKPOINT)
+		header = {"query": "{Token}", "count": 10}
+		self.assertIsNone(_readCheckpoint(path, header))
+
+		with open(path, "w") as f:
+			f.write(json.dumps(header) + "\n0\n5\n1")
+		self.assertEqual(_readCheckpoint(path, header), set([0, 5]))
+
+		with self.assertRaises(MimirException):
+			_readCheckpoint(path, {"query": "{Other}", "count": 10})
+
+	def readRecords(self):
+		records = []
+		for name in sorted(os.listdir(self.output)):
+			if name.startswith("part-") and name.endswith(".jsonl"):
+				with open(os.path.join(self.output, name)) as f:
+					records.extend(json.loads(line) for line in f)
+		return records
+
+	def testExportIdsAndResume(self):
+		with MimirFakeServer(documents=120) as fake:
+			summary = export(fake.endpoint, "{Token}", self.output, fields=("id",), chunkSize=50)
+			self.assertEqual(summary, {"count": 120, "chunks": 3, "skipped": 0})
+			self.assertEqual([(r["rank"], r["documentId"]) for r in self.readRecords()],
+				[(rank, fake.documentIdAt(rank)) for rank in range(120)])
+
+			again = export(fake.endpoint, "{Token}", self.output, fields=("id",), chunkSize=50)
+			self.assertEqual(again, {"count": 120, "chunks": 0, "skipped": 3})
+			self.assertEqual(fake.queries, {})
+
+	def testInterruptedMidChunk(self):
+		with MimirFakeServer(documents=35) as fake:
+			helper = _InterruptedHelper(fake.endpoint, 17)
+			with self.assertRaises(MimirException):
+				export(helper, "{Token}", self.output, fields=("id", "hits"), chunkSize=10,
+					workers=1)
+			helper.shutdown()
+			ranks = [r["rank"] for r in self.readRecords()]
+			self.assertEqual(ranks[:10], list(range(10)))
+			self.assertFalse(set(range(10, 20)) & set(ranks))
+			finished = len(set(rank // 10 for rank in ranks))
+
+			summary = export(fake.endpoint, "{Token}", self.output, fields=("id", "hits"),
+				chunkSize=10)
+			self.assertEqual(summary["skipped"], finished)
+			self.assertEqual(summary["chunks"], 4 - finished)
+			records = self.readRecords()
+			self.assertEqual([r["rank"] for r in records], list(range(35)))
+			self.assertEqual([r["documentId"] for r in records],
+				[fake.documentIdAt(rank) for rank in range(35)])
+
+if __name__ == '__main__':
+    unittest.main()
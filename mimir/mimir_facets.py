@@ -0,0 +1,206 @@
+"""
+	Counts of the values of metadata fields over the results of a query.
+"""
+import heapq, itertools, random
+from array import array
+from collections import Counter
+
+from .mimir_helpers import _fetchInOrder
+
+try:
+	xrange
+except NameError:
+	xrange = range
+
+class MimirTopK(object):
+	"""
+		Approximate counts of the most common values in a stream, in bounded
+		memory, using the Space-Saving algorithm.
+
+		At most capacity values are tracked. A value not being tracked takes
+		the place of the least counted one, inheriting its count, so counts
+		may be overestimated by at most the count of the value replaced, but
+		any value more common than 1/capacity of the stream is kept.
+
+		The least counted value is found with a heap of (count, order, value)
+		entries. Entries are pushed whenever a count changes and outdated ones
+		skipped when popped, so each add takes logarithmic time.
+	"""
+	def __init__(self, capacity = 1000):
+		self.capacity = capacity
+		self.counts = {}
+		self.heap = []
+		self.order = itertools.count()
+
+	def add(self, value):
+		count = self.counts.get(value)
+		if count is None and len(self.counts) >= self.capacity:
+			while True:
+				count, order, least = heapq.heappop(self.heap)
+				if self.counts.get(least) == count:
+					break
+			del self.counts[least]
+
+		count = (count or 0) + 1
+		self.counts[value] = count
+		heapq.heappush(self.heap, (count, next(self.order), value))
+
+		if len(self.heap) > 2 * self.capacity + 16:
+			self.heap = [(count, next(self.order), value) for value, count in self.counts.items()]
+			heapq.heapify(self.heap)
+
+	def copy(self):
+		"""Returns an independent copy of the counts so far"""
+		topK = MimirTopK(self.capacity)
+		topK.counts = dict(self.counts)
+		topK.heap = list(self.heap)
+		topK.order = itertools.count(next(self.order))
+		return topK
+
+	def get(self, value, default = 0):
+		return self.counts.get(value, default)
+
+	def most_common(self, k = None):
+		common = sorted(self.counts.items(), key = lambda item: -item[1])
+		return common if k is None else common[:k]
+
+	def __len__(self):
+		return len(self.counts)
+
+class MimirFacets(object):
+	"""
+		Counts of the values of metadata fields over some or all of the
+		results of a query.
+
+		When only a sample of the results has been counted, estimate and top
+		scale the sample's counts up to the whole query.
+	"""
+	def __init__(self, fieldNames, total, maxValues = None):
+		"""
+			@param total number of results of the query
+			@param maxValues number of values to keep per field, counted
+				approximately with a MimirTopK. None counts every value exactly.
+		"""
+		self.fieldNames = fieldNames
+		self.total = total
+		self.documents = 0
+		self.counters = dict((name, Counter() if maxValues is None else MimirTopK(maxValues))
+			for name in fieldNames)
+
+	@property
+	def complete(self):
+		"""Whether every result has been counted"""
+		return self.documents >= self.total
+
+	def copy(self):
+		"""Returns an independent copy of the counts so far"""
+		facets = MimirFacets(self.fieldNames, self.total)
+		facets.documents = self.documents
+		facets.counters = dict((name, counter.copy()) for name, counter in self.counters.items())
+		return facets
+
+	def add(self, metadata):
+		"""Counts the fields of one result's MimirMetadata"""
+		self.documents += 1
+		for name in self.fieldNames:
+			value = metadata.metadata.get(name)
+			if value is None:
+				continue
+			counter = self.counters[name]
+			if isinstance(counter, Counter):
+				counter[value] += 1
+			else:
+				counter.add(value)
+
+	def __scale(self):
+		if not self.documents:
+			return 0.0
+		return float(self.total) / self.documents
+
+	def count(self, fieldName, value):
+		"""Returns how many counted results have value for fieldName"""
+		return self.counters[fieldName].get(value, 0)
+
+	def estimate(self, fieldName, value):
+		"""Returns the estimated number of all results with value for fieldName"""
+		return self.count(fieldName, value) * self.__scale()
+
+	def top(self, fieldName, k = 10):
+		"""
+			Returns the k most common values of fieldName, as (value, count)
+			pairs. Counts are estimates for the whole query if only a sample has
+			been counted.
+		"""
+		common = self.counters[fieldName].most_common(k)
+		if self.complete:
+			return common
+		scale = self.__scale()
+		return [(value, count * scale) for value, count in common]
+
+def _metadataFetcher(resultSet, fieldNames):
+	"""
+		Returns a callable which fetches the metadata of a rank. With a
+		document cache the rank's id is fetched first, so that the cache can
+		answer for documents seen before.
+	"""
+	if resultSet.mimirHelper.cache is None:
+		return lambda rank: resultSet.documentMetadata(rank, fieldNames)
+	return lambda rank: resultSet.documentMetadata(rank, fieldNames, resultSet.documentId(rank))
+
+def iterFacets(resultSet, fieldNames, workers = 8, window = None, every = 1000,
+		sample = None, maxValues = None, seed = None):
+	"""
+		Counts the values of metadata fields over the results of a finished
+		query, yielding the MimirFacets counted so far after every `every`
+		results and once more at the end, or only at the end if every is None.
+		Each MimirFacets yielded is a snapshot, unchanged by further counting.
+
+		Ranks are visited in random order, so whatever has been counted when
+		the caller stops is a uniform sample, and its estimates converge on
+		the whole query's counts as the iteration goes on.
+
+		@param workers number of ranks to fetch concurrently
+		@param sample stop after this many results, None for all
+		@param maxValues see MimirFacets
+		@param seed for the random order of ranks, for repeatable samples
+
+		@throws RequestException if there was a problem with the request
+		@throws MimirException if there was a problem with the mimir query or
+			response could not be read
+		@throws xml.etree.ElementTree.ParseError if parse was not possible on response
+	"""
+	total = int(resultSet.documentsCount())
+	if total < 0:
+		raise ValueError("Facets need a finished query; wait for it first")
+
+	rng = random.Random(seed)
+	if sample is not None and sample < total:
+		ranks = rng.sample(xrange(total), sample)
+	else:
+		ranks = array("l", xrange(total))
+		rng.shuffle(ranks)
+
+	result = MimirFacets(fieldNames, total, maxValues)
+	for rank, (metadata,) in _fetchInOrder([_metadataFetcher(resultSet, fieldNames)],
+			ranks, max(workers, 1), window):
+		result.add(metadata)
+		if every is not None and result.documents % every == 0:
+			yield result.copy()
+
+	if every is None or result.documents % every != 0 or not result.documents:
+		yield result
+
+def facets(resultSet, fieldNames, workers = 8, window = None, sample = None,
+		maxValues = None, seed = None):
+	"""
+		Returns the MimirFacets of the results of a finished query, or of a
+		random sample of them. See iterFacets.
+
+		@throws RequestException if there was a problem with the request
+		@throws MimirException if there was a problem with the mimir query or
+			response could not be read
+		@throws xml.etree.ElementTree.ParseError if parse was not possible on response
+	"""
+	for result in iterFacets(resultSet, fieldNames, workers, window, every = None,
+			sample = sample, maxValues = maxValues, seed = seed):
+		return result
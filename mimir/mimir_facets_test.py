@@ -0,0 +1,71 @@
+import unittest, random
+from collections import Counter
+from mimir.mimir_facets import *
+from mimir.mimir_fake import MimirFakeServer
+from mimir.mimir_helpers import MimirHelper
+from mimir.mimir_cache import MimirDocumentCache
+
+class TestMimirTopK(unittest.TestCase):
+	def testKeepsFrequentValues(self):
+		topK = MimirTopK(capacity=5)
+		for i in range(1000):
+			topK.add("common" if i % 2 else "rare-%d" % i)
+		self.assertEqual(len(topK), 5)
+		self.assertEqual(topK.most_common(1)[0][0], "common")
+		self.assertGreaterEqual(topK.get("common"), 500)
+
+	def testMatchesLinearScan(self):
+		topK = MimirTopK(capacity=10)
+		counts = {}
+		rng = random.Random(3)
+		for i in range(5000):
+			value = int(rng.paretovariate(1.2))
+			topK.add(value)
+			if value in counts or len(counts) < 10:
+				counts[value] = counts.get(value, 0) + 1
+			else:
+				least = min(sorted(counts), key=counts.get)
+				counts[value] = counts.pop(least) + 1
+			self.assertEqual(sorted(topK.counts.values()), sorted(counts.values()))
+		self.assertLessEqual(len(topK.heap), 2 * 10 + 16)
+
+class TestMimirFacets(unittest.TestCase):
+	def expected(self, fake, name):
+		return Counter("%s-%d" % (name, fake.documentIdAt(rank) % 10) for rank in range(50))
+
+	def testFacets(self):
+		with MimirFakeServer(documents=50) as fake:
+			helper = MimirHelper(fake.endpoint)
+			with helper.query("{Token}") as resultSet:
+				result = facets(resultSet, ["author", "date"], workers=4)
+			self.assertTrue(result.complete)
+			self.assertEqual(result.documents, 50)
+			expected = self.expected(fake, "author")
+			self.assertEqual(dict(result.top("author", k=None)), dict(expected))
+			self.assertEqual(result.estimate("author", "author-3"), expected["author-3"])
+
+	def testSampledAndIncremental(self):
+		with MimirFakeServer(documents=50) as fake:
+			helper = MimirHelper(fake.endpoint, cache=MimirDocumentCache())
+			with helper.query("{Token}") as resultSet:
+				sampled = facets(resultSet, ["author"], sample=20, seed=1, maxValues=3)
+				self.assertFalse(sampled.complete)
+				self.assertEqual(sampled.documents, 20)
+				self.assertEqual(len(sampled.counters["author"]), 3)
+				self.assertAlmostEqual(sum(count for value, count in sampled.top("author")),
+					sum(sampled.counters["author"].counts.values()) * 2.5)
+
+				snapshots = list(iterFacets(resultSet, ["author"], every=20))
+				seen = [result.documents for result in snapshots]
+				self.assertEqual(seen, [20, 40, 50])
+				self.assertEqual(sum(snapshots[0].counters["author"].values()), 20)
+
+	def testHelperFacets(self):
+		with MimirFakeServer(documents=50) as fake:
+			helper = MimirHelper(fake.endpoint)
+			result = helper.facets("{Token}", ["date"], workers=4)
+			self.assertEqual(dict(result.top("date", k=None)), dict(self.expected(fake, "date")))
+			self.assertEqual(fake.queries, {})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,336 @@
+# -*- coding: utf-8 -*-
+"""
+	A local stand-in for a Mimir search endpoint, for tests and benchmarks.
+
+	Serves the same XML responses as Mimir for a synthetic corpus of
+	configurable size, with configurable latency and search time. Can also
+	be run from the command line:
+
+		python -m mimir.mimir_fake --documents 10000 --port 8086
+"""
+import argparse, random, threading, time, zlib
+try:
+	from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+	from SocketServer import ThreadingMixIn
+	from urlparse import urlparse, parse_qs
+except ImportError:
+	from http.server import BaseHTTPRequestHandler, HTTPServer
+	from socketserver import ThreadingMixIn
+	from urllib.parse import urlparse, parse_qs
+from xml.sax.saxutils import escape, quoteattr
+
+WORDS = u"the quick brown fox jumps over a lazy dog near café Mímir".split()
+
+def _message(data, state = "SUCCESS"):
+	return (u'<?xml version="1.0" encoding="UTF-8"?>\n'
+		u'<mimir:message xmlns:mimir="http://gate.ac.uk/ns/mimir">'
+		u'<mimir:state>%s</mimir:state>%s</mimir:message>' % (state, data)).encode("utf-8")
+
+def _data(content):
+	return _message(u"<mimir:data>%s</mimir:data>" % content)
+
+def _value(value):
+	return _data(u"<mimir:value>%d</mimir:value>" % value)
+
+class _FakeMimirError(Exception):
+	pass
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+	daemon_threads = True
+	request_queue_size = 128
+
+class _Handler(BaseHTTPRequestHandler):
+	protocol_version = "HTTP/1.1"
+	disable_nagle_algorithm = True
+
+	def log_message(self, format, *args):
+		pass
+
+	def do_GET(self):
+		fake = self.server.fake
+		url = urlparse(self.path)
+		params = dict((key, values[0]) for key, values in parse_qs(url.query).items())
+		path = url.path.rsplit("/", 1)[-1]
+
+		if not fake.admit(path):
+			self.sendEmpty(503)
+			return
+
+		try:
+			self.respond(fake, path, params)
+		finally:
+			fake.leave()
+
+	def respond(self, fake, path, params):
+		if fake.latency:
+			time.sleep(fake.latency)
+
+		contentType = "text/xml; charset=UTF-8"
+		try:
+			if path == "renderDocument":
+				body = fake.render(params)
+				contentType = "text/html; charset=UTF-8"
+			else:
+				handler = fake.handlers.get(path)
+				if handler is None:
+					self.sendEmpty(404)
+					return
+				body = handler(params)
+		except _FakeMimirError as e:
+			body = _message(u"<mimir:error>%s</mimir:error>" % escape(u"%s" % (e.args[0],)), "ERROR")
+		except (KeyError, ValueError) as e:
+			body = _message(u"<mimir:error>Bad request: %s</mimir:error>" % escape(u"%s" % (e.args[0],)), "ERROR")
+
+		encoding = None
+		if fake.compress and "gzip" in self.headers.get("Accept-Encoding", ""):
+			compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+			body = compressor.compress(body) + compressor.flush()
+			encoding = "gzip"
+
+		with fake.lock:
+			fake.requests += 1
+
+		self.send_response(200)
+		self.send_header("Content-Type", contentType)
+		if encoding is not None:
+			self.send_header("Content-Encoding", encoding)
+		self.send_header("Content-Length", str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+	def sendEmpty(self, status):
+		self.send_response(status)
+		self.send_header("Content-Length", "0")
+		self.end_headers()
+
+class MimirFakeServer(object):
+	"""
+		Serves a synthetic corpus through the Mimir search API over HTTP.
+
+		Every query matches the same documents, in the same order, with
+		hitsPerDocument hits each. The documentId of each rank and the text of
+		each document are derived from the rank, so repeated runs see the same
+		data. A query string with an unmatched "{" fails like a Mimir syntax
+		error.
+	"""
+	def __init__(self, documents = 1000, documentLength = 200, hitsPerDocument = 2,
+			latency = 0.0, searchTime = 0.0, metadataFields = ("author", "date"),
+			errorRate = 0.0, capacity = None, compress = False, host = "127.0.0.1", port = 0):
+		"""
+			@param documents number of results of every query
+			@param documentLength number of words in every document
+			@param latency seconds added to every response
+			@param searchTime seconds before a query has found all its
+				results. Until then they become available at an even rate.
+			@param metadataFields extra metadata fields every document has
+			@param errorRate fraction of the requests for documents and counts 
+				turned away with a 503
+			@param capacity number of requests served at once, beyond which 
+				requests are turned away with a 503. None for no limit.
+			@param compress whether to gzip responses for clients that accept it
+			@param port to listen on, 0 picks a free one
+		"""
+		self.documents = documents
+		self.documentLength = documentLength
+		self.hitsPerDocument = hitsPerDocument
+		self.latency = latency
+		self.searchTime = searchTime
+		self.metadataFields = metadataFields
+		self.errorRate = errorRate
+		self.capacity = capacity
+		self.compress = compress
+		self.address = (host, port)
+
+		self.lock = threading.Lock()
+		self.queries = {}
+		self.nextQueryId = 0
+		self.requests = 0
+		self.rejected = 0
+		self.inFlight = 0
+		self.server = None
+
+		self.handlers = {
+			"postQuery": self.postQuery,
+			"documentsCount": self.documentsCount,
+			"documentsCurrentCount": self.documentsCurrentCount,
+			"documentsCountSync": self.documentsCountSync,
+			"close": self.close,
+			"documentId": self.documentId,
+			"documentMetadata": self.documentMetadata,
+			"documentHits": self.documentHits,
+			"documentText": self.documentText,
+		}
+
+	def __enter__(self):
+		self.start()
+		return self
+
+	def __exit__(self, excType, excValue, traceback):
+		self.shutdown()
+
+	@property
+	def endpoint(self):
+		"""The search URL to give a MimirHelper, once started"""
+		host, port = self.server.server_address[:2]
+		return "http://%s:%d/search/" % (host, port)
+
+	def __bind(self):
+		self.server = _ThreadingHTTPServer(self.address, _Handler)
+		self.server.fake = self
+
+	def start(self):
+		"""Starts serving on a background thread, and returns the endpoint"""
+		self.__bind()
+		thread = threading.Thread(target = self.server.serve_forever)
+		thread.daemon = True
+		thread.start()
+		return self.endpoint
+
+	def serveForever(self):
+		"""Serves on the calling thread until interrupted"""
+		self.__bind()
+		self.server.serve_forever()
+
+	def shutdown(self):
+		if self.server is not None:
+			self.server.shutdown()
+			self.server.server_close()
+			self.server = None
+
+	def admit(self, path):
+		"""Whether to serve a request, as errorRate and capacity allow"""
+		with self.lock:
+			if ((path.startswith("document") and random.random() < self.errorRate) or 
+					(self.capacity is not None and self.inFlight >= self.capacity)):
+				self.rejected += 1
+				return False
+			self.inFlight += 1
+			return True
+
+	def leave(self):
+		with self.lock:
+			self.inFlight -= 1
+
+	def documentIdAt(self, rank):
+		"""The documentId of the given rank. A permutation, so ids are unique."""
+		return (rank * 2654435761) % 2147483648
+
+	def words(self, documentId):
+		"""The words of the document with the given id"""
+		return [WORDS[(documentId + i * i) % len(WORDS)] for i in range(self.documentLength)]
+
+	def __query(self, params):
+		with self.lock:
+			started = self.queries.get(params["queryId"])
+		if started is None:
+			raise _FakeMimirError("Query ID %s not known!" % params["queryId"])
+		return started
+
+	def __available(self, started):
+		if not self.searchTime:
+			return self.documents
+		return min(self.documents, int(self.documents * (time.time() - started) / self.searchTime))
+
+	def __rank(self, params):
+		rank = int(params["rank"])
+		if not 0 <= rank < self.__available(self.__query(params)):
+			raise _FakeMimirError("Rank %d out of range" % rank)
+		return rank
+
+	def postQuery(self, params):
+		queryString = params["queryString"]
+		if queryString.count("{") != queryString.count("}"):
+			raise _FakeMimirError("Could not parse query: %s" % queryString)
+
+		with self.lock:
+			queryId = "fake-%d" % self.nextQueryId
+			self.nextQueryId += 1
+			self.queries[queryId] = time.time()
+		return _data(u"<mimir:queryId>%s</mimir:queryId>" % queryId)
+
+	def documentsCount(self, params):
+		started = self.__query(params)
+		if time.time() - started < self.searchTime:
+			return _value(-1)
+		return _value(self.documents)
+
+	def documentsCurrentCount(self, params):
+		return _value(self.__available(self.__query(params)))
+
+	def documentsCountSync(self, params):
+		started = self.__query(params)
+		remaining = started + self.searchTime - time.time()
+		if remaining > 0:
+			time.sleep(remaining)
+		return _value(self.documents)
+
+	def close(self, params):
+		with self.lock:
+			self.queries.pop(params["queryId"], None)
+		return _data(u"")
+
+	def documentId(self, params):
+		return _value(self.documentIdAt(self.__rank(params)))
+
+	def documentMetadata(self, params):
+		rank = self.__rank(params)
+		documentId = self.documentIdAt(rank)
+		fields = [name for name in params.get("fieldNames", "").split(",") if name]
+		return _data(u"<mimir:documentURI>http://example.com/documents/%d</mimir:documentURI>"
+			u"<mimir:documentTitle>Document %d</mimir:documentTitle>%s" % (documentId, documentId,
+			u"".join(u"<mimir:metadataField name=%s value=%s/>" %
+				(quoteattr(name), quoteattr(u"%s-%d" % (name, documentId % 10)))
+				for name in fields if name in self.metadataFields)))
+
+	def documentHits(self, params):
+		rank = self.__rank(params)
+		documentId = self.documentIdAt(rank)
+		step = max(self.documentLength // max(self.hitsPerDocument, 1), 1)
+		return _data(u"<mimir:hits>%s</mimir:hits>" % u"".join(
+			u'<mimir:hit documentId="%d" termPosition="%d" length="1"/>' % (documentId, position)
+			for position in range(0, self.documentLength, step)[:self.hitsPerDocument]))
+
+	def documentText(self, params):
+		words = self.words(self.documentIdAt(self.__rank(params)))
+		start = int(params.get("termPosition", 0))
+		end = len(words) if "length" not in params else start + int(params["length"])
+		parts = []
+		for position in range(start, min(end, len(words))):
+			parts.append(u'<mimir:text position="%d">%s</mimir:text>' % (position, escape(words[position])))
+			if position < len(words) - 1:
+				parts.append(u"<mimir:space> </mimir:space>")
+		return _data(u"".join(parts))
+
+	def render(self, params):
+		if "documentId" in params:
+			documentId = int(params["documentId"])
+		else:
+			documentId = self.documentIdAt(self.__rank(params))
+		return (u"<html><body><p>%s</p></body></html>" %
+			escape(u" ".join(self.words(documentId)))).encode("utf-8")
+
+def main(args = None):
+	"""Command line entry point, serving a fake corpus until interrupted"""
+	parser = argparse.ArgumentParser(description = "Serve a synthetic corpus through the Mimir search API")
+	parser.add_argument("--documents", type = int, default = 1000)
+	parser.add_argument("--document-length", type = int, default = 200)
+	parser.add_argument("--hits", type = int, default = 2, help = "hits per document")
+	parser.add_argument("--latency", type = float, default = 0.0, help = "seconds added to every response")
+	parser.add_argument("--search-time", type = float, default = 0.0,
+		help = "seconds before each query has found all its results")
+	parser.add_argument("--compress", action = "store_true", help = "gzip responses for clients that accept it")
+	parser.add_argument("--host", default = "127.0.0.1")
+	parser.add_argument("--port", type = int, default = 8086)
+	options = parser.parse_args(args)
+
+	fake = MimirFakeServer(options.documents, options.document_length, options.hits,
+		options.latency, options.search_time, compress = options.compress, host = options.host,
+		port = options.port)
+	print("Serving %d documents at http://%s:%d/search/" % (options.documents, options.host, options.port))
+	try:
+		fake.serveForever()
+	except KeyboardInterrupt:
+		pass
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,382 @@
+import threading, time
+try:
+	from Queue import Queue, Empty, Full
+except ImportError:
+	from queue import Queue, Empty, Full
+from contextlib import contextmanager
+from multiprocessing import TimeoutError
+from multiprocessing.pool import ThreadPool
+
+from .mimir_helpers import MimirHelper, MimirResultSet, MimirException
+
+ORDERS = ("roundrobin", "interleaved")
+
+_DONE = object()
+
+class _Failure(object):
+	def __init__(self, exception):
+		self.exception = exception
+
+def _timedOut(endpoint, timeout):
+	return MimirException("Shard %s did not respond within %s seconds" % (endpoint, timeout))
+
+def _closeQuietly(helper, queryId):
+	"""Closes a query nobody is waiting on, ignoring failures"""
+	try:
+		helper.close(queryId)
+	except Exception:
+		pass
+
+def _forEachShard(func, shards, timeout = None):
+	"""
+		Calls func(endpoint, value) for every (endpoint, value) in shards in
+		parallel, returning a dict of endpoint to result, or to a _Failure
+		if it raised or did not finish within timeout seconds.
+	"""
+	if not shards:
+		return {}
+
+	pool = ThreadPool(len(shards))
+	try:
+		pending = [(endpoint, pool.apply_async(func, (endpoint, value)))
+			for endpoint, value in shards]
+
+		deadline = None if timeout is None else time.time() + timeout
+		results = {}
+		for endpoint, result in pending:
+			try:
+				if deadline is None:
+					results[endpoint] = result.get()
+				else:
+					results[endpoint] = result.get(max(deadline - time.time(), 0))
+			except TimeoutError:
+				results[endpoint] = _Failure(_timedOut(endpoint, timeout))
+			except Exception as e:
+				results[endpoint] = _Failure(e)
+		return results
+	finally:
+		pool.terminate()
+
+class MimirFederatedHelper(object):
+	def __init__(self, endpoints, failFast = False, shardTimeout = 60, **helperArgs):
+		"""
+			Creates a helper that runs each query on several Mimir indexes at once.
+
+			@param endpoints search URLs of the shards, or MimirHelpers for them
+			@param failFast whether a failing shard fails the whole query.
+				Otherwise the shard is dropped and its exception kept in the
+				result set's errors.
+			@param shardTimeout seconds to wait for any one call to a shard, or
+				for its next result, before dropping it as failed. This includes
+				waiting for its search to finish. None waits forever.
+			@param helperArgs passed to the MimirHelper made for each endpoint
+		"""
+		self.helpers = []
+		for endpoint in endpoints:
+			if isinstance(endpoint, MimirHelper):
+				self.helpers.append((endpoint.endpoint, endpoint))
+			else:
+				self.helpers.append((endpoint, MimirHelper(endpoint, **helperArgs)))
+
+		self.failFast = failFast
+		self.shardTimeout = shardTimeout
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, excType, excValue, traceback):
+		self.shutdown()
+
+	def shutdown(self):
+		"""Closes the pooled connections of every shard's helper"""
+		for endpoint, helper in self.helpers:
+			helper.shutdown()
+
+	def postQuery(self, query):
+		"""
+			Starts the query on every shard in parallel.
+
+			@returns dict of endpoint to queryId, or to the exception raised
+		"""
+		results = self.__post(query)
+		return dict((endpoint, self._unwrap(result)) for endpoint, result in results.items())
+
+	def __post(self, query):
+		"""
+			Posts the query to every shard in parallel, returning a dict of
+			endpoint to queryId or to a _Failure. The queryId of a shard that
+			answers after shardTimeout is closed once it arrives, since no one
+			else will see it.
+		"""
+		lock = threading.Lock()
+		arrived = {}
+		settled = []
+
+		def post(endpoint, helper):
+			queryId = helper.postQuery(query)
+			with lock:
+				arrived[endpoint] = queryId
+				late = bool(settled)
+			if late:
+				_closeQuietly(helper, queryId)
+			return queryId
+
+		results = _forEachShard(post, self.helpers, self.shardTimeout)
+
+		with lock:
+			settled.append(True)
+			late = [(endpoint, arrived[endpoint]) for endpoint, result in results.items()
+				if isinstance(result, _Failure) and endpoint in arrived]
+		helpers = dict(self.helpers)
+		for endpoint, queryId in late:
+			thread = threading.Thread(target = _closeQuietly, args = (helpers[endpoint], queryId))
+			thread.daemon = True
+			thread.start()
+		return results
+
+	def wait(self, queryIds):
+		"""
+			Waits for every shard's query to finish, in parallel.
+
+			@param queryIds dict of endpoint to queryId
+			@returns dict of endpoint to None, or to the exception raised
+		"""
+		helpers = dict(self.helpers)
+		results = _forEachShard(lambda endpoint, queryId: helpers[endpoint].wait(queryId),
+			queryIds.items(), self.shardTimeout)
+		return dict((endpoint, self._unwrap(result) if isinstance(result, _Failure) else None)
+			for endpoint, result in results.items())
+
+	def close(self, queryIds):
+		"""
+			Releases every shard's query, in parallel. Failures are returned rather
+			than raised, so that every shard gets closed.
+
+			@param queryIds dict of endpoint to queryId
+			@returns dict of endpoint to None, or to the exception raised
+		"""
+		helpers = dict(self.helpers)
+		results = _forEachShard(lambda endpoint, queryId: helpers[endpoint].close(queryId),
+			queryIds.items(), self.shardTimeout)
+		return dict((endpoint, result.exception if isinstance(result, _Failure) else None)
+			for endpoint, result in results.items())
+
+	def _unwrap(self, result):
+		if isinstance(result, _Failure):
+			if self.failFast:
+				raise result.exception
+			return result.exception
+		return result
+
+	@contextmanager
+	def query(self, query, wait = True):
+		"""
+			Posts a query to every shard in a contextmanager that closes every
+			shard's query when done.
+
+			Shards that fail to post or finish are left out of the result set,
+			with their exceptions in its errors, unless failFast is set.
+		"""
+		helpers = dict(self.helpers)
+		posted = self.__post(query)
+		queryIds = dict((endpoint, queryId) for endpoint, queryId in posted.items()
+			if not isinstance(queryId, _Failure))
+		errors = dict((endpoint, failure.exception) for endpoint, failure in posted.items()
+			if isinstance(failure, _Failure))
+
+		resultSets = []
+		try:
+			if errors and self.failFast:
+				raise list(errors.values())[0]
+
+			if wait:
+				for endpoint, error in self.wait(queryIds).items():
+					if error is not None:
+						errors[endpoint] = error
+
+			resultSets = [(endpoint, MimirResultSet(helpers[endpoint], queryIds[endpoint], query))
+				for endpoint, helper in self.helpers
+				if endpoint in queryIds and endpoint not in errors]
+			yield MimirFederatedResultSet(self, resultSets, errors)
+		finally:
+			for endpoint, resultSet in resultSets:
+				resultSet.shutdown()
+			self.close(queryIds)
+
+	def metadata(self, query, fieldNames = [], order = "roundrobin", **kwargs):
+		"""
+			Returns an iterable for the query which yields (endpoint, metadata)
+			for the results of every shard. See MimirFederatedResultSet.
+		"""
+		with self.query(query, wait = not kwargs.get("stream")) as resultSet:
+			for result in resultSet.metadata(fieldNames, order, **kwargs):
+				yield result
+
+	def ids(self, query, order = "roundrobin", **kwargs):
+		"""
+			Returns an iterable for the query which yields (endpoint, documentId)
+			for the results of every shard. See MimirFederatedResultSet.
+		"""
+		with self.query(query, wait = not kwargs.get("stream")) as resultSet:
+			for result in resultSet.ids(order, **kwargs):
+				yield result
+
+	def results(self, query, metadataFieldNames = [], order = "roundrobin", **kwargs):
+		"""
+			Returns an iterable for the query which yields (endpoint, MimirResult)
+			for the results of every shard. See MimirFederatedResultSet.
+		"""
+		with self.query(query, wait = not kwargs.get("stream")) as resultSet:
+			for result in resultSet.results(metadataFieldNames, order, **kwargs):
+				yield result
+
+class MimirFederatedResultSet(object):
+	def __init__(self, federatedHelper, resultSets, errors, bufferSize = 16):
+		"""
+			@param resultSets list of (endpoint, MimirResultSet) for the live shards
+			@param errors dict of endpoint to the exception that dropped the shard
+			@param bufferSize results buffered per shard while merging
+		"""
+		self.federatedHelper = federatedHelper
+		self.resultSets = resultSets
+		self.errors = errors
+		self.bufferSize = bufferSize
+
+	def shardCounts(self):
+		"""
+			Asks every shard in parallel how many results it has in total. A
+			shard that fails or does not answer within shardTimeout is left out,
+			with its exception kept in errors, unless failFast is set.
+
+			@returns dict of endpoint to count, -1 if that shard has not completed
+		"""
+		results = _forEachShard(lambda endpoint, resultSet: resultSet.documentsCount(),
+			self.resultSets, self.federatedHelper.shardTimeout)
+		counts = {}
+		for endpoint, result in results.items():
+			result = self.federatedHelper._unwrap(result)
+			if isinstance(result, Exception):
+				self.errors[endpoint] = result
+			else:
+				counts[endpoint] = result
+		return counts
+
+	def documentsCount(self):
+		"""Total number of results over every shard. -1 if any has not completed."""
+		counts = self.shardCounts().values()
+		if any(count < 0 for count in counts):
+			return -1
+		return sum(counts)
+
+	def metadata(self, fieldNames = [], order = "roundrobin", **kwargs):
+		"""
+			Returns an iterable of (endpoint, metadata) for every shard's
+			results, merged in the given order. kwargs are passed to each shard's
+			MimirResultSet.metadata.
+		"""
+		return self.__merge(order,
+			lambda resultSet: resultSet.metadata(fieldNames, **kwargs))
+
+	def ids(self, order = "roundrobin", **kwargs):
+		"""
+			Returns an iterable of (endpoint, documentId) for every shard's
+			results, merged in the given order. kwargs are passed to each shard's
+			MimirResultSet.ids.
+		"""
+		return self.__merge(order, lambda resultSet: resultSet.ids(**kwargs))
+
+	def results(self, metadataFieldNames = [], order = "roundrobin", **kwargs):
+		"""
+			Returns an iterable of (endpoint, MimirResult) for every shard's
+			results, merged in the given order. kwargs are passed to each shard's
+			MimirResultSet.results.
+
+			Every shard is read on its own thread, with at most bufferSize results
+			waiting per shard. With order "roundrobin" the shards take turns,
+			while "interleaved" yields results in the order they arrive. A shard
+			that fails, or has no result ready within shardTimeout of being
+			waited on, is dropped and its exception kept in errors, unless
+			failFast is set.
+		"""
+		return self.__merge(order,
+			lambda resultSet: resultSet.results(metadataFieldNames, **kwargs))
+
+	def __merge(self, order, iterate):
+		if order not in ORDERS:
+			raise ValueError("Unknown order %r, expected one of %r" % (order, ORDERS))
+
+		stop = threading.Event()
+		timeout = self.federatedHelper.shardTimeout
+
+		def put(queue, entry):
+			while not stop.is_set():
+				try:
+					queue.put(entry, timeout = 0.1)
+					return True
+				except Full:
+					pass
+			return False
+
+		def produce(endpoint, resultSet, queue):
+			iterable = iterate(resultSet)
+			try:
+				for item in iterable:
+					if not put(queue, (endpoint, item)):
+						return
+				put(queue, (endpoint, _DONE))
+			except Exception as e:
+				put(queue, (endpoint, _Failure(e)))
+			finally:
+				if hasattr(iterable, "close"):
+					iterable.close()
+
+		if order == "interleaved":
+			shared = Queue(self.bufferSize * max(len(self.resultSets), 1))
+			queues = [(endpoint, shared) for endpoint, resultSet in self.resultSets]
+		else:
+			queues = [(endpoint, Queue(self.bufferSize)) for endpoint, resultSet in self.resultSets]
+
+		threads = []
+		for (endpoint, resultSet), (endpoint, queue) in zip(self.resultSets, queues):
+			thread = threading.Thread(target = produce, args = (endpoint, resultSet, queue))
+			thread.daemon = True
+			thread.start()
+			threads.append(thread)
+
+		try:
+			active = list(queues)
+			turn = 0
+			while active:
+				turn %= len(active)
+				try:
+					if order == "interleaved":
+						endpoint, item = active[0][1].get(timeout = timeout)
+					else:
+						endpoint, item = active[turn][1].get(timeout = timeout)
+				except Empty:
+					# Every shard being waited on has stalled
+					waited = active if order == "interleaved" else [active[turn]]
+					for endpoint, queue in waited:
+						self.__drop(endpoint, _timedOut(endpoint, timeout))
+					active = [(e, q) for e, q in active if (e, q) not in waited]
+					continue
+
+				if item is _DONE or isinstance(item, _Failure):
+					active = [(e, q) for e, q in active if e != endpoint]
+					if isinstance(item, _Failure):
+						self.__drop(endpoint, item.exception)
+					continue
+
+				turn += 1
+				yield endpoint, item
+		finally:
+			stop.set()
+			# A stalled shard's thread is left to finish on its own
+			deadline = None if timeout is None else time.time() + timeout
+			for thread in threads:
+				thread.join(None if deadline is None else max(deadline - time.time(), 0))
+
+	def __drop(self, endpoint, exception):
+		if self.federatedHelper.failFast:
+			raise exception
+		self.errors[endpoint] = exception
@@ -0,0 +1,90 @@
+import unittest, time
+from mimir.mimir_federated import *
+from mimir.mimir_fake import MimirFakeServer
+from mimir.mimir_helpers import MimirResult
+
+class TestMimirFederatedHelper(unittest.TestCase):
+	def setUp(self):
+		self.shards = [MimirFakeServer(documents=6), MimirFakeServer(documents=4)]
+		self.endpoints = [shard.start() for shard in self.shards]
+		self.mimir = MimirFederatedHelper(self.endpoints, shardTimeout=0.5)
+
+	def tearDown(self):
+		self.mimir.shutdown()
+		for shard in self.shards:
+			shard.shutdown()
+
+	def testResultsTaggedWithShard(self):
+		with self.mimir.query("{Hashtag}") as resultSet:
+			self.assertEqual(resultSet.shardCounts(), dict(zip(self.endpoints, [6, 4])))
+			self.assertEqual(resultSet.documentsCount(), 10)
+
+			seen = list(resultSet.results(limit=3))
+			self.assertEqual(len(seen), 6)
+			self.assertEqual([endpoint for endpoint, result in seen[:2]], self.endpoints)
+			for endpoint, result in seen:
+				self.assertIsInstance(result, MimirResult)
+		for shard in self.shards:
+			self.assertEqual(shard.queries, {})
+
+	def testInterleavedIds(self):
+		seen = list(self.mimir.ids("{Hashtag}", order="interleaved"))
+		self.assertEqual(sorted(seen), sorted(
+			[(self.endpoints[0], self.shards[0].documentIdAt(rank)) for rank in range(6)] +
+			[(self.endpoints[1], self.shards[1].documentIdAt(rank)) for rank in range(4)]))
+
+	def testFailedShardDropped(self):
+		with self.mimir.query("{Hashtag}") as resultSet:
+			self.shards[1].errorRate = 1.0
+			self.assertEqual(resultSet.shardCounts(), {self.endpoints[0]: 6})
+			self.assertEqual(list(resultSet.errors.keys()), [self.endpoints[1]])
+
+			seen = list(resultSet.ids())
+			self.assertEqual(len(seen), 6)
+
+	def testFailedPostDropped(self):
+		failing = MimirFederatedHelper(self.endpoints + ["http://localhost:1/search/"])
+		with failing.query("{Hashtag}") as resultSet:
+			self.assertEqual(list(resultSet.errors.keys()), ["http://localhost:1/search/"])
+			self.assertEqual(resultSet.documentsCount(), 10)
+
+	def testFailFast(self):
+		mimir = MimirFederatedHelper(self.endpoints, failFast=True)
+		self.shards[1].errorRate = 1.0
+		with self.assertRaises(Exception):
+			with mimir.query("{Hashtag}"):
+				pass
+
+	def testSlowShardDropped(self):
+		slow = self.shards[1]
+		slow.latency = 1.0
+		started = time.time()
+		with self.mimir.query("{Hashtag}") as resultSet:
+			self.assertEqual(list(resultSet.errors.keys()), [self.endpoints[1]])
+			self.assertEqual(resultSet.documentsCount(), 6)
+		self.assertLess(time.time() - started, 1.5)
+		self.assertEqual(self.shards[0].queries, {})
+
+		# The slow shard's queryId is closed once it arrives
+		for i in range(50):
+			if slow.nextQueryId and not slow.queries:
+				break
+			time.sleep(0.1)
+		self.assertEqual(slow.nextQueryId, 1)
+		self.assertEqual(slow.queries, {})
+
+	def testShardSlowToFetchDropped(self):
+		for order in ORDERS:
+			self.shards[1].latency = 0.0
+			with self.mimir.query("{Hashtag}") as resultSet:
+				self.shards[1].latency = 2.0
+				started = time.time()
+				seen = list(resultSet.ids(order=order))
+				self.assertLess(time.time() - started, 1.5)
+				self.assertIn(self.endpoints[1], resultSet.errors)
+				self.assertEqual([documentId for endpoint, documentId in seen
+					if endpoint == self.endpoints[0]],
+					[self.shards[0].documentIdAt(rank) for rank in range(6)])
+
+if __name__ == '__main__':
+    unittest.main()
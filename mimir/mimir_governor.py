@@ -0,0 +1,116 @@
+import random, threading, time
+import requests
+from requests.packages.urllib3.exceptions import HTTPError as _TransportError
+
+# HTTP statuses with which an overloaded server turns requests away
+TRANSIENT_STATUSES = (429, 500, 502, 503, 504)
+
+def isTransient(exception):
+	"""Whether exception is a failure that may succeed if the call is made again"""
+	if isinstance(exception, requests.HTTPError):
+		return (exception.response is not None and
+			exception.response.status_code in TRANSIENT_STATUSES)
+	return isinstance(exception, (requests.ConnectionError, requests.Timeout,
+		requests.exceptions.ChunkedEncodingError, _TransportError))
+
+class MimirRetry(object):
+	"""
+		Retry policy for MimirHelper. Idempotent calls that fail with a
+		transient error are made again, up to attempts times in all, after a
+		random delay of up to backoff * 2 ** retry seconds.
+	"""
+	def __init__(self, attempts = 3, backoff = 0.1, maxBackoff = 10.0):
+		"""
+			@param attempts times a call is made before its failure is raised
+			@param backoff seconds that bound the delay before the first retry
+			@param maxBackoff seconds that bound the delay before any retry
+		"""
+		self.attempts = attempts
+		self.backoff = backoff
+		self.maxBackoff = maxBackoff
+
+	def delay(self, attempt, exception):
+		"""
+			Returns the seconds to wait before retrying a call whose attempt,
+			counting from 0, failed with exception, or None to give up.
+		"""
+		if attempt + 1 >= self.attempts or not isTransient(exception):
+			return None
+		return random.uniform(0, min(self.maxBackoff, self.backoff * 2 ** attempt))
+
+class MimirGovernor(object):
+	"""
+		Adaptive limit on the number of requests in flight to a Mimir server.
+
+		The limit grows by one for every limit's worth of healthy responses,
+		and is cut by backoffRatio when a call fails with a transient error or
+		takes more than spikeRatio times the usual time for its endpoint path
+		to respond. Responses to requests that were already in flight when the
+		limit was cut are not counted again, so one overload cuts the limit
+		once. The limit so settles near what the server can sustain.
+
+		May be shared between helpers for the same server. Safe to share
+		between threads.
+	"""
+	def __init__(self, initialLimit = 4, minLimit = 1, maxLimit = 64, spikeRatio = 3.0,
+			minSpike = 0.05, backoffRatio = 0.5, smoothing = 0.1):
+		"""
+			@param spikeRatio how many times its usual latency a response may
+				take before it counts as a spike
+			@param minSpike seconds over its usual latency a response may take
+				regardless, so that jitter on fast calls is not a spike
+			@param smoothing weight of each response in the usual latency
+		"""
+		self.limit = float(initialLimit)
+		self.minLimit = minLimit
+		self.maxLimit = maxLimit
+		self.spikeRatio = spikeRatio
+		self.minSpike = minSpike
+		self.backoffRatio = backoffRatio
+		self.smoothing = smoothing
+
+		self.condition = threading.Condition()
+		self.inFlight = 0
+		self.latencies = {}
+		self.lastCut = 0.0
+		self.cuts = 0
+
+	def acquire(self):
+		"""Blocks until another request may be sent"""
+		with self.condition:
+			while self.inFlight >= int(self.limit):
+				self.condition.wait()
+			self.inFlight += 1
+
+	def release(self, path, started, seconds, failure = None):
+		"""
+			Gives back the slot of a finished request and adjusts the limit.
+
+			@param started time the request was sent
+			@param seconds time the server took to start responding
+			@param failure the exception the request failed with, if any
+		"""
+		overloaded = failure is not None and isTransient(failure)
+		with self.condition:
+			self.inFlight -= 1
+			usual = self.latencies.get(path)
+			spike = usual is not None and \
+				seconds > max(usual * self.spikeRatio, usual + self.minSpike)
+
+			if overloaded or spike:
+				if started > self.lastCut:
+					self.limit = max(float(self.minLimit), self.limit * self.backoffRatio)
+					self.lastCut = time.time()
+					self.cuts += 1
+			else:
+				self.limit = min(float(self.maxLimit), self.limit + 1.0 / self.limit)
+
+			if not overloaded:
+				self.latencies[path] = seconds if usual is None else \
+					usual + self.smoothing * (seconds - usual)
+			self.condition.notify_all()
+
+	def stats(self):
+		"""Returns a dict of the current limit, requests in flight and number of cuts"""
+		with self.condition:
+			return {"limit": self.limit, "inFlight": self.inFlight, "cuts": self.cuts}
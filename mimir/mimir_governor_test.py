@@ -0,0 +1,91 @@
+import unittest, threading, time
+import requests
+from mimir.mimir_governor import *
+from mimir.mimir_fake import MimirFakeServer
+from mimir.mimir_helpers import MimirHelper, MimirException
+from mimir.mimir_metrics import MimirMetrics
+
+def _httpError(status):
+	response = requests.Response()
+	response.status_code = status
+	return requests.HTTPError(response=response)
+
+class TestMimirRetry(unittest.TestCase):
+	def testDelay(self):
+		retry = MimirRetry(attempts=3, backoff=0.1)
+		for attempt in (0, 1):
+			delay = retry.delay(attempt, requests.ConnectionError())
+			self.assertTrue(0 <= delay <= 0.1 * 2 ** attempt)
+		self.assertIsNone(retry.delay(2, requests.ConnectionError()))
+		self.assertIsNone(retry.delay(0, MimirException("Query ID not known")))
+		self.assertIsNone(retry.delay(0, _httpError(404)))
+		self.assertIsNotNone(retry.delay(0, _httpError(503)))
+
+class TestMimirGovernor(unittest.TestCase):
+	def testIncreaseAndCut(self):
+		governor = MimirGovernor(initialLimit=4, maxLimit=5)
+		for i in range(20):
+			governor.acquire()
+			governor.release("documentId", time.time(), 0.01)
+		self.assertEqual(governor.stats()["limit"], 5)
+
+		started = time.time()
+		governor.release("documentId", started, 0.01, _httpError(503))
+		governor.release("documentId", started, 0.01, _httpError(503))
+		self.assertEqual(governor.stats()["limit"], 2.5)
+		self.assertEqual(governor.stats()["cuts"], 1)
+
+		governor.release("documentId", time.time(), 1.0)
+		self.assertEqual(governor.stats()["limit"], 1.25)
+		governor.release("documentId", time.time(), 0.01, MimirException("Query ID not known"))
+		self.assertEqual(governor.stats()["cuts"], 2)
+
+	def testLimitsInFlight(self):
+		governor = MimirGovernor(initialLimit=2)
+		governor.acquire()
+		governor.acquire()
+		self.assertEqual(governor.stats()["inFlight"], 2)
+
+class TestMimirHelperRetry(unittest.TestCase):
+	def testRetriesTransientErrors(self):
+		with MimirFakeServer(documents=30, errorRate=0.3) as fake:
+			helper = MimirHelper(fake.endpoint, retry=MimirRetry(attempts=20, backoff=0.001))
+			self.assertEqual(len(list(helper.results("{Token}", workers=4))), 30)
+			self.assertGreater(fake.rejected, 0)
+
+	def testOverloadedServer(self):
+		with MimirFakeServer(documents=100, capacity=4, latency=0.005) as fake:
+			governor = MimirGovernor(initialLimit=16)
+			helper = MimirHelper(fake.endpoint, governor=governor, poolMaxsize=16,
+				retry=MimirRetry(attempts=20, backoff=0.005))
+			self.assertEqual(len(list(helper.ids("{Token}", workers=16))), 100)
+			self.assertLess(governor.stats()["limit"], 16)
+
+	def testQueueingIsNotLatency(self):
+		with MimirFakeServer(documents=300, latency=0.02) as fake:
+			governor = MimirGovernor(initialLimit=4, maxLimit=64)
+			metrics = MimirMetrics()
+			helper = MimirHelper(fake.endpoint, governor=governor, metrics=metrics, poolMaxsize=64)
+			self.assertEqual(len(list(helper.ids("{Token}", workers=64))), 300)
+			self.assertEqual(governor.stats()["cuts"], 0)
+			stats = metrics.snapshot()["documentId"]
+			self.assertLess(stats["waitSeconds"] / stats["calls"], 0.06)
+
+	def testCallsWhileStreaming(self):
+		with MimirFakeServer(documents=3) as fake:
+			helper = MimirHelper(fake.endpoint, governor=MimirGovernor(initialLimit=1, maxLimit=1))
+			ids = []
+			def run():
+				with helper.query("{Token}") as resultSet:
+					for token in resultSet.iterDocumentTextTokens(0):
+						ids.append(resultSet.documentId(1))
+						break
+			thread = threading.Thread(target=run)
+			thread.daemon = True
+			thread.start()
+			thread.join(10)
+			self.assertFalse(thread.is_alive())
+			self.assertEqual(ids, [fake.documentIdAt(1)])
+
+if __name__ == '__main__':
+    unittest.main()
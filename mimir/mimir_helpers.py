@@ -1,41 +1,722 @@
 import requests, time
-from urlparse import urljoin
+try:
+	from urlparse import urljoin
+except ImportError:
+	from urllib.parse import urljoin
+	long = int
+	xrange = range
 import xml.etree.ElementTree as ET
+try:
+	import xml.etree.cElementTree as _cElementTree
+except ImportError:
+	_cElementTree = ET
+try:
+	from lxml import etree as _lxml
+except ImportError:
+	_lxml = None
+from array import array
 from contextlib import contextmanager
+from collections import deque, OrderedDict
+from multiprocessing.pool import ThreadPool
 
 NS = {"mimir": "http://gate.ac.uk/ns/mimir"}
+_STATE = "{%s}state" % NS["mimir"]
+_ERROR = "{%s}error" % NS["mimir"]
+_DATA = "{%s}data" % NS["mimir"]
+_TEXT = "{%s}text" % NS["mimir"]
+_HIT = "{%s}hit" % NS["mimir"]
+_HITS = "{%s}hits" % NS["mimir"]
+_VALUE = "{%s}value" % NS["mimir"]
+_QUERY_ID = "{%s}queryId" % NS["mimir"]
+_DOCUMENT_URI = "{%s}documentURI" % NS["mimir"]
+_DOCUMENT_TITLE = "{%s}documentTitle" % NS["mimir"]
+_METADATA_FIELD = "{%s}metadataField" % NS["mimir"]
+_TEXT_TAGS = frozenset(["text", _TEXT])
+
+# Bytes of a streamed response parsed at a time
+_CHUNK_SIZE = 16 * 1024
+
+# Bytes of a streamed rendering passed on at a time
+RENDER_CHUNK_SIZE = 64 * 1024
+
+# XML parsers that can decode responses, by name, with the exceptions they 
+# raise on malformed XML
+XML_BACKENDS = {"etree": (_cElementTree, (_cElementTree.ParseError, ET.ParseError))}
+if _lxml is not None:
+	XML_BACKENDS["lxml"] = (_lxml, (_lxml.XMLSyntaxError,))
+
+_xml, _xmlErrors = XML_BACKENDS["lxml" if _lxml is not None else "etree"]
+
+def setXmlBackend(name):
+	"""
+		Chooses the XML parser that decodes responses: "lxml", the default 
+		when it is installed, or "etree" for the standard library's 
+		ElementTree, in C where available.
+
+		@throws ValueError if the backend is unknown or not installed
+	"""
+	global _xml, _xmlErrors
+	if name not in XML_BACKENDS:
+		raise ValueError("Unknown or uninstalled XML backend %r, expected one of %r" % 
+			(name, sorted(XML_BACKENDS)))
+	_xml, _xmlErrors = XML_BACKENDS[name]
+
+def xmlBackend():
+	"""Returns the name of the XML parser that decodes responses"""
+	for name, (module, errors) in XML_BACKENDS.items():
+		if module is _xml:
+			return name
+
 class MimirException(Exception):
 	pass
 
 class MimirMetadata(object): 
+	__slots__ = ("documentTitle", "documentURI", "metadata")
+
 	def __init__(self, documentTitle, documentURI, metadata):
 		self.documentTitle = documentTitle
 		self.documentURI = documentURI
 		self.metadata = metadata
 
 class MimirDocumentHit(object):
+	__slots__ = ("documentId", "termPosition", "length")
+
 	def __init__(self, documentId, termPosition, length):
 		self.documentId = documentId
 		self.termPosition = termPosition
 		self.length = length
 
 class MimirDocumentToken(object):
+	__slots__ = ("position", "text", "isSpace")
+
 	def __init__(self, text, position = -1, isSpace = False):
 		self.position = position
 		self.text = text
 		self.isSpace = isSpace
 
+class MimirDocumentTokens(object):
+	"""
+		Compact sequence of the tokens of a document.
+
+		Holds the document text as a single string, with arrays of each token's 
+		offset into it, its position and whether it is a space. 
+		MimirDocumentTokens are only created when the sequence is indexed or 
+		iterated.
+	"""
+	__slots__ = ("text", "offsets", "positions", "spaces")
+
+	def __init__(self, text, offsets, positions, spaces):
+		self.text = text
+		self.offsets = offsets
+		self.positions = positions
+		self.spaces = spaces
+
+	@classmethod
+	def fromTokens(cls, tokens):
+		"""Packs an iterable of MimirDocumentTokens"""
+		parts = []
+		offsets = array("l", [0])
+		positions = array("l")
+		spaces = array("b")
+
+		for token in tokens:
+			text = token.text or u""
+			parts.append(text)
+			offsets.append(offsets[-1] + len(text))
+			positions.append(token.position)
+			spaces.append(token.isSpace)
+
+		return cls(u"".join(parts), offsets, positions, spaces)
+
+	def __len__(self):
+		return len(self.positions)
+
+	def __getitem__(self, index):
+		if isinstance(index, slice):
+			return [self[i] for i in xrange(*index.indices(len(self)))]
+		if index < 0:
+			index += len(self)
+		if not 0 <= index < len(self):
+			raise IndexError("Index out of range")
+
+		return MimirDocumentToken(self.text[self.offsets[index]:self.offsets[index + 1]],
+			position = self.positions[index], isSpace = bool(self.spaces[index]))
+
+	def __iter__(self):
+		for index in xrange(len(self)):
+			yield self[index]
+
+class MimirDocumentHits(object):
+	"""
+		Compact sequence of the hits in a document, held as arrays of 
+		documentId, termPosition and length. MimirDocumentHits are only created 
+		when the sequence is indexed or iterated.
+	"""
+	__slots__ = ("documentIds", "termPositions", "lengths")
+
+	def __init__(self, documentIds, termPositions, lengths):
+		self.documentIds = documentIds
+		self.termPositions = termPositions
+		self.lengths = lengths
+
+	@classmethod
+	def fromHits(cls, hits):
+		"""Packs an iterable of MimirDocumentHits"""
+		documentIds = array("l")
+		termPositions = array("l")
+		lengths = array("l")
+
+		for hit in hits:
+			documentIds.append(hit.documentId)
+			termPositions.append(hit.termPosition)
+			lengths.append(hit.length)
+
+		return cls(documentIds, termPositions, lengths)
+
+	def __len__(self):
+		return len(self.documentIds)
+
+	def __getitem__(self, index):
+		if isinstance(index, slice):
+			return [self[i] for i in xrange(*index.indices(len(self)))]
+		if index < 0:
+			index += len(self)
+		if not 0 <= index < len(self):
+			raise IndexError("Index out of range")
+
+		return MimirDocumentHit(self.documentIds[index], self.termPositions[index],
+			self.lengths[index])
+
+	def __iter__(self):
+		for index in xrange(len(self)):
+			yield self[index]
+
+RESULT_FIELDS = ("metadata", "id", "tokens", "hits")
+
+# Calls that can safely be made again if they fail
+IDEMPOTENT_PATHS = frozenset(["documentsCountSync", "documentsCount", "documentsCurrentCount", 
+	"documentId", "documentMetadata", "documentHits", "documentText", "renderDocument"])
+
+_UNFETCHED = object()
+
 class MimirResult(object):
+	"""
+		A single result of a query.
+
+		Results made by MimirResult.lazy fetch each part from their result set 
+		the first time it is read, and keep it from then on. Such results can 
+		only fetch while their query is open.
+	"""
+	__slots__ = ("_metadata", "_documentId", "_tokens", "_hits", 
+		"resultSet", "rank", "metadataFieldNames")
+
 	def __init__(self, metadata, documentId, tokens, hits):
-		self.metadata = metadata
-		self.documentId = documentId
+		if not isinstance(tokens, MimirDocumentTokens):
+			tokens = MimirDocumentTokens.fromTokens(tokens)
+		if not isinstance(hits, MimirDocumentHits):
+			hits = MimirDocumentHits.fromHits(hits)
+
+		self._metadata = metadata
+		self._documentId = documentId
+		self._tokens = tokens
+		self._hits = hits
+		self.resultSet = None
+		self.rank = None
+		self.metadataFieldNames = []
+
+	@classmethod
+	def lazy(cls, resultSet, rank, metadataFieldNames = [], **fetched):
+		"""
+			Creates a result for the given rank whose parts are fetched on demand.
+
+			@param fetched any parts that are already known, keyed by name in 
+				RESULT_FIELDS
+		"""
+		result = cls.__new__(cls)
+		result._metadata = fetched.get("metadata", _UNFETCHED)
+		result._documentId = fetched.get("id", _UNFETCHED)
+		result._tokens = fetched.get("tokens", _UNFETCHED)
+		result._hits = fetched.get("hits", _UNFETCHED)
+		result.resultSet = resultSet
+		result.rank = rank
+		result.metadataFieldNames = metadataFieldNames
+		return result
+
+	@property
+	def metadata(self):
+		if self._metadata is _UNFETCHED:
+			self._metadata = self.resultSet.documentMetadata(self.rank, self.metadataFieldNames, 
+				self.__knownDocumentId())
+		return self._metadata
+
+	def __knownDocumentId(self):
+		if self._documentId is _UNFETCHED:
+			return None
+		return self._documentId
+
+	@property
+	def documentId(self):
+		if self._documentId is _UNFETCHED:
+			self._documentId = self.resultSet.documentId(self.rank)
+		return self._documentId
+
+	@property
+	def tokens(self):
+		if self._tokens is _UNFETCHED:
+			self._tokens = self.resultSet.documentTextTokens(self.rank, 
+				documentId = self.__knownDocumentId())
+		return self._tokens
+
+	@property
+	def hits(self):
+		if self._hits is _UNFETCHED:
+			self._hits = self.resultSet.documentHits(self.rank)
+		return self._hits
+
+	@property
+	def text(self):
+		return self.tokens.text
+
+class MimirSnippet(object):
+	"""
+		A window of a document's tokens around one or more of its hits, for 
+		keyword-in-context display.
+
+		termPosition and length are those of the window, and hits holds the 
+		(termPosition, length) of every hit inside it.
+	"""
+	__slots__ = ("termPosition", "length", "tokens", "hits")
+
+	def __init__(self, termPosition, length, tokens, hits):
+		self.termPosition = termPosition
+		self.length = length
 		self.tokens = tokens
-		self.text = u"".join(token.text for token in tokens)
 		self.hits = hits
 
+	@property
+	def text(self):
+		return self.tokens.text
+
+	def __isHit(self, position):
+		for termPosition, length in self.hits:
+			if termPosition <= position < termPosition + length:
+				return True
+		return False
+
+	def spans(self):
+		"""
+			Yields (text, isHit) for the runs of the window's text that are 
+			inside and outside of hits. A space is part of a hit if the tokens 
+			on both sides of it are.
+		"""
+		tokens = self.tokens
+		flags = [not tokens.spaces[i] and self.__isHit(tokens.positions[i]) 
+			for i in xrange(len(tokens))]
+		for i in xrange(len(tokens)):
+			if tokens.spaces[i]:
+				flags[i] = 0 < i < len(tokens) - 1 and flags[i - 1] and flags[i + 1]
+
+		parts = []
+		current = None
+		for i in xrange(len(tokens)):
+			if flags[i] != current and parts:
+				yield u"".join(parts), current
+				parts = []
+			current = flags[i]
+			parts.append(tokens.text[tokens.offsets[i]:tokens.offsets[i + 1]])
+		if parts:
+			yield u"".join(parts), current
+
+	def highlight(self, before = u"<b>", after = u"</b>"):
+		"""Returns the window's text with every hit between before and after"""
+		return u"".join(before + text + after if isHit else text for text, isHit in self.spans())
+
+@contextmanager
+def _parsing():
+	"""Raises the parse errors of the XML backend as xml.etree.ElementTree.ParseError"""
+	try:
+		yield
+	except _xmlErrors as e:
+		if isinstance(e, ET.ParseError):
+			raise
+		raise ET.ParseError(*e.args)
+
+def _parseMessage(source):
+	"""
+		Parses a raw mimir response from a file-like source of bytes and returns 
+		the XML Element for its data field.
+
+		@throws MimirException if the server reported an error
+		@throws xml.etree.ElementTree.ParseError if parse was not possible on response
+	"""
+	with _parsing():
+		root = _xml.parse(source).getroot()
+
+	state = root.find(_STATE).text
+
+	if state == "ERROR":
+		message = root.find(_ERROR).text
+		raise MimirException(message)
+	else:
+		return root.find(_DATA)
+
+def _eventBatches(source):
+	"""
+		Parses a file-like source of bytes a chunk at a time, yielding an 
+		iterable of the (event, element) pairs of each chunk. Uses the pull 
+		parser of the XML backend where it has one, which costs less per 
+		event than iterparse.
+	"""
+	if not hasattr(_xml, "XMLPullParser"):
+		yield _xml.iterparse(source, events = ("start", "end"))
+		return
+
+	parser = _xml.XMLPullParser(events = ("start", "end"))
+	while True:
+		data = source.read(_CHUNK_SIZE)
+		if not data:
+			break
+		parser.feed(data)
+		yield parser.read_events()
+	parser.close()
+	yield parser.read_events()
+
+def _iterData(source):
+	"""
+		Incrementally parses a raw mimir response from a file-like source of 
+		bytes, yielding each element inside the data field as soon as its end 
+		tag has been read.
+
+		Elements are detached from the tree once the caller moves on, so the 
+		whole response is never held in memory.
+
+		@throws MimirException if the server reported an error
+		@throws xml.etree.ElementTree.ParseError if parse was not possible on response
+	"""
+	parents = []
+	depth = 0
+	state = None
+	with _parsing():
+		for events in _eventBatches(source):
+			for event, elem in events:
+				if event == "start":
+					parents.append(elem)
+					depth += 1
+					continue
+
+				parents.pop()
+				depth -= 1
+				if depth == 1:
+					if elem.tag == _STATE:
+						state = elem.text
+					elif elem.tag == _ERROR:
+						raise MimirException(elem.text)
+				elif depth > 1 and parents[1].tag == _DATA:
+					yield elem
+					parents[-1].remove(elem)
+
+	if state == "ERROR":
+		raise MimirException("Mimir reported an error without a message")
+
+def _parseValue(data):
+	return long(data.find(_VALUE).text)
+
+def _parseMetadata(data):
+	uri = data.find(_DOCUMENT_URI).text
+	title = data.find(_DOCUMENT_TITLE).text
+	metadata = data.findall(_METADATA_FIELD)
+
+	metadata = {e.get("name"): e.get("value") for e in metadata}
+
+	return MimirMetadata(title, uri, metadata)
+
+def _parseHits(data):
+	return _packHits(data.find(_HITS))
+
+def _packHits(elems):
+	"""
+		Packs the hit elements among elems into MimirDocumentHits, without 
+		making a MimirDocumentHit for each
+	"""
+	documentIds = array("l")
+	termPositions = array("l")
+	lengths = array("l")
+
+	for elem in elems:
+		if elem.tag == _HIT:
+			get = elem.get
+			documentIds.append(long(get("documentId")))
+			termPositions.append(int(get("termPosition")))
+			lengths.append(int(get("length")))
+
+	return MimirDocumentHits(documentIds, termPositions, lengths)
+
+def _hitFromElement(hit):
+	return MimirDocumentHit(long(hit.attrib["documentId"]),
+							int(hit.attrib["termPosition"]),
+							int(hit.attrib["length"]))
+
+def _parseTokens(data):
+	return _packTokens(data)
+
+def _packTokens(elems):
+	"""
+		Packs the text and space elements of a documentText response into 
+		MimirDocumentTokens, without making a MimirDocumentToken for each
+	"""
+	parts = []
+	offsets = array("l", [0])
+	positions = array("l")
+	spaces = array("b")
+	offset = 0
+
+	for elem in elems:
+		text = elem.text or u""
+		parts.append(text)
+		offset += len(text)
+		offsets.append(offset)
+		if elem.tag in _TEXT_TAGS:
+			positions.append(int(elem.get("position")))
+			spaces.append(False)
+		else:
+			positions.append(-1)
+			spaces.append(True)
+
+	return MimirDocumentTokens(u"".join(parts), offsets, positions, spaces)
+
+def _tokenFromElement(tag):
+	if tag.tag in _TEXT_TAGS:
+		return MimirDocumentToken(tag.text, position = int(tag.attrib["position"]))
+	else:
+		return MimirDocumentToken(tag.text, isSpace=True)
+
+def _snippetWindows(hits, context):
+	"""
+		Returns the (termPosition, length, hits) of the windows of context 
+		tokens either side of the hits, with overlapping or adjacent windows 
+		merged into one.
+	"""
+	windows = []
+	for hit in sorted(hits, key = lambda hit: hit.termPosition):
+		start = max(hit.termPosition - context, 0)
+		end = hit.termPosition + hit.length + context
+		if windows and start <= windows[-1][1]:
+			windows[-1][1] = max(windows[-1][1], end)
+			windows[-1][2].append((hit.termPosition, hit.length))
+		else:
+			windows.append([start, end, [(hit.termPosition, hit.length)]])
+	return [(start, end - start, windowHits) for start, end, windowHits in windows]
+
+class _CallTimer(object):
+	"""
+		Times the phases of one call for MimirMetrics: waiting for the response
+		to start, reading its body and everything else, mostly parsing. Wraps
+		the raw body to count the bytes and time spent reading it.
+	"""
+	def __init__(self, path):
+		self.path = path
+		self.start = time.time()
+		self.opened = self.start
+		self.raw = None
+		self.bytes = 0
+		self.readSeconds = 0.0
+
+	def content(self, result):
+		"""Marks a streamed response as started, and reads its whole body"""
+		self.opened = time.time()
+		content = result.content
+		self.readSeconds = time.time() - self.opened
+		self.bytes = len(content)
+		return content
+
+	def body(self, raw):
+		"""Marks the response as started, and returns its body wrapped for reading"""
+		self.opened = time.time()
+		self.raw = raw
+		return self
+
+	def read(self, size = None):
+		start = time.time()
+		data = self.raw.read(size)
+		self.readSeconds += time.time() - start
+		self.bytes += len(data)
+		return data
+
+	def chunks(self, raw, chunkSize):
+		"""
+			Marks the response as started, and yields its body, with any 
+			transfer compression decoded, up to chunkSize bytes at a time
+		"""
+		self.opened = time.time()
+		chunks = raw.stream(chunkSize, decode_content = True)
+		while True:
+			start = time.time()
+			chunk = next(chunks, None)
+			self.readSeconds += time.time() - start
+			if chunk is None:
+				return
+			self.bytes += len(chunk)
+			# Older urllib3 reads chunkSize bytes before decompressing them
+			for offset in xrange(0, len(chunk), chunkSize):
+				yield chunk[offset:offset + chunkSize]
+
+	def record(self, metrics, error):
+		seconds = time.time() - self.start
+		waitSeconds = self.opened - self.start
+		metrics.record(self.path, seconds, self.bytes, waitSeconds, self.readSeconds,
+			max(seconds - waitSeconds - self.readSeconds, 0.0), error)
+
+def _writeChunks(chunks, sink):
+	"""Writes every chunk to sink, and returns the number of bytes written"""
+	size = 0
+	for chunk in chunks:
+		sink.write(chunk)
+		size += len(chunk)
+	return size
+
+def _fetchInOrder(fetchers, ranks, workers, window = None):
+	"""
+		Runs every fetcher against every rank on a pool of worker threads and 
+		yields the rank and a tuple of the fetched values for each rank, in 
+		rank order.
+
+		At most window ranks are in flight or waiting to be yielded at any one 
+		time, so memory stays bounded however many ranks there are.
+
+		@param fetchers callables taking a rank
+		@param ranks iterable of ranks to fetch
+		@param workers number of worker threads
+		@param window number of ranks to fetch ahead, defaults to twice workers
+	"""
+	if window is None:
+		window = workers * 2
+	window = max(window, 1)
+
+	pool = ThreadPool(workers)
+	pending = deque()
+	try:
+		for rank in ranks:
+			pending.append((rank, [pool.apply_async(fetcher, (rank,)) for fetcher in fetchers]))
+			if len(pending) >= window:
+				rank, results = pending.popleft()
+				yield rank, tuple(r.get() for r in results)
+
+		while pending:
+			rank, results = pending.popleft()
+			yield rank, tuple(r.get() for r in results)
+	finally:
+		pool.terminate()
+		pool.join()
+
 class MimirHelper(object):
-	def __init__(self, endpoint):
+	def __init__(self, endpoint, timeout = None, poolConnections = 10, poolMaxsize = 10, 
+			cache = None, queryCache = None, metrics = None, governor = None, retry = None):
+		"""
+			Creates a helper for the given search endpoint.
+
+			All requests go through a single keep-alive session, so connections 
+			to the server are reused between calls rather than opened per request.
+			The session is safe to share between threads.
+
+			@param timeout seconds to wait for the server, either a single value 
+				or a (connect, read) tuple. None waits forever.
+			@param poolConnections number of per-host connection pools to keep
+			@param poolMaxsize maximum number of connections kept open per host
+			@param cache a MimirDocumentCache, or similar, for document text, 
+				metadata and renderings. It is consulted whenever the documentId 
+				of a rank is known.
+			@param queryCache a MimirQueryCache to reuse the results and 
+				queryIds of repeated query strings
+			@param metrics a MimirMetrics to record the latency, size and
+				outcome of every call, and cache hits, per endpoint path
+			@param governor a MimirGovernor to adapt the number of requests in 
+				flight to what the server sustains
+			@param retry a MimirRetry policy for idempotent calls that fail with 
+				a transient error
+		"""
 		self.endpoint = endpoint
+		self.timeout = timeout
+		self.cache = cache
+		self.queryCache = queryCache
+		self.metrics = metrics
+		self.governor = governor
+		self.retry = retry
+
+		self.session = requests.Session()
+		adapter = requests.adapters.HTTPAdapter(pool_connections = poolConnections,
+			pool_maxsize = poolMaxsize)
+		self.session.mount("http://", adapter)
+		self.session.mount("https://", adapter)
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, excType, excValue, traceback):
+		self.shutdown()
+
+	def shutdown(self):
+		"""
+			Closes all pooled connections held by this helper.
+
+			Not to be confused with close, which releases a query on the server.
+		"""
+		self.session.close()
+
+	def __get(self, path, params, stream = False):
+		"""
+			Issues a GET against the endpoint through the pooled session.
+
+			With stream=True the body is left unread, to be consumed from 
+			result.raw, and the caller must close the result.
+
+			@throws RequestException if there was a problem with the request
+		"""
+		return self.session.get(urljoin(self.endpoint, path),
+			params=params, timeout=self.timeout, stream=stream)
+
+	def __open(self, path, params):
+		"""
+			Issues a streamed GET and returns the response, with its raw body set 
+			to decode any transfer compression.
+
+			@throws RequestException if there was a problem with the request
+		"""
+		result = self.__get(path, params, stream = True)
+		result.raw.decode_content = True
+		return result
+
+	def __call(self, path, params, read):
+		"""
+			Issues a streamed GET and returns read(result, timer) for the response.
+
+			Waits for a slot from the governor, if any. The call is timed from 
+			when it gets the slot, so queueing for it does not count as server 
+			latency. Idempotent calls that fail with a transient error are made 
+			again as the retry policy allows. Every attempt is recorded in metrics.
+
+			@throws RequestException if there was a problem with the request
+		"""
+		attempt = 0
+		while True:
+			self.__acquire()
+			timer = _CallTimer(path)
+			failure = None
+			try:
+				result = self.__open(path, params)
+				try:
+					result.raise_for_status()
+					return read(result, timer)
+				finally:
+					result.close()
+			except Exception as e:
+				failure = e
+				delay = self.__retryDelay(path, attempt, e)
+				if delay is None:
+					raise
+			finally:
+				self.__finish(timer, failure)
+			time.sleep(delay)
+			attempt += 1
 
 	def __queryMimir(self, path, **params):
 		"""
@@ -51,18 +732,115 @@ class MimirHelper(object):
 			@throws xml.etree.ElementTree.ParseError if parse was not possible on response
 
 		"""
-		result = requests.get(urljoin(self.endpoint, path),
-			params=params)
+		return self.__call(path, params, lambda result, timer: _parseMessage(timer.body(result.raw)))
 
-		root = ET.fromstring(result.text.encode('utf-8'))
+	def __streamMimir(self, path, **params):
+		"""
+			Runs a mimir query on the given path with the given parameters, 
+			parsing the response as it arrives.
 
-		state = root.find("mimir:state", NS).text
+			A failed call is only made again if nothing had been yielded yet. 
+			The governor's slot is given back as soon as the response starts, so 
+			other calls can be made while the elements are read, but the time 
+			recorded in metrics runs until the caller has read every element.
 
-		if state == "ERROR":
-			message = root.find("mimir:error", NS).text
-			raise MimirException(message)
-		else:
-			return root.find("mimir:data", NS)
+			@returns iterable of the XML Elements inside the data field of the 
+				response, see _iterData
+
+			@throws RequestException if there was a problem with the request
+			@throws MimirException if there was a problem with the mimir query or 
+					response could not be read
+			@throws xml.etree.ElementTree.ParseError if parse was not possible on response
+		"""
+		return self.__stream(path, params, lambda result, timer: _iterData(timer.body(result.raw)))
+
+	def __stream(self, path, params, iterate):
+		"""
+			Issues a streamed GET and yields the items of iterate(result, timer) 
+			for the response as they are read. Retried, timed and governed as 
+			for __streamMimir.
+
+			@throws RequestException if there was a problem with the request
+		"""
+		attempt = 0
+		while True:
+			self.__acquire()
+			timer = _CallTimer(path)
+			failure = None
+			started = False
+			released = False
+			try:
+				result = self.__open(path, params)
+				try:
+					result.raise_for_status()
+					# Give the slot back once the server has responded, so that
+					# the caller can make other calls while reading the body
+					timer.opened = time.time()
+					self.__release(timer, None)
+					released = True
+					for item in iterate(result, timer):
+						started = True
+						yield item
+				finally:
+					result.close()
+				return
+			except GeneratorExit:
+				raise
+			except Exception as e:
+				failure = e
+				delay = None if started else self.__retryDelay(path, attempt, e)
+				if delay is None:
+					raise
+			finally:
+				if not released:
+					self.__release(timer, failure)
+				self.__record(timer, failure)
+			time.sleep(delay)
+			attempt += 1
+
+	def __fetchText(self, path, params):
+		"""
+			Issues a GET and returns the whole response body as text.
+
+			@throws RequestException if there was a problem with the request
+		"""
+		def read(result, timer):
+			timer.content(result)
+			return result.text
+
+		return self.__call(path, params, read)
+
+	def __acquire(self):
+		if self.governor is not None:
+			self.governor.acquire()
+
+	def __finish(self, timer, failure):
+		"""Releases the governor's slot and records the metrics of a finished attempt"""
+		self.__release(timer, failure)
+		self.__record(timer, failure)
+
+	def __release(self, timer, failure):
+		"""Gives back the governor's slot, reporting how long the server took to respond"""
+		if self.governor is not None:
+			self.governor.release(timer.path, timer.start, timer.opened - timer.start, failure)
+
+	def __record(self, timer, failure):
+		if self.metrics is not None:
+			timer.record(self.metrics, failure is not None)
+
+	def __retryDelay(self, path, attempt, failure):
+		"""Returns the seconds to wait before retrying a failed call, or None to give up"""
+		if self.retry is None or path not in IDEMPOTENT_PATHS:
+			return None
+		delay = self.retry.delay(attempt, failure)
+		if delay is not None and self.metrics is not None:
+			self.metrics.increment("retries", path)
+		return delay
+
+	def __countCache(self, path, value):
+		"""Counts a cache lookup that saved, or did not save, a call to path"""
+		if self.metrics is not None:
+			self.metrics.increment("cacheMisses" if value is None else "cacheHits", path)
 
 	def wait(self, queryId): 
 		"""Waits for the indicated query to finish.
@@ -89,12 +867,43 @@ class MimirHelper(object):
 		return self.__queryMimir("close", queryId = queryId)
 
 	@contextmanager
-	def query(self, query): 
-		"""Posts a query in a contextmanager that closes the query when done"""
+	def query(self, query, wait = True): 
+		"""
+			Posts a query in a contextmanager that closes the query when done
+
+			@param wait whether to wait for the search to finish before returning 
+				the result set. Pass False to stream results with stream=True.
+
+			With a queryCache, a queryId already open for the same query string 
+			is shared rather than posting the query again, and is left for the 
+			cache to close.
+		"""
+		if self.queryCache is not None:
+			handle = self.queryCache.acquire(query, self.postQuery)
+			try:
+				if wait:
+					with handle.lock:
+						if not handle.waited:
+							self.wait(handle.queryId)
+							handle.waited = True
+				resultSet = MimirResultSet(self, handle.queryId, query)
+				try:
+					yield resultSet
+				finally:
+					resultSet.shutdown()
+			finally:
+				self.queryCache.release(handle, self.close)
+			return
+
 		queryId = self.postQuery(query)
-		self.wait(queryId)
 		try:
-			yield MimirResultSet(self, queryId)
+			if wait:
+				self.wait(queryId)
+			resultSet = MimirResultSet(self, queryId, query)
+			try:
+				yield resultSet
+			finally:
+				resultSet.shutdown()
 		finally:
 			self.close(queryId)
 
@@ -113,7 +922,7 @@ class MimirHelper(object):
 			@throws xml.etree.ElementTree.ParseError if parse was not possible on response
 		"""
 		result = self.__queryMimir("postQuery", queryString = query)
-		return result.find("mimir:queryId", NS).text
+		return result.find(_QUERY_ID).text
 		
 	def documentsCurrentCount(self, queryId):
 		"""
@@ -125,7 +934,7 @@ class MimirHelper(object):
 			@throws xml.etree.ElementTree.ParseError if parse was not possible on response
 		"""
 		result = self.__queryMimir("documentsCurrentCount", queryId = queryId)
-		return long(result.find("mimir:value", NS).text)
+		return _parseValue(result)
 
 	def documentsCount(self, queryId):
 		"""
@@ -137,30 +946,36 @@ class MimirHelper(object):
 			@throws xml.etree.ElementTree.ParseError if parse was not possible on response
 		"""
 		result = self.__queryMimir("documentsCount", queryId = queryId)
-		return long(result.find("mimir:value", NS).text)
+		return _parseValue(result)
 
-	def documentMetadata(self, queryId, rank, fieldNames = []):
+	def documentMetadata(self, queryId, rank, fieldNames = [], documentId = None):
 		"""
 			Returns the metadata for the given document, including any additional fieldNames
 
+			@param documentId the id of the document at rank, if known, so that 
+				the cache can be used
+
 			@throws RequestException if there was a problem with the request
 			@throws MimirException if there was a problem with the mimir query or 
 				response could not be read
 			@throws xml.etree.ElementTree.ParseError if parse was not possible on response
 		"""
+		if self.cache is not None and documentId is not None:
+			key = ("metadata", documentId, tuple(sorted(fieldNames)))
+			metadata = self.cache.get(key)
+			self.__countCache("documentMetadata", metadata)
+			if metadata is None:
+				metadata = self.documentMetadata(queryId, rank, fieldNames)
+				self.cache.put(key, metadata)
+			return metadata
+
 		if fieldNames != []:
 			fieldNames = ",".join(fieldNames)
 			result = self.__queryMimir("documentMetadata", queryId = queryId, rank=rank, fieldNames = fieldNames)
 		else:
 			result = self.__queryMimir("documentMetadata", queryId = queryId, rank=rank)
 
-		uri = result.find("mimir:documentURI", NS).text
-		title = result.find("mimir:documentTitle", NS).text
-		metadata = result.findall("mimir:metadataField", NS)
-
-		metadata = {e.attrib["name"]: e.attrib["value"] for e in metadata}
-
-		return MimirMetadata(title, uri, metadata)
+		return _parseMetadata(result)
 
 	def documentId(self, queryId, rank):
 		"""
@@ -172,68 +987,121 @@ class MimirHelper(object):
 			@throws xml.etree.ElementTree.ParseError if parse was not possible on response
 		"""
 		result = self.__queryMimir("documentId", queryId = queryId, rank=rank)
-		return long(result.find("mimir:value", NS).text)
+		return _parseValue(result)
 
 	def documentHits(self, queryId, rank):
 		"""
-			Returns the hits for the given document
+			Returns the hits for the given document, packed into a compact 
+			MimirDocumentHits sequence
 
 			@throws RequestException if there was a problem with the request
 			@throws MimirException if there was a problem with the mimir query or 
 				response could not be read
 			@throws xml.etree.ElementTree.ParseError if parse was not possible on response
 		"""
-		result = self.__queryMimir("documentHits", queryId = queryId, rank=rank)
+		return _packHits(self.__streamMimir("documentHits", queryId = queryId, rank=rank))
 
-		hits = []
+	def iterDocumentHits(self, queryId, rank):
+		"""
+			Returns an iterable of the hits for the given document, yielding each 
+			hit as it is read from the response.
 
-		for hit in result.find("mimir:hits", NS).findall("mimir:hit", NS):
-			hits.append(MimirDocumentHit(hit.attrib["documentId"],
-										 hit.attrib["termPosition"],
-										 hit.attrib["length"]))
+			@throws RequestException if there was a problem with the request
+			@throws MimirException if there was a problem with the mimir query or 
+				response could not be read
+			@throws xml.etree.ElementTree.ParseError if parse was not possible on response
+		"""
+		for elem in self.__streamMimir("documentHits", queryId = queryId, rank=rank):
+			if elem.tag == _HIT:
+				yield _hitFromElement(elem)
+
+	def documentTextTokens(self, queryId, rank, termPosition = 0, length = None, 
+			documentId = None):
+		"""
+			Returns the text for the given document as series of MimirDocumentTokens, 
+			packed into a compact MimirDocumentTokens sequence
 
-		return hits
+			@param documentId the id of the document at rank, if known, so that 
+				the cache can be used for the full text
 
-	def documentTextTokens(self, queryId, rank, termPosition = 0, length = None):
+			@throws RequestException if there was a problem with the request
+			@throws MimirException if there was a problem with the mimir query or 
+				response could not be read
+			@throws xml.etree.ElementTree.ParseError if parse was not possible on response
+		"""
+		if (self.cache is not None and documentId is not None and 
+				termPosition == 0 and length is None):
+			key = ("text", documentId)
+			tokens = self.cache.get(key)
+			self.__countCache("documentText", tokens)
+			if tokens is None:
+				tokens = self.documentTextTokens(queryId, rank)
+				self.cache.put(key, tokens)
+			return tokens
+
+		return _packTokens(self.__streamText(queryId, rank, termPosition, length))
+
+	def iterDocumentTextTokens(self, queryId, rank, termPosition = 0, length = None):
 		"""
-			Returns the text for the given document as series of MimirDocumentTokens
+			Returns an iterable of the text for the given document as 
+			MimirDocumentTokens, yielding each token as it is read from the 
+			response.
 
 			@throws RequestException if there was a problem with the request
 			@throws MimirException if there was a problem with the mimir query or 
 				response could not be read
 			@throws xml.etree.ElementTree.ParseError if parse was not possible on response
 		"""
+		for elem in self.__streamText(queryId, rank, termPosition, length):
+			yield _tokenFromElement(elem)
+
+	def __streamText(self, queryId, rank, termPosition, length):
 		if length != None:
-			result = self.__queryMimir("documentText", queryId = queryId, 
+			return self.__streamMimir("documentText", queryId = queryId, 
 				rank=rank, 
 				termPosition = termPosition,
 				length=length)
 		else:
-			result = self.__queryMimir("documentText", queryId = queryId, 
+			return self.__streamMimir("documentText", queryId = queryId, 
 				rank=rank, 
 				termPosition = termPosition)
 
-		tokens = []
+	def documentText(self, queryId, rank, termPosition = 0, length = None, documentId = None):
+		"""
+			Returns the text for the given document as a string
+
+			@param documentId the id of the document at rank, if known, so that 
+				the cache can be used for the full text
 
-		for tag in result.getchildren():
-			if tag.tag == "text":
-				tokens.append(MimirDocumentToken(tag.text,
-										 position = tag.attr["position"]))
-			else:
-				tokens.append(MimirDocumentToken(tag.text, isSpace=True))
+			@throws RequestException if there was a problem with the request
+			@throws MimirException if there was a problem with the mimir query or 
+				response could not be read
+			@throws xml.etree.ElementTree.ParseError if parse was not possible on response
+		"""
+		if self.cache is not None and documentId is not None:
+			return self.documentTextTokens(queryId, rank, termPosition, length, documentId).text
 
-		return tokens
+		return u"".join(elem.text or u"" for elem in self.__streamText(queryId, rank, termPosition, length))
 
-	def documentText(self, queryId, rank, termPosition = 0, length = None):
+	def documentSnippets(self, queryId, rank, context = 5, hits = None):
 		"""
-			Returns the text for the given document as a string
+			Returns a MimirSnippet for every window of context tokens either 
+			side of the hits in the given document. Overlapping windows are 
+			merged, and only the text of the windows is fetched.
+
+			@param hits the hits of the document at rank, if already known
 
 			@throws RequestException if there was a problem with the request
 			@throws MimirException if there was a problem with the mimir query or 
 				response could not be read
 			@throws xml.etree.ElementTree.ParseError if parse was not possible on response
 		"""
-		return u"".join(t.text for t in self.documentTextTokens(queryId, rank, termPosition, length))
+		if hits is None:
+			hits = self.documentHits(queryId, rank)
+
+		return [MimirSnippet(termPosition, length, 
+				self.documentTextTokens(queryId, rank, termPosition, length), windowHits)
+			for termPosition, length, windowHits in _snippetWindows(hits, context)]
 
 	def renderDocument(self, queryId, rank):
 		"""
@@ -241,10 +1109,88 @@ class MimirHelper(object):
 
 			@throws RequestException if there was a problem with the request (eg the document or query couldn't be found)
 		"""
-		result = requests.get(urljoin(self.endpoint, "renderDocument"),
-			params={"queryId": queryId, "rank": rank})
+		return self.__fetchText("renderDocument", {"queryId": queryId, "rank": rank})
+
+	def iterRenderDocument(self, queryId, rank, chunkSize = RENDER_CHUNK_SIZE):
+		"""
+			Returns an iterable of the HTML for the result text of the given 
+			document, as byte strings of up to chunkSize bytes, yielded as they 
+			arrive. The server may compress the transfer, and chunks are 
+			decompressed as they are read, so the whole document is never held 
+			in memory.
+
+			@throws RequestException if there was a problem with the request (eg the document or query couldn't be found)
+		"""
+		return self.__stream("renderDocument", {"queryId": queryId, "rank": rank},
+			lambda result, timer: timer.chunks(result.raw, chunkSize))
+
+	def iterRenderDocumentById(self, documentId, chunkSize = RENDER_CHUNK_SIZE):
+		"""
+			Returns an iterable of the HTML for the entire document by Id, as 
+			byte strings of up to chunkSize bytes, see iterRenderDocument.
+
+			Cached renderings are encoded as UTF-8 and sliced into chunks the 
+			same way. Streamed ones are not added to the cache.
+
+			@throws RequestException if there was a problem with the request (eg the document or query couldn't be found)
+		"""
+		if self.cache is not None:
+			html = self.cache.get(("render", documentId))
+			self.__countCache("renderDocument", html)
+			if html is not None:
+				data = html.encode("utf-8")
+				return (data[start:start + chunkSize] for start in xrange(0, len(data), chunkSize))
+
+		return self.__stream("renderDocument", {"documentId": documentId},
+			lambda result, timer: timer.chunks(result.raw, chunkSize))
+
+	def renderDocumentTo(self, queryId, rank, sink, chunkSize = RENDER_CHUNK_SIZE):
+		"""
+			Writes the HTML for the result text of the given document to sink, a 
+			binary file-like object, a chunk at a time, see iterRenderDocument.
+
+			@returns the number of bytes written
+
+			@throws RequestException if there was a problem with the request (eg the document or query couldn't be found)
+		"""
+		return _writeChunks(self.iterRenderDocument(queryId, rank, chunkSize), sink)
+
+	def renderDocumentByIdTo(self, documentId, sink, chunkSize = RENDER_CHUNK_SIZE):
+		"""
+			Writes the HTML for the entire document by Id to sink, a binary 
+			file-like object, a chunk at a time, see iterRenderDocumentById.
+
+			@returns the number of bytes written
+
+			@throws RequestException if there was a problem with the request (eg the document or query couldn't be found)
+		"""
+		return _writeChunks(self.iterRenderDocumentById(documentId, chunkSize), sink)
+
+	def renderDocumentsById(self, documentIds, sinkFactory, workers = 4, window = None, 
+			chunkSize = RENDER_CHUNK_SIZE):
+		"""
+			Renders many documents concurrently, streaming each to the sink 
+			returned by sinkFactory(documentId), which is closed once written.
+
+			Returns an iterable which yields (documentId, bytes written) in the 
+			order of documentIds. Documents are rendered as it is iterated, 
+			workers at a time, and each holds at most one chunk in memory.
+
+			@param sinkFactory callable returning a binary file-like object for 
+				a documentId, eg lambda documentId: open("%d.html" % documentId, "wb")
+
+			@throws RequestException if there was a problem with the request (eg the document or query couldn't be found)
+		"""
+		def render(documentId):
+			sink = sinkFactory(documentId)
+			try:
+				return self.renderDocumentByIdTo(documentId, sink, chunkSize)
+			finally:
+				if hasattr(sink, "close"):
+					sink.close()
 
-		return result.text
+		for documentId, (size,) in _fetchInOrder([render], documentIds, max(workers, 1), window):
+			yield documentId, size
 
 	def renderDocumentById(self, documentId):
 		"""
@@ -252,56 +1198,255 @@ class MimirHelper(object):
 
 			@throws RequestException if there was a problem with the request (eg the document or query couldn't be found)
 		"""
-		result = requests.get(urljoin(self.endpoint, "renderDocument"),
-			params={"documentId": documentId})
+		if self.cache is not None:
+			html = self.cache.get(("render", documentId))
+			self.__countCache("renderDocument", html)
+			if html is not None:
+				return html
 
-		return result.text
+		html = self.__fetchText("renderDocument", {"documentId": documentId})
 
-	def metadata(self, query, fieldNames=[]):
+		if self.cache is not None:
+			self.cache.put(("render", documentId), html)
+
+		return html
+
+	def metadata(self, query, fieldNames=[], workers = 1, window = None, 
+			stream = False, limit = None):
 		"""
 			Returns an iterable for the query which yields the selected metadata.
 
+			With workers > 1 the ranks are fetched concurrently, and with stream=True 
+			ranks are yielded before the search finishes, see MimirResultSet.results.
+
 			@throws RequestException if there was a problem with the request
 			@throws MimirException if there was a problem with the mimir query or 
 				response could not be read
 			@throws xml.etree.ElementTree.ParseError if parse was not possible on response
 		"""	
-		with self.query(query) as resultSet:
-			for result in resultSet.metadata(fieldNames):
+		with self.query(query, wait = not stream) as resultSet:
+			for result in resultSet.metadata(fieldNames, workers, window, stream, limit):
 				yield result
 
 
-	def ids(self, query):
+	def ids(self, query, workers = 1, window = None, 
+			stream = False, limit = None):
 		"""
 			Returns an iterable for the query which yields the document IDs.
 
+			With workers > 1 the ranks are fetched concurrently, and with stream=True 
+			ranks are yielded before the search finishes, see MimirResultSet.results.
+
 			@throws RequestException if there was a problem with the request
 			@throws MimirException if there was a problem with the mimir query or 
 				response could not be read
 			@throws xml.etree.ElementTree.ParseError if parse was not possible on response
 		"""	
-		with self.query(query) as resultSet:
-			for result in resultSet.ids():
+		if self.queryCache is not None:
+			cached = self.queryCache.getResults(query)
+			self.__countCache("postQuery", cached)
+			if cached is not None:
+				for documentId in cached.documentIds[:limit]:
+					yield documentId
+				return
+
+		with self.query(query, wait = not stream) as resultSet:
+			if self.queryCache is not None:
+				# Already counted as a miss above
+				resultSet.queryResults = None
+			for result in resultSet.ids(workers, window, stream, limit):
 				yield result
 
-	def results(self, query, metadataFieldNames = []):
+	def snippets(self, query, context = 5, workers = 1, window = None, 
+			stream = False, limit = None):
 		"""
-			Returns an iterable for the query which yields the complete results objects.
+			Returns an iterable for the query which yields the list of 
+			MimirSnippets of each result, see MimirResultSet.snippets.
 
 			@throws RequestException if there was a problem with the request
 			@throws MimirException if there was a problem with the mimir query or 
 				response could not be read
 			@throws xml.etree.ElementTree.ParseError if parse was not possible on response
 		"""	
+		with self.query(query, wait = not stream) as resultSet:
+			for snippets in resultSet.snippets(context, workers, window, stream, limit):
+				yield snippets
+
+	def facets(self, query, fieldNames, workers = 8, window = None, sample = None, 
+			maxValues = None, seed = None):
+		"""
+			Runs the query and returns the MimirFacets counting the values of 
+			fieldNames over its results, or over a random sample of them. See 
+			mimir_facets.iterFacets.
+
+			@throws RequestException if there was a problem with the request
+			@throws MimirException if there was a problem with the mimir query or 
+				response could not be read
+			@throws xml.etree.ElementTree.ParseError if parse was not possible on response
+		"""
+		from .mimir_facets import facets
+
 		with self.query(query) as resultSet:
-			for result in resultSet.results(metadataFieldNames):
+			return facets(resultSet, fieldNames, workers, window, sample, maxValues, seed)
+
+	def results(self, query, metadataFieldNames = [], workers = 1, window = None, 
+			stream = False, limit = None, fields = None):
+		"""
+			Returns an iterable for the query which yields the complete results objects.
+
+			With workers > 1 the ranks are fetched concurrently, and with stream=True 
+			ranks are yielded before the search finishes, see MimirResultSet.results.
+			fields projects lazy results, which can fetch further parts until 
+			the iteration ends and the query is closed.
+
+			@throws RequestException if there was a problem with the request
+			@throws MimirException if there was a problem with the mimir query or 
+				response could not be read
+			@throws xml.etree.ElementTree.ParseError if parse was not possible on response
+		"""	
+		with self.query(query, wait = not stream) as resultSet:
+			for result in resultSet.results(metadataFieldNames, workers, window, 
+					stream, limit, fields):
 				yield result
 				
 
 class MimirResultSet(object):
-	def __init__(self, mimirHelper, queryId):
+	def __init__(self, mimirHelper, queryId, query = None, cacheSize = 256, 
+			maxReadAhead = 32, workers = 4):
+		"""
+			@param cacheSize number of results kept for indexing and slicing
+			@param maxReadAhead most ranks fetched ahead of sequential indexing
+			@param workers threads used for slicing and read-ahead
+		"""
 		self.mimirHelper = mimirHelper
 		self.queryId = queryId
+		self.query = query
+		self.metadataFieldNames = []
+
+		self.cacheSize = cacheSize
+		self.maxReadAhead = maxReadAhead
+		self.workers = workers
+		self.resultCache = OrderedDict()
+		self.pending = {}
+		self.pool = None
+		self.nextRank = None
+		self.readAhead = 0
+		self.length = None
+		# The query cache's completed results for this query, looked up once
+		self.queryResults = _UNFETCHED
+
+	def shutdown(self):
+		"""Stops any read-ahead and drops the results kept for indexing"""
+		if self.pool is not None:
+			self.pool.terminate()
+			self.pool.join()
+			self.pool = None
+		self.pending.clear()
+		self.resultCache.clear()
+
+	def __len__(self):
+		if self.length is None:
+			count = self.documentsCount()
+			if count < 0:
+				raise TypeError("The query has not completed, so its length is not known yet")
+			self.length = int(count)
+		return self.length
+
+	def __getitem__(self, index):
+		"""
+			Returns the MimirResult at a rank, or a list of them for a slice, with 
+			the metadata named by metadataFieldNames.
+
+			Ranks missing from a slice are fetched in parallel. When ranks are 
+			read in order, the following ranks are fetched in the background, 
+			reading further ahead the longer access stays sequential. Recently 
+			read results are kept, so going back does not fetch them again.
+
+			@throws RequestException if there was a problem with the request
+			@throws MimirException if there was a problem with the mimir query or 
+				response could not be read
+			@throws xml.etree.ElementTree.ParseError if parse was not possible on response
+		"""
+		if isinstance(index, slice):
+			ranks = xrange(*index.indices(len(self)))
+			if len(ranks) == 0:
+				return []
+			for rank in ranks:
+				if rank not in self.resultCache and rank not in self.pending:
+					self.pending[rank] = self.__pool().apply_async(self.__fetchResult, (rank,))
+			results = [self.__result(rank) for rank in ranks]
+			self.__startReadAhead(min(ranks), max(ranks))
+			return results
+
+		if index < 0:
+			index += len(self)
+		if index < 0 or index >= len(self):
+			raise IndexError("rank out of range")
+
+		result = self.__result(index)
+		self.__startReadAhead(index, index)
+		return result
+
+	def __pool(self):
+		if self.pool is None:
+			self.pool = ThreadPool(self.workers)
+		return self.pool
+
+	def __fetchResult(self, rank):
+		return MimirResult(*self.__fetchFieldsById(rank, RESULT_FIELDS, self.metadataFieldNames))
+
+	def __result(self, rank):
+		"""Returns the result at rank from the kept results, read-ahead or the server"""
+		if rank in self.resultCache:
+			result = self.resultCache.pop(rank)
+		elif rank in self.pending:
+			result = self.pending.pop(rank).get()
+		else:
+			result = self.__fetchResult(rank)
+
+		self.resultCache[rank] = result
+		while len(self.resultCache) > self.cacheSize:
+			self.resultCache.popitem(last = False)
+		return result
+
+	def __startReadAhead(self, first, last):
+		"""Grows the read-ahead window while access is sequential, and fetches ahead of last"""
+		if first == self.nextRank:
+			self.readAhead = min(max(self.readAhead * 2, 1), self.maxReadAhead)
+		else:
+			self.readAhead = 0
+			self.pending.clear()
+		self.nextRank = last + 1
+
+		if self.readAhead == 0:
+			return
+
+		end = min(self.nextRank + self.readAhead, len(self))
+		for rank in xrange(self.nextRank, end):
+			if rank not in self.resultCache and rank not in self.pending:
+				self.pending[rank] = self.__pool().apply_async(self.__fetchResult, (rank,))
+
+	def __cachedResults(self):
+		"""
+			Returns the completed results of this query held by the query cache, 
+			if any. The cache is asked once per result set, so that its hits 
+			and misses count queries rather than ranks.
+		"""
+		if self.queryResults is _UNFETCHED:
+			queryCache = self.mimirHelper.queryCache
+			if queryCache is None or self.query is None:
+				self.queryResults = None
+			else:
+				self.queryResults = queryCache.getResults(self.query)
+		return self.queryResults
+
+	def __recordResults(self, documentIds, hits = None):
+		"""Gives the results of a complete iteration to the query cache"""
+		queryCache = self.mimirHelper.queryCache
+		if queryCache is None or self.query is None:
+			return
+		if len(documentIds) == self.documentsCount():
+			self.queryResults = queryCache.putResults(self.query, documentIds, hits)
 
 	def close(self): 
 		"""Releases the query
@@ -334,18 +1479,24 @@ class MimirResultSet(object):
 				response could not be read
 			@throws xml.etree.ElementTree.ParseError if parse was not possible on response
 		"""
+		cached = self.__cachedResults()
+		if cached is not None:
+			return long(cached.count)
 		return self.mimirHelper.documentsCount(self.queryId)
 
-	def documentMetadata(self, rank, fieldNames = []):
+	def documentMetadata(self, rank, fieldNames = [], documentId = None):
 		"""
 			Returns the metadata for the given document, including any additional fieldNames
 
+			@param documentId the id of the document at rank, if known, so that 
+				the cache can be used
+
 			@throws RequestException if there was a problem with the request
 			@throws MimirException if there was a problem with the mimir query or 
 				response could not be read
 			@throws xml.etree.ElementTree.ParseError if parse was not possible on response
 		"""
-		return self.mimirHelper.documentMetadata(self.queryId, rank, fieldNames)
+		return self.mimirHelper.documentMetadata(self.queryId, rank, fieldNames, documentId)
 
 	def documentId(self, rank):
 		"""
@@ -356,40 +1507,93 @@ class MimirResultSet(object):
 				response could not be read
 			@throws xml.etree.ElementTree.ParseError if parse was not possible on response
 		"""
+		cached = self.__cachedResults()
+		if cached is not None:
+			return cached.documentIds[int(rank)]
 		return self.mimirHelper.documentId(self.queryId, rank)
 
 	def documentHits(self, rank):
 		"""
-			Returns the hits for the given document
+			Returns the hits for the given document, packed into a compact 
+			MimirDocumentHits sequence
 
 			@throws RequestException if there was a problem with the request
 			@throws MimirException if there was a problem with the mimir query or 
 				response could not be read
 			@throws xml.etree.ElementTree.ParseError if parse was not possible on response
 		"""
+		cached = self.__cachedResults()
+		if cached is not None and cached.hits is not None:
+			return cached.hits[int(rank)]
 		return self.mimirHelper.documentHits(self.queryId, rank)
 
-	def documentTextTokens(self, rank, termPosition = 0, length = None):
+	def iterDocumentHits(self, rank):
+		"""
+			Returns an iterable of the hits for the given document, yielding each 
+			hit as it is read from the response.
+
+			@throws RequestException if there was a problem with the request
+			@throws MimirException if there was a problem with the mimir query or 
+				response could not be read
+			@throws xml.etree.ElementTree.ParseError if parse was not possible on response
+		"""
+		return self.mimirHelper.iterDocumentHits(self.queryId, rank)
+
+	def documentTextTokens(self, rank, termPosition = 0, length = None, documentId = None):
 		"""
-			Returns the text for the given document as series of MimirDocumentTokens
+			Returns the text for the given document as series of MimirDocumentTokens, 
+			packed into a compact MimirDocumentTokens sequence
+
+			@param documentId the id of the document at rank, if known, so that 
+				the cache can be used for the full text
 
 			@throws RequestException if there was a problem with the request
 			@throws MimirException if there was a problem with the mimir query or 
 				response could not be read
 			@throws xml.etree.ElementTree.ParseError if parse was not possible on response
 		"""
-		return self.mimirHelper.documentTextTokens(self.queryId, rank, termPosition, length)
+		return self.mimirHelper.documentTextTokens(self.queryId, rank, termPosition, length, 
+			documentId)
 
-	def documentText(self, rank, termPosition = 0, length = None):
+	def iterDocumentTextTokens(self, rank, termPosition = 0, length = None):
+		"""
+			Returns an iterable of the text for the given document as 
+			MimirDocumentTokens, yielding each token as it is read from the 
+			response.
+
+			@throws RequestException if there was a problem with the request
+			@throws MimirException if there was a problem with the mimir query or 
+				response could not be read
+			@throws xml.etree.ElementTree.ParseError if parse was not possible on response
+		"""
+		return self.mimirHelper.iterDocumentTextTokens(self.queryId, rank, termPosition, length)
+
+	def documentText(self, rank, termPosition = 0, length = None, documentId = None):
 		"""
 			Returns the text for the given document as a string
 
+			@param documentId the id of the document at rank, if known, so that 
+				the cache can be used for the full text
+
 			@throws RequestException if there was a problem with the request
 			@throws MimirException if there was a problem with the mimir query or 
 				response could not be read
 			@throws xml.etree.ElementTree.ParseError if parse was not possible on response
 		"""
-		return self.mimirHelper.documentText(self.queryId, rank, termPosition, length)
+		return self.mimirHelper.documentText(self.queryId, rank, termPosition, length, documentId)
+
+	def documentSnippets(self, rank, context = 5):
+		"""
+			Returns a MimirSnippet for every window of context tokens either 
+			side of the hits in the given document, see MimirHelper.documentSnippets.
+
+			@throws RequestException if there was a problem with the request
+			@throws MimirException if there was a problem with the mimir query or 
+				response could not be read
+			@throws xml.etree.ElementTree.ParseError if parse was not possible on response
+		"""
+		return self.mimirHelper.documentSnippets(self.queryId, rank, context, 
+			self.documentHits(rank))
 
 	def renderDocument(self, rank):
 		"""
@@ -399,46 +1603,249 @@ class MimirResultSet(object):
 		"""
 		return self.mimirHelper.renderDocument(self.queryId, rank)
 
+	def iterRenderDocument(self, rank, chunkSize = RENDER_CHUNK_SIZE):
+		"""
+			Returns an iterable of the HTML for the result text of the given 
+			document, as byte strings of up to chunkSize bytes, yielded as they 
+			arrive
+
+			@throws RequestException if there was a problem with the request (eg the document or query couldn't be found)
+		"""
+		return self.mimirHelper.iterRenderDocument(self.queryId, rank, chunkSize)
+
+	def renderDocumentTo(self, rank, sink, chunkSize = RENDER_CHUNK_SIZE):
+		"""
+			Writes the HTML for the result text of the given document to sink, a 
+			binary file-like object, a chunk at a time
+
+			@returns the number of bytes written
+
+			@throws RequestException if there was a problem with the request (eg the document or query couldn't be found)
+		"""
+		return self.mimirHelper.renderDocumentTo(self.queryId, rank, sink, chunkSize)
+
+
+	def ranks(self, stream = False, limit = None, minPollInterval = 0.05, maxPollInterval = 2.0):
+		"""
+			Returns an iterable of the ranks in the result set.
+
+			By default this asks for the total count, which needs the search to 
+			have finished. With stream=True, ranks are yielded as soon as 
+			documentsCurrentCount reports them, and the server is polled for more 
+			until the search completes. Polling starts at minPollInterval seconds 
+			and backs off up to maxPollInterval while no new results appear.
+
+			@param limit stop after this many ranks, without waiting for the rest 
+				of the search
+
+			@throws RequestException if there was a problem with the request
+			@throws MimirException if there was a problem with the mimir query or 
+				response could not be read
+			@throws xml.etree.ElementTree.ParseError if parse was not possible on response
+		"""
+		if not stream:
+			count = self.documentsCount()
+			if limit is not None:
+				count = min(count, limit)
+			for rank in xrange(0, count):
+				yield rank
+			return
+
+		nextRank = 0
+		pollInterval = minPollInterval
+		while limit is None or nextRank < limit:
+			total = self.documentsCount()
+			if total >= 0:
+				available = total
+			else:
+				available = self.documentsCurrentCount()
+
+			if limit is not None:
+				available = min(available, limit)
+
+			for rank in xrange(nextRank, available):
+				yield rank
+
+			if total >= 0:
+				return
+			elif available > nextRank:
+				nextRank = available
+				pollInterval = minPollInterval
+			else:
+				time.sleep(pollInterval)
+				pollInterval = min(pollInterval * 2, maxPollInterval)
 
-	def metadata(self, fieldNames=[]):
+	def metadata(self, fieldNames=[], workers = 1, window = None, 
+			stream = False, limit = None):
 		"""
 			Returns an iterable for the query which yields the selected metadata.
 
+			With workers > 1 the ranks are fetched concurrently, see results.
+			See ranks for stream and limit.
+
 			@throws RequestException if there was a problem with the request
 			@throws MimirException if there was a problem with the mimir query or 
 				response could not be read
 			@throws xml.etree.ElementTree.ParseError if parse was not possible on response
 		"""	
-		for rank in range(0, self.documentsCount()):
-			yield self.documentMetadata(rank, fieldNames)
+		if workers <= 1:
+			for rank in self.ranks(stream, limit):
+				yield self.documentMetadata(rank, fieldNames)
+		else:
+			fetchers = [lambda rank: self.documentMetadata(rank, fieldNames)]
+			for rank, (metadata,) in _fetchInOrder(fetchers, 
+					self.ranks(stream, limit), workers, window):
+				yield metadata
 
 
-	def ids(self):
+	def snippets(self, context = 5, workers = 1, window = None, 
+			stream = False, limit = None):
+		"""
+			Returns an iterable for the query which yields the list of 
+			MimirSnippets of each result, in rank order.
+
+			With workers > 1 the ranks are fetched concurrently, see results.
+			See ranks for stream and limit.
+
+			@throws RequestException if there was a problem with the request
+			@throws MimirException if there was a problem with the mimir query or 
+				response could not be read
+			@throws xml.etree.ElementTree.ParseError if parse was not possible on response
+		"""	
+		if workers <= 1:
+			for rank in self.ranks(stream, limit):
+				yield self.documentSnippets(rank, context)
+		else:
+			fetchers = [lambda rank: self.documentSnippets(rank, context)]
+			for rank, (snippets,) in _fetchInOrder(fetchers, 
+					self.ranks(stream, limit), workers, window):
+				yield snippets
+
+	def ids(self, workers = 1, window = None, 
+			stream = False, limit = None):
 		"""
 			Returns an iterable for the query which yields the document IDs.
 
+			With workers > 1 the ranks are fetched concurrently, see results.
+			See ranks for stream and limit.
+
 			@throws RequestException if there was a problem with the request
 			@throws MimirException if there was a problem with the mimir query or 
 				response could not be read
 			@throws xml.etree.ElementTree.ParseError if parse was not possible on response
 		"""	
-		for rank in range(0, self.documentsCount()):
-			yield self.documentId(rank)
+		cached = self.__cachedResults()
+		if cached is not None:
+			for documentId in cached.documentIds[:limit]:
+				yield documentId
+			return
+
+		if workers <= 1:
+			fetched = ((rank, (self.documentId(rank),)) for rank in self.ranks(stream, limit))
+		else:
+			fetched = _fetchInOrder([self.documentId], self.ranks(stream, limit), workers, window)
+
+		recording = self.mimirHelper.queryCache is not None
+		documentIds = array("l")
+		for rank, (documentId,) in fetched:
+			if recording:
+				documentIds.append(documentId)
+			yield documentId
+
+		if recording:
+			self.__recordResults(documentIds)
 
-	def results(self, metadataFieldNames = []):
+	def results(self, metadataFieldNames = [], workers = 1, window = None, 
+			stream = False, limit = None, fields = None):
 		"""
 			Returns an iterable for the query which yields the complete results objects.
 
+			With workers > 1 the metadata, id, text and hits of several ranks are 
+			fetched in parallel on a pool of that many threads. Results are still 
+			yielded in rank order, and no more than window ranks (twice workers 
+			by default) are held in memory at once.
+
+			With stream=True, results are yielded as the server finds them rather 
+			than after the search completes, and limit stops after that many 
+			results. See ranks.
+
+			fields picks the parts of each result to fetch up front, from 
+			RESULT_FIELDS. When given, lazy results are yielded which fetch any 
+			other part only if it is read, while the query is still open.
+
 			@throws RequestException if there was a problem with the request
 			@throws MimirException if there was a problem with the mimir query or 
 				response could not be read
 			@throws xml.etree.ElementTree.ParseError if parse was not possible on response
 		"""	
-		for rank in range(0, self.documentsCount()):
-			yield MimirResult(  self.documentMetadata(rank, metadataFieldNames), 
-								self.documentId(rank),
-								self.documentTextTokens(rank),
-								self.documentHits(rank))
+		if fields is None:
+			queryCache = self.mimirHelper.queryCache
+			recording = queryCache is not None
+			documentIds = array("l")
+			hits = [] if recording and queryCache.cacheHits else None
+			for rank, parts in self.__fetchFields(RESULT_FIELDS, metadataFieldNames, 
+					workers, window, stream, limit):
+				result = MimirResult(*parts)
+				if recording:
+					documentIds.append(result.documentId)
+					if hits is not None:
+						hits.append(result.hits)
+				yield result
+
+			if recording:
+				self.__recordResults(documentIds, hits)
+		else:
+			for rank, parts in self.__fetchFields(fields, metadataFieldNames, 
+					workers, window, stream, limit):
+				yield MimirResult.lazy(self, rank, metadataFieldNames, **dict(zip(fields, parts)))
+
+	def __fetchFields(self, fields, metadataFieldNames, workers, window, stream, limit):
+		"""
+			Yields each rank with a list of the values of the given fields.
+
+			Without a cache each field is a separate fetch, so the fields of a 
+			rank can be fetched in parallel. With a cache the documentId is 
+			fetched first, so the cache can answer for the text and metadata.
+		"""
+		for field in fields:
+			if field not in RESULT_FIELDS:
+				raise ValueError("Unknown result field %r, expected one of %r" % 
+					(field, RESULT_FIELDS))
+
+		byId = self.mimirHelper.cache is not None and "id" in fields
+		if byId:
+			fetchers = [lambda rank: self.__fetchFieldsById(rank, fields, metadataFieldNames)]
+		else:
+			fetcherMap = {
+				"metadata": lambda rank: self.documentMetadata(rank, metadataFieldNames),
+				"id": self.documentId,
+				"tokens": self.documentTextTokens,
+				"hits": self.documentHits
+			}
+			fetchers = [fetcherMap[field] for field in fields]
+
+		if workers <= 1:
+			fetched = ((rank, [fetcher(rank) for fetcher in fetchers]) 
+				for rank in self.ranks(stream, limit))
+		else:
+			fetched = _fetchInOrder(fetchers, self.ranks(stream, limit), workers, window)
+
+		for rank, parts in fetched:
+			if byId:
+				parts = parts[0]
+			yield rank, parts
+
+	def __fetchFieldsById(self, rank, fields, metadataFieldNames):
+		"""Fetches the given fields of a rank, starting with its documentId"""
+		documentId = self.documentId(rank)
+		values = {"id": documentId}
+		if "metadata" in fields:
+			values["metadata"] = self.documentMetadata(rank, metadataFieldNames, documentId)
+		if "tokens" in fields:
+			values["tokens"] = self.documentTextTokens(rank, documentId = documentId)
+		if "hits" in fields:
+			values["hits"] = self.documentHits(rank)
+		return [values[field] for field in fields]
 
 	def __iter__(self):
 		for result in self.results():
@@ -0,0 +1,143 @@
+import unittest, io
+import xml.etree.ElementTree as ET
+from array import array
+from mimir.mimir_helpers import *
+from mimir.mimir_helpers import _iterData, _parseMessage
+from mimir.mimir_cache import MimirDocumentCache
+from mimir.mimir_fake import MimirFakeServer
+from mimir.mimir_metrics import MimirMetrics
+
+class TestMimirDocumentTokens(unittest.TestCase):
+	def setUp(self):
+		self.tokens = MimirDocumentTokens.fromTokens([MimirDocumentToken(u"a", 0),
+			MimirDocumentToken(u" ", -1, True), MimirDocumentToken(u"b", 1)])
+
+	def testIndexing(self):
+		self.assertEqual(self.tokens[-1].text, u"b")
+		self.assertEqual([token.text for token in self.tokens[::2]], [u"a", u"b"])
+		for index in (3, -4, -5):
+			with self.assertRaises(IndexError):
+				self.tokens[index]
+
+	def testHitsIndexing(self):
+		hits = MimirDocumentHits(array("l", [7, 7]), array("l", [0, 2]), array("l", [1, 1]))
+		self.assertEqual(hits[-2].termPosition, 0)
+		for index in (2, -3):
+			with self.assertRaises(IndexError):
+				hits[index]
+
+class TestMimirHelperFakeServer(unittest.TestCase):
+	def setUp(self):
+		self.fake = MimirFakeServer(documents=20, documentLength=30, metadataFields=("author",))
+		self.mimir = MimirHelper(self.fake.start())
+
+	def tearDown(self):
+		self.mimir.shutdown()
+		self.fake.shutdown()
+
+	def testSnippets(self):
+		self.fake.hitsPerDocument = 3
+		with self.mimir.query("{Token}") as resultSet:
+			snippets = resultSet.documentSnippets(2, context=2)
+			self.assertEqual([(snippet.termPosition, snippet.length) for snippet in snippets],
+				[(0, 3), (8, 5), (18, 5)])
+			words = self.fake.words(resultSet.documentId(2))
+			self.assertEqual(snippets[1].highlight(u"[", u"]"),
+				u"%s %s [%s] %s %s " % tuple(words[8:13]))
+			self.assertEqual(len(list(resultSet.snippets(workers=2))), 20)
+
+	def testStreamedRendering(self):
+		self.fake.compress = True
+		documentId = self.fake.documentIdAt(4)
+		html = self.mimir.renderDocumentById(documentId)
+		self.assertIn(u" ".join(self.fake.words(documentId)), html)
+
+		chunks = list(self.mimir.iterRenderDocumentById(documentId, chunkSize=16))
+		self.assertTrue(all(len(chunk) <= 16 for chunk in chunks))
+		self.assertEqual(b"".join(chunks).decode("utf-8"), html)
+		with self.mimir.query("{Token}") as resultSet:
+			sink = io.BytesIO()
+			self.assertEqual(resultSet.renderDocumentTo(4, sink), len(sink.getvalue()))
+			self.assertEqual(sink.getvalue().decode("utf-8"), html)
+			self.assertEqual(len(resultSet.documentTextTokens(4)), 59)
+
+		sinks = {}
+		class Sink(io.BytesIO):
+			def close(self):
+				self.done = True
+		def sinkFactory(documentId):
+			sinks[documentId] = Sink()
+			return sinks[documentId]
+		ids = [self.fake.documentIdAt(rank) for rank in range(10)]
+		rendered = list(self.mimir.renderDocumentsById(ids, sinkFactory, workers=4))
+		self.assertEqual([documentId for documentId, size in rendered], ids)
+		self.assertTrue(all(sinks[documentId].done for documentId in ids))
+		self.assertEqual(sinks[ids[4]].getvalue().decode("utf-8"), html)
+
+		cached = MimirHelper(self.fake.endpoint, cache=MimirDocumentCache())
+		self.assertEqual(cached.renderDocumentById(ids[4]), html)
+		chunks = list(cached.iterRenderDocumentById(ids[4], chunkSize=16))
+		self.assertEqual(len(chunks), (len(html.encode("utf-8")) + 15) // 16)
+		self.assertEqual(b"".join(chunks).decode("utf-8"), html)
+		self.assertEqual(cached.cache.stats()["hits"], 1)
+		cached.shutdown()
+
+	def testProjectedResults(self):
+		metrics = MimirMetrics()
+		mimir = MimirHelper(self.fake.endpoint, metrics=metrics)
+		results = mimir.results("{Token}", fields=("id",))
+		first = next(results)
+		second = next(results)
+		calls = lambda path: metrics.snapshot().get(path, {}).get("calls", 0)
+		self.assertEqual(calls("documentId"), 2)
+		self.assertEqual(calls("documentText"), 0)
+
+		self.assertEqual(first.text, u" ".join(self.fake.words(first.documentId)))
+		self.assertEqual(calls("documentText"), 1)
+		self.assertEqual(len(list(results)), 18)
+		self.assertEqual(calls("documentId"), 20)
+		self.assertEqual(calls("documentText"), 1)
+		self.assertEqual(calls("documentHits"), 0)
+		self.assertEqual(self.fake.queries, {})
+		mimir.shutdown()
+
+	def testReadAheadAndPagingBack(self):
+		metrics = MimirMetrics()
+		mimir = MimirHelper(self.fake.endpoint, metrics=metrics)
+		calls = lambda: sum(stats["calls"] for stats in metrics.snapshot().values())
+		with mimir.query("{Token}") as resultSet:
+			before = calls()
+			for rank in range(4):
+				self.assertEqual(resultSet[rank].documentId, self.fake.documentIdAt(rank))
+			for pending in list(resultSet.pending.values()):
+				pending.wait()
+			# Reading 0 to 3 in order reads ahead 1, then 2, then 4 ranks
+			self.assertEqual(metrics.snapshot()["documentId"]["calls"], 8)
+			self.assertEqual(sorted(resultSet.pending), [4, 5, 6, 7])
+
+			walked = calls()
+			page = resultSet[1:4]
+			self.assertEqual([result.documentId for result in page],
+				[self.fake.documentIdAt(rank) for rank in range(1, 4)])
+			self.assertEqual(calls(), walked)
+			self.assertEqual(resultSet.pending, {})
+			self.assertGreater(walked, before)
+		mimir.shutdown()
+
+class TestXmlBackends(unittest.TestCase):
+	def testXmlBackends(self):
+		current = xmlBackend()
+		try:
+			for backend in XML_BACKENDS:
+				setXmlBackend(backend)
+				with self.assertRaises(ET.ParseError):
+					_parseMessage(io.BytesIO(b"<mimir:message"))
+				with self.assertRaises(ET.ParseError):
+					list(_iterData(io.BytesIO(b"<message><data><text>")))
+		finally:
+			setXmlBackend(current)
+		with self.assertRaises(ValueError):
+			setXmlBackend("unknown")
+
+if __name__ == '__main__':
+	unittest.main()
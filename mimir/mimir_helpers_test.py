@@ -103,6 +103,23 @@ class TestMimirHelpers(unittest.TestCase):
 			for token in tokens:
 				self.assertIsInstance(token, MimirDocumentToken)
 
+			self.assertIsInstance(tokens, MimirDocumentTokens)
+			self.assertEqual(tokens.text, u"".join(token.text for token in tokens))
+			self.assertEqual(tokens[-1].text, list(tokens)[-1].text)
+
+	def testIterDocumentTextTokens(self):
+		with self.mimir.query("{Hashtag}") as resultSet:
+			tokens = list(resultSet.iterDocumentTextTokens(0))
+			self.assertGreater(len(tokens), 0)
+			self.assertEqual(u"".join(t.text for t in tokens), resultSet.documentText(0))
+
+	def testIterDocumentHits(self):
+		with self.mimir.query("{Hashtag}") as resultSet:
+			hits = list(resultSet.iterDocumentHits(0))
+			self.assertEqual(len(hits), len(resultSet.documentHits(0)))
+			for hit in hits:
+				self.assertIsInstance(hit, MimirDocumentHit)
+
 	def testDocumentText(self):
 		with self.mimir.query("{Hashtag}") as resultSet:
 			text = resultSet.documentText(0)
@@ -134,5 +151,66 @@ class TestMimirHelpers(unittest.TestCase):
 					break
 			self.assertEqual(count, 10)
 
+	def testIterateResultsConcurrently(self):
+		with self.mimir.query("{Hashtag}") as resultSet:
+			serial = [resultSet.documentId(rank) for rank in range(10)]
+			concurrent = []
+			for result in resultSet.results(workers=4, window=3):
+				self.assertIsInstance(result, MimirResult)
+				concurrent.append(result.documentId)
+				if len(concurrent) == 10:
+					break
+			self.assertEqual(serial, concurrent)
+
+	def testProjectedResults(self):
+		with self.mimir.query("{Hashtag}") as resultSet:
+			for result in resultSet.results(fields=("id", "hits"), limit=5):
+				self.assertIsInstance(result, MimirResult)
+				self.assertEqual(result.documentId, resultSet.documentId(result.rank))
+				self.assertGreater(len(result.hits), 0)
+				self.assertEqual(result.text, resultSet.documentText(result.rank))
+
+	def testIndexAndSliceResultSet(self):
+		with self.mimir.query("{Hashtag}") as resultSet:
+			self.assertEqual(len(resultSet), resultSet.documentsCount())
+			page = resultSet[5:10]
+			self.assertEqual(len(page), 5)
+			for rank, result in zip(range(5, 10), page):
+				self.assertIsInstance(result, MimirResult)
+				self.assertEqual(result.documentId, resultSet.documentId(rank))
+			self.assertEqual(resultSet[7].documentId, page[2].documentId)
+			self.assertEqual(resultSet[-1].documentId, resultSet.documentId(len(resultSet) - 1))
+			with self.assertRaises(IndexError):
+				resultSet[len(resultSet)]
+
+	def testStreamIdsWithLimit(self):
+		ids = list(self.mimir.ids("{UserID}", stream=True, limit=5))
+		self.assertEqual(len(ids), 5)
+		for documentId in ids:
+			self.assertIsInstance(documentId, long)
+
+	def testStreamRanksBeforeCompletion(self):
+		with self.mimir.query("{Token}", wait=False) as resultSet:
+			ranks = list(resultSet.ranks(stream=True, limit=10))
+			self.assertEqual(ranks, list(range(10)))
+
+	def testHelperContextManager(self):
+		with MimirHelper(TEST_ENDPOINT, timeout=30, poolMaxsize=4) as mimir:
+			queryId = mimir.postQuery("{UserID}")
+			mimir.wait(queryId)
+			self.assertGreater(mimir.documentsCount(queryId), 0)
+			mimir.close(queryId)
+
+	def testDocumentSnippets(self):
+		with self.mimir.query("{UserID}") as resultSet:
+			hits = resultSet.documentHits(0)
+			snippets = resultSet.documentSnippets(0, context=3)
+			self.assertGreater(len(snippets), 0)
+			self.assertEqual(sum(len(snippet.hits) for snippet in snippets), len(hits))
+			for snippet in snippets:
+				self.assertIsInstance(snippet, MimirSnippet)
+				self.assertIn(True, [isHit for text, isHit in snippet.spans()])
+				self.assertIn(u"<b>", snippet.highlight())
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,219 @@
+"""
+	Compact sets of document ids, for combining the results of queries.
+"""
+import heapq, struct, sys
+from array import array
+from bisect import bisect_left
+
+from .mimir_helpers import MimirResult, _fetchInOrder
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+try:
+	array("q")
+	_TYPECODE = "q"
+except ValueError:
+	_TYPECODE = "l"
+
+# Saved sets are this header, holding the number of ids, followed by the ids
+# as little-endian 64-bit integers
+_MAGIC = b"MIMIRIDS"
+_HEADER = struct.Struct("<8sBQ")
+_VERSION = 1
+
+def _unique(ids):
+	"""Yields the items of a sorted iterable, skipping repeats"""
+	previous = None
+	for documentId in ids:
+		if documentId != previous:
+			yield documentId
+			previous = documentId
+
+def _fromBytes(data):
+	"""Returns an array of the little-endian 64-bit integers in data"""
+	ids = array(_TYPECODE)
+	if ids.itemsize != 8 or sys.byteorder != "little":
+		ids.extend(struct.unpack("<%dq" % (len(data) // 8), data))
+	elif hasattr(ids, "frombytes"):
+		ids.frombytes(data)
+	else:
+		ids.fromstring(data)
+	return ids
+
+class MimirDocumentIdSet(object):
+	"""
+		An immutable set of document ids, held as a sorted array of 64-bit
+		integers rather than as boxed Python ints.
+
+		Supports len, in, iteration in ascending order, comparison and the
+		&, | and - operators, which run as merges of the sorted arrays, or
+		in numpy if it is installed.
+	"""
+	__slots__ = ("ids",)
+
+	def __init__(self, ids = ()):
+		"""@param ids any iterable of document ids, in any order"""
+		if isinstance(ids, MimirDocumentIdSet):
+			self.ids = ids.ids
+		elif numpy is not None:
+			self.ids = self.__fromNumpy(numpy.unique(numpy.fromiter(ids, numpy.int64)))
+		else:
+			self.ids = array(_TYPECODE, _unique(sorted(ids)))
+
+	@classmethod
+	def __sorted(cls, ids):
+		"""Wraps an array already sorted and without repeats"""
+		idSet = cls.__new__(cls)
+		idSet.ids = ids
+		return idSet
+
+	@staticmethod
+	def __fromNumpy(values):
+		return _fromBytes(values.astype(numpy.int64).tobytes())
+
+	def __numpy(self):
+		return numpy.frombuffer(self.ids, numpy.int64)
+
+	@classmethod
+	def fromQuery(cls, helper, query, workers = 4, window = None, stream = False):
+		"""
+			Collects the document ids of every result of a query, fetching
+			workers ranks concurrently.
+
+			@param helper the MimirHelper to run the query with
+
+			@throws RequestException if there was a problem with the request
+			@throws MimirException if there was a problem with the mimir query or
+				response could not be read
+			@throws xml.etree.ElementTree.ParseError if parse was not possible on response
+		"""
+		ids = array(_TYPECODE)
+		for documentId in helper.ids(query, workers = workers, window = window, stream = stream):
+			ids.append(documentId)
+		return cls(ids)
+
+	def __len__(self):
+		return len(self.ids)
+
+	def __iter__(self):
+		return iter(self.ids)
+
+	def __contains__(self, documentId):
+		index = bisect_left(self.ids, documentId)
+		return index < len(self.ids) and self.ids[index] == documentId
+
+	def __eq__(self, other):
+		return isinstance(other, MimirDocumentIdSet) and self.ids == other.ids
+
+	def __ne__(self, other):
+		return not self == other
+
+	def __repr__(self):
+		return "MimirDocumentIdSet(%d ids)" % len(self)
+
+	def intersection(self, other):
+		if numpy is not None:
+			return self.__sorted(self.__fromNumpy(numpy.intersect1d(self.__numpy(),
+				other.__numpy(), assume_unique = True)))
+
+		# Look each id of the smaller set up in the larger, starting each
+		# search where the last one ended
+		small, large = sorted((self.ids, other.ids), key = len)
+		ids = array(_TYPECODE)
+		index = 0
+		for documentId in small:
+			index = bisect_left(large, documentId, index)
+			if index == len(large):
+				break
+			if large[index] == documentId:
+				ids.append(documentId)
+		return self.__sorted(ids)
+
+	def union(self, other):
+		if numpy is not None:
+			return self.__sorted(self.__fromNumpy(numpy.union1d(self.__numpy(), other.__numpy())))
+		return self.__sorted(array(_TYPECODE, _unique(heapq.merge(self.ids, other.ids))))
+
+	def difference(self, other):
+		if numpy is not None:
+			return self.__sorted(self.__fromNumpy(numpy.setdiff1d(self.__numpy(),
+				other.__numpy(), assume_unique = True)))
+		return self.__sorted(array(_TYPECODE,
+			(documentId for documentId in self.ids if documentId not in other)))
+
+	__and__ = intersection
+	__or__ = union
+	__sub__ = difference
+
+	def save(self, f):
+		"""Writes the set to a binary file object, or to the file at path f"""
+		if not hasattr(f, "write"):
+			with open(f, "wb") as out:
+				return self.save(out)
+
+		f.write(_HEADER.pack(_MAGIC, _VERSION, len(self.ids)))
+		if self.ids.itemsize != 8 or sys.byteorder != "little":
+			f.write(struct.pack("<%dq" % len(self.ids), *self.ids))
+		elif hasattr(self.ids, "tobytes"):
+			f.write(self.ids.tobytes())
+		else:
+			f.write(self.ids.tostring())
+
+	@classmethod
+	def load(cls, f):
+		"""
+			Reads a set written by save from a binary file object, or from the
+			file at path f.
+
+			@throws ValueError if the file does not hold a saved set
+		"""
+		if not hasattr(f, "read"):
+			with open(f, "rb") as source:
+				return cls.load(source)
+
+		header = f.read(_HEADER.size)
+		if len(header) != _HEADER.size:
+			raise ValueError("Not a saved MimirDocumentIdSet")
+		magic, version, count = _HEADER.unpack(header)
+		if magic != _MAGIC or version != _VERSION:
+			raise ValueError("Not a saved MimirDocumentIdSet")
+
+		data = f.read(count * 8)
+		if len(data) != count * 8:
+			raise ValueError("Saved MimirDocumentIdSet is truncated")
+
+		return cls.__sorted(_fromBytes(data))
+
+	def render(self, helper, workers = 4, window = None):
+		"""
+			Returns an iterable of (documentId, HTML) for every document in the
+			set, in id order, fetching workers documents concurrently with
+			renderDocumentById.
+
+			@throws RequestException if there was a problem with the request
+		"""
+		for documentId, (html,) in _fetchInOrder([helper.renderDocumentById], self.ids,
+				max(workers, 1), window):
+			yield documentId, html
+
+	def results(self, resultSet, metadataFieldNames = [], workers = 4, window = None):
+		"""
+			Returns an iterable of a lazy MimirResult for every result of
+			resultSet whose document is in the set, in rank order.
+
+			Mimir can only fetch metadata, text and hits by rank, so the ranks
+			are found by reading every id of resultSet, which comes from the
+			query cache if there is one. The results fetch their parts as for
+			MimirResult.lazy, while resultSet's query is open.
+
+			@throws RequestException if there was a problem with the request
+			@throws MimirException if there was a problem with the mimir query or
+				response could not be read
+			@throws xml.etree.ElementTree.ParseError if parse was not possible on response
+		"""
+		for rank, documentId in enumerate(resultSet.ids(workers, window)):
+			if documentId in self:
+				yield MimirResult.lazy(resultSet, rank, metadataFieldNames, id = documentId)
@@ -0,0 +1,45 @@
+import unittest, io, random
+from mimir.mimir_idset import *
+from mimir.mimir_fake import MimirFakeServer
+from mimir.mimir_helpers import MimirHelper
+
+class TestMimirDocumentIdSet(unittest.TestCase):
+	def testSetAlgebra(self):
+		a = set(random.sample(range(100000), 2000))
+		b = set(random.sample(range(100000), 20000))
+		idsA, idsB = MimirDocumentIdSet(a), MimirDocumentIdSet(b)
+		self.assertEqual(list(idsA), sorted(a))
+		self.assertEqual(list(idsA & idsB), sorted(a & b))
+		self.assertEqual(list(idsA | idsB), sorted(a | b))
+		self.assertEqual(list(idsA - idsB), sorted(a - b))
+		self.assertEqual(list(idsB - idsA), sorted(b - a))
+		self.assertEqual(len(MimirDocumentIdSet([3, 1, 3])), 2)
+		self.assertIn(3, MimirDocumentIdSet([3, 1]))
+		self.assertNotIn(2, MimirDocumentIdSet([3, 1]))
+
+	def testSaveAndLoad(self):
+		ids = MimirDocumentIdSet([2 ** 40, 7, 0])
+		f = io.BytesIO()
+		ids.save(f)
+		f.seek(0)
+		self.assertEqual(MimirDocumentIdSet.load(f), ids)
+		with self.assertRaises(ValueError):
+			MimirDocumentIdSet.load(io.BytesIO(b"not a set"))
+		with self.assertRaises(ValueError):
+			MimirDocumentIdSet.load(io.BytesIO(f.getvalue()[:-1]))
+
+	def testFromQueryAndRehydrate(self):
+		with MimirFakeServer(documents=20) as fake:
+			helper = MimirHelper(fake.endpoint)
+			ids = MimirDocumentIdSet.fromQuery(helper, "{Token}", workers=4)
+			self.assertEqual(list(ids), sorted(fake.documentIdAt(rank) for rank in range(20)))
+
+			some = MimirDocumentIdSet([fake.documentIdAt(3), fake.documentIdAt(11)])
+			self.assertEqual([documentId for documentId, html in some.render(helper)], list(some))
+			with helper.query("{Token}") as resultSet:
+				results = list(some.results(resultSet, ["author"]))
+				self.assertEqual([result.rank for result in results], [3, 11])
+				self.assertIn("author", results[0].metadata.metadata)
+
+if __name__ == '__main__':
+    unittest.main()
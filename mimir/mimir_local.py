@@ -0,0 +1,410 @@
+"""
+	A local, disk-backed store of fetched documents, for re-querying them
+	without the server.
+"""
+import json, mmap, os, re, struct, sys, threading
+from array import array
+from collections import defaultdict
+
+from .mimir_helpers import MimirDocumentHit, MimirDocumentTokens, MimirSnippet
+
+# Each stored document is one of these records: documentId, then the start
+# and length in bytes of its UTF-8 text, then its first token and number of
+# tokens. Invalidated documents have their documentId set to -1.
+_DOCUMENT = struct.Struct("<qqqqq")
+_REMOVED = -1
+
+# A query made only of words, optionally quoted, is a phrase of those words,
+# which can be answered locally
+_PHRASE = re.compile(r'^\s*("?)\s*(\w+(?:\s+\w+)*)\s*\1\s*$', re.UNICODE)
+
+def _toInt32s(data):
+	"""Returns an array of the little-endian 32-bit integers in data"""
+	values = array("i")
+	if hasattr(values, "frombytes"):
+		values.frombytes(data)
+	else:
+		values.fromstring(data)
+	if sys.byteorder != "little":
+		values.byteswap()
+	return values
+
+def _fromInt32s(values):
+	"""Returns the bytes of an array of 32-bit integers, little-endian"""
+	if sys.byteorder != "little":
+		values = array("i", values)
+		values.byteswap()
+	return values.tobytes() if hasattr(values, "tobytes") else values.tostring()
+
+class _AppendFile(object):
+	"""A file that is only ever appended to, read through a memory map"""
+	def __init__(self, path):
+		self.path = path
+		self.file = open(path, "ab+")
+		self.file.seek(0, os.SEEK_END)
+		self.size = self.file.tell()
+		self.map = None
+
+	def append(self, data):
+		"""Appends data, and returns the offset it was written at"""
+		offset = self.size
+		self.file.write(data)
+		self.size += len(data)
+		return offset
+
+	def read(self, start, length):
+		if not length:
+			return b""
+		if self.map is None or len(self.map) < start + length:
+			self.file.flush()
+			if self.map is not None:
+				self.map.close()
+			self.map = mmap.mmap(self.file.fileno(), 0, access = mmap.ACCESS_READ)
+		return self.map[start:start + length]
+
+	def overwrite(self, start, data):
+		"""Replaces bytes already written, which the memory map also sees"""
+		self.file.flush()
+		with open(self.path, "r+b") as f:
+			f.seek(start)
+			f.write(data)
+
+	def close(self):
+		if self.map is not None:
+			self.map.close()
+			self.map = None
+		self.file.close()
+
+class MimirLocalIndex(object):
+	"""
+		Opt-in store of the token streams of fetched documents, with a
+		positional inverted index over them, so that simple queries over
+		documents already fetched run locally.
+
+		Give it to MimirHelper as its cache: every full document text the
+		helper fetches for a known documentId is recorded, and served from
+		the store from then on. Other cache entries go to the wrapped cache,
+		if any.
+
+		Documents are appended to files in directory and read back through
+		memory maps. The inverted index of words to (document, position) is
+		written out by flush, and by close. Documents added since are indexed
+		in memory until then. Words are matched case-insensitively.
+
+		Safe to share between threads.
+	"""
+	def __init__(self, directory, cache = None):
+		"""
+			@param directory where to keep the store, created if missing
+			@param cache a MimirDocumentCache, or similar, for everything
+				other than document text
+		"""
+		self.directory = directory
+		self.cache = cache
+		self.lock = threading.RLock()
+
+		if not os.path.isdir(directory):
+			os.makedirs(directory)
+		self.__open()
+
+	def __path(self, name):
+		return os.path.join(self.directory, name)
+
+	def __open(self):
+		self.texts = _AppendFile(self.__path("text.bin"))
+		self.offsets = _AppendFile(self.__path("offsets.bin"))
+		self.positions = _AppendFile(self.__path("positions.bin"))
+		self.spaces = _AppendFile(self.__path("spaces.bin"))
+		self.documents = _AppendFile(self.__path("documents.bin"))
+		self.tokenCount = self.positions.size // 4
+
+		# Index of each stored document by documentId, and the reverse
+		self.documentIndexes = {}
+		self.documentIdsByIndex = {}
+		count = self.documents.size // _DOCUMENT.size
+		for index in range(count):
+			documentId = self.__record(index)[0]
+			if documentId != _REMOVED:
+				self.documentIndexes[documentId] = index
+				self.documentIdsByIndex[index] = documentId
+
+		self.lexicon = {}
+		self.indexedDocuments = 0
+		self.postings = None
+		try:
+			with open(self.__path("lexicon.json")) as f:
+				saved = json.load(f)
+		except (IOError, OSError, ValueError):
+			pass
+		else:
+			if os.path.exists(self.__path("postings.bin")):
+				self.lexicon = saved["terms"]
+				self.indexedDocuments = saved["documents"]
+				self.postings = _AppendFile(self.__path("postings.bin"))
+
+		# Postings of documents stored since the index was last written
+		self.pending = defaultdict(list)
+		for index in range(self.indexedDocuments, count):
+			self.__indexDocument(index)
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, excType, excValue, traceback):
+		self.close()
+
+	def __record(self, index):
+		return _DOCUMENT.unpack(self.documents.read(index * _DOCUMENT.size, _DOCUMENT.size))
+
+	def __tokens(self, index):
+		documentId, textStart, textLength, first, count = self.__record(index)
+		text = self.texts.read(textStart, textLength).decode("utf-8")
+		offsets = array("l", [0])
+		offsets.extend(_toInt32s(self.offsets.read(first * 4, count * 4)).tolist())
+		positions = array("l", _toInt32s(self.positions.read(first * 4, count * 4)))
+		spaces = array("b")
+		if hasattr(spaces, "frombytes"):
+			spaces.frombytes(self.spaces.read(first, count))
+		else:
+			spaces.fromstring(self.spaces.read(first, count))
+		return MimirDocumentTokens(text, offsets, positions, spaces)
+
+	def __indexDocument(self, index):
+		if self.__record(index)[0] == _REMOVED:
+			return
+		tokens = self.__tokens(index)
+		for token in tokens:
+			if not token.isSpace:
+				self.pending[token.text.lower()].append((index, token.position))
+
+	def add(self, documentId, tokens):
+		"""Stores and indexes the MimirDocumentTokens of a document, unless already stored"""
+		with self.lock:
+			if documentId in self.documentIndexes:
+				return
+
+			text = tokens.text.encode("utf-8")
+			ends = array("i", tokens.offsets[1:])
+			record = _DOCUMENT.pack(documentId, self.texts.append(text), len(text),
+				self.tokenCount, len(tokens))
+
+			self.offsets.append(_fromInt32s(ends))
+			self.positions.append(_fromInt32s(array("i", tokens.positions)))
+			spaces = array("b", tokens.spaces)
+			self.spaces.append(spaces.tobytes() if hasattr(spaces, "tobytes") else spaces.tostring())
+			self.tokenCount += len(tokens)
+			index = self.documents.append(record) // _DOCUMENT.size
+			self.documentIndexes[documentId] = index
+			self.documentIdsByIndex[index] = documentId
+
+			for i in range(len(tokens)):
+				if not tokens.spaces[i]:
+					word = tokens.text[tokens.offsets[i]:tokens.offsets[i + 1]]
+					self.pending[word.lower()].append((index, tokens.positions[i]))
+
+	def __contains__(self, documentId):
+		return documentId in self.documentIndexes
+
+	def __len__(self):
+		return len(self.documentIndexes)
+
+	def documentIds(self):
+		"""Returns a list of the documentIds stored"""
+		with self.lock:
+			return list(self.documentIndexes)
+
+	def documentTextTokens(self, documentId):
+		"""
+			Returns the stored MimirDocumentTokens of a document
+
+			@throws KeyError if the document is not stored
+		"""
+		with self.lock:
+			return self.__tokens(self.documentIndexes[documentId])
+
+	def documentText(self, documentId):
+		"""
+			Returns the stored text of a document
+
+			@throws KeyError if the document is not stored
+		"""
+		return self.documentTextTokens(documentId).text
+
+	def get(self, key):
+		"""Returns the cached value for key, as for MimirDocumentCache"""
+		if key[0] == "text":
+			with self.lock:
+				if key[1] in self.documentIndexes:
+					return self.__tokens(self.documentIndexes[key[1]])
+			return None
+		return self.cache.get(key) if self.cache is not None else None
+
+	def put(self, key, value):
+		"""Caches value under key, as for MimirDocumentCache"""
+		if key[0] == "text":
+			self.add(key[1], value)
+		elif self.cache is not None:
+			self.cache.put(key, value)
+
+	def invalidate(self, documentId = None):
+		"""Drops documentId from the store and wrapped cache, or everything if None"""
+		with self.lock:
+			if documentId is None:
+				self.__close()
+				for name in ("text.bin", "offsets.bin", "positions.bin", "spaces.bin",
+						"documents.bin", "postings.bin", "lexicon.json"):
+					if os.path.exists(self.__path(name)):
+						os.remove(self.__path(name))
+				self.__open()
+			elif documentId in self.documentIndexes:
+				index = self.documentIndexes.pop(documentId)
+				del self.documentIdsByIndex[index]
+				self.documents.overwrite(index * _DOCUMENT.size, struct.pack("<q", _REMOVED))
+
+		if self.cache is not None:
+			self.cache.invalidate(documentId)
+
+	def __postings(self, word):
+		"""
+			Returns arrays of the document indexes and positions of word, in
+			order. Documents stored since the last flush come after the others.
+		"""
+		indexes, positions = array("i"), array("i")
+		saved = self.lexicon.get(word)
+		if saved is not None:
+			values = _toInt32s(self.postings.read(saved[0] * 8, saved[1] * 8))
+			indexes, positions = values[0::2], values[1::2]
+		for index, position in self.pending.get(word, ()):
+			indexes.append(index)
+			positions.append(position)
+		return indexes, positions
+
+	@staticmethod
+	def phrase(query):
+		"""
+			Returns the words of query if it can be run locally, which needs
+			it to be a sequence of plain words, optionally quoted, else None
+		"""
+		match = _PHRASE.match(query)
+		if match is None:
+			return None
+		return [word.lower() for word in match.group(2).split()]
+
+	def search(self, query, helper = None):
+		"""
+			Returns a list of the MimirDocumentHits of query among the stored
+			documents, in the order the documents were stored, then by
+			termPosition.
+
+			Queries that phrase cannot run locally are run on the server with
+			helper, keeping only the hits in stored documents.
+
+			@throws ValueError if the query cannot run locally and there is no helper
+			@throws RequestException if there was a problem with the request
+			@throws MimirException if there was a problem with the mimir query or
+				response could not be read
+			@throws xml.etree.ElementTree.ParseError if parse was not possible on response
+		"""
+		words = self.phrase(query)
+		if words is None:
+			if helper is None:
+				raise ValueError("Query cannot be run locally: %s" % query)
+			return self.__searchServer(query, helper)
+
+		length = len(words)
+		hits = []
+		with self.lock:
+			postings = [self.__postings(word) for word in words]
+			# Every later word must follow the first, so look them up by
+			# document index and position packed into one int
+			following = [set((index << 32) | position for index, position in zip(*wordPostings))
+				for wordPostings in postings[1:]]
+			documentIds = self.documentIdsByIndex
+
+			for index, position in zip(*postings[0]):
+				documentId = documentIds.get(index)
+				if documentId is None:
+					continue
+				key = (index << 32) | position
+				for offset, keys in enumerate(following, 1):
+					if key + offset not in keys:
+						break
+				else:
+					hits.append(MimirDocumentHit(documentId, position, length))
+		return hits
+
+	def __searchServer(self, query, helper):
+		hits = []
+		with helper.query(query) as resultSet:
+			for rank, documentId in enumerate(resultSet.ids()):
+				if documentId in self:
+					hits.extend(resultSet.documentHits(rank))
+		hits.sort(key = lambda hit: (self.documentIndexes[hit.documentId], hit.termPosition))
+		return hits
+
+	def highlight(self, documentId, hits, before = u"<b>", after = u"</b>"):
+		"""
+			Returns the stored text of a document with each of hits that is in
+			it between before and after
+
+			@throws KeyError if the document is not stored
+		"""
+		tokens = self.documentTextTokens(documentId)
+		spans = [(hit.termPosition, hit.length) for hit in hits if hit.documentId == documentId]
+		return MimirSnippet(0, len(tokens), tokens, spans).highlight(before, after)
+
+	def flush(self):
+		"""
+			Writes out the inverted index, including every document stored so
+			far and leaving out invalidated ones
+		"""
+		with self.lock:
+			live = set(self.documentIndexes.values())
+			terms = {}
+			postings = []
+			for word in set(self.lexicon) | set(self.pending):
+				values = [posting for posting in zip(*self.__postings(word)) if posting[0] in live]
+				if not values:
+					continue
+				terms[word] = [len(postings) // 2, len(values)]
+				for index, position in values:
+					postings.append(index)
+					postings.append(position)
+
+			if self.postings is not None:
+				self.postings.close()
+				self.postings = None
+			with open(self.__path("postings.bin.tmp"), "wb") as f:
+				f.write(_fromInt32s(array("i", postings)))
+			os.rename(self.__path("postings.bin.tmp"), self.__path("postings.bin"))
+
+			documents = self.documents.size // _DOCUMENT.size
+			with open(self.__path("lexicon.json.tmp"), "w") as f:
+				json.dump({"documents": documents, "terms": terms}, f)
+			os.rename(self.__path("lexicon.json.tmp"), self.__path("lexicon.json"))
+
+			for f in (self.texts, self.offsets, self.positions, self.spaces, self.documents):
+				f.file.flush()
+
+			self.lexicon = terms
+			self.indexedDocuments = documents
+			self.postings = _AppendFile(self.__path("postings.bin"))
+			self.pending = defaultdict(list)
+
+	def __close(self):
+		for f in (self.texts, self.offsets, self.positions, self.spaces, self.documents,
+				self.postings):
+			if f is not None:
+				f.close()
+
+	def close(self):
+		"""Writes out the inverted index and closes the store's files"""
+		with self.lock:
+			self.flush()
+			self.__close()
+
+	def stats(self):
+		"""Returns a dict of the number of documents, tokens and distinct words stored"""
+		with self.lock:
+			return {"documents": len(self.documentIndexes), "tokens": self.tokenCount,
+				"words": len(set(self.lexicon) | set(self.pending))}
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+import unittest, shutil, tempfile
+from mimir.mimir_local import *
+from mimir.mimir_fake import MimirFakeServer
+from mimir.mimir_helpers import MimirHelper
+
+class TestMimirLocalIndex(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+		self.fake = MimirFakeServer(documents=20, documentLength=30)
+		self.index = MimirLocalIndex(self.directory)
+		self.mimir = MimirHelper(self.fake.start(), cache=self.index)
+		with self.mimir.query("{Token}") as resultSet:
+			self.results = list(resultSet.results(workers=4))
+
+	def tearDown(self):
+		self.mimir.shutdown()
+		self.fake.shutdown()
+		self.index.close()
+		shutil.rmtree(self.directory)
+
+	def expected(self, words, documentIds=None):
+		hits = []
+		for documentId in documentIds or self.index.documentIds():
+			text = [word.lower() for word in self.fake.words(documentId)]
+			for position in range(len(text) - len(words) + 1):
+				if text[position:position + len(words)] == words:
+					hits.append((documentId, position, len(words)))
+		return sorted(hits)
+
+	def hits(self, query, helper=None):
+		return sorted((hit.documentId, hit.termPosition, hit.length) for hit in self.index.search(query, helper))
+
+	def testFetchedDocumentsStored(self):
+		self.assertEqual(len(self.index), 20)
+		result = self.results[5]
+		self.assertEqual(self.index.documentText(result.documentId), result.text)
+		requests = self.fake.requests
+		tokens = self.mimir.documentTextTokens("closed", 5, documentId=result.documentId)
+		self.assertEqual(tokens.text, result.text)
+		self.assertEqual(list(tokens.positions), list(result.tokens.positions))
+		self.assertEqual(self.fake.requests, requests)
+
+	def testTermAndPhraseQueries(self):
+		self.assertEqual(self.hits(u"Mímir"), self.expected([u"mímir"]))
+		self.assertEqual(self.hits(u'"near the"'), self.expected([u"near", u"the"]))
+		self.assertTrue(self.hits(u"near the"))
+		self.assertEqual(self.hits(u"unknown"), [])
+		with self.assertRaises(ValueError):
+			self.index.search(u"{Token}")
+
+	def testHighlight(self):
+		documentId = self.results[0].documentId
+		hits = self.index.search(u"the")
+		highlighted = self.index.highlight(documentId, hits, u"[", u"]")
+		self.assertEqual(highlighted.replace(u"[", u"").replace(u"]", u""), self.results[0].text)
+		self.assertEqual(highlighted.count(u"[the]"),
+			len([hit for hit in hits if hit.documentId == documentId]))
+
+	def testServerFallback(self):
+		self.index.invalidate(self.results[0].documentId)
+		hits = self.index.search(u"{Token}", self.mimir)
+		self.assertEqual(sorted(set(hit.documentId for hit in hits)), sorted(self.index.documentIds()))
+		self.assertEqual(len(hits), 2 * 19)
+
+	def testReopen(self):
+		expected = self.hits(u"lazy dog")
+		self.index.invalidate(self.results[1].documentId)
+		self.index.close()
+		self.index = MimirLocalIndex(self.directory)
+		self.assertEqual(len(self.index), 19)
+		self.assertEqual(self.hits(u"lazy dog"),
+			[hit for hit in expected if hit[0] != self.results[1].documentId])
+
+		self.index.add(self.results[1].documentId, self.results[1].tokens)
+		self.assertEqual(self.hits(u"lazy dog"), expected)
+		self.index.invalidate()
+		self.assertEqual(len(self.index), 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+import threading, cProfile, pstats
+try:
+	from StringIO import StringIO
+except ImportError:
+	from io import StringIO
+from contextlib import contextmanager
+
+# Upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1, 2, 5, 10, float("inf"))
+
+class MimirCallStats(object):
+	"""Counters and a latency histogram for the calls to one Mimir endpoint"""
+	def __init__(self):
+		self.calls = 0
+		self.errors = 0
+		self.bytes = 0
+		self.seconds = 0.0
+		self.waitSeconds = 0.0
+		self.readSeconds = 0.0
+		self.parseSeconds = 0.0
+		self.retries = 0
+		self.cacheHits = 0
+		self.cacheMisses = 0
+		self.histogram = [0] * len(LATENCY_BUCKETS)
+
+	def asDict(self):
+		stats = dict(self.__dict__)
+		stats["histogram"] = list(zip(LATENCY_BUCKETS, self.histogram))
+		return stats
+
+class MimirMetrics(object):
+	"""
+		Collects per-endpoint statistics of the calls made by a MimirHelper.
+
+		Each call records its total time, split into waitSeconds until the
+		response started, readSeconds receiving the body and parseSeconds
+		parsing it, along with the bytes received and whether it failed.
+		Retries and cache hits and misses are counted against the endpoint
+		they saved or repeated.
+
+		Hooks added with addHook are called with a dict describing every call,
+		to feed an external metrics system. snapshot returns the totals so far.
+
+		Safe to share between threads.
+	"""
+	def __init__(self):
+		self.lock = threading.Lock()
+		self.endpoints = {}
+		self.hooks = []
+		self.profiles = []
+
+	def addHook(self, hook):
+		"""Calls hook(event) after every call, with the fields passed to record"""
+		self.hooks.append(hook)
+
+	def removeHook(self, hook):
+		self.hooks.remove(hook)
+
+	def __stats(self, path):
+		stats = self.endpoints.get(path)
+		if stats is None:
+			stats = self.endpoints[path] = MimirCallStats()
+		return stats
+
+	def record(self, path, seconds, bytes = 0, waitSeconds = 0.0, readSeconds = 0.0,
+			parseSeconds = 0.0, error = False):
+		"""Records one call to the endpoint at path"""
+		with self.lock:
+			stats = self.__stats(path)
+			stats.calls += 1
+			stats.errors += int(error)
+			stats.bytes += bytes
+			stats.seconds += seconds
+			stats.waitSeconds += waitSeconds
+			stats.readSeconds += readSeconds
+			stats.parseSeconds += parseSeconds
+			for index, bound in enumerate(LATENCY_BUCKETS):
+				if seconds <= bound:
+					stats.histogram[index] += 1
+					break
+
+		if self.hooks:
+			event = {"path": path, "seconds": seconds, "bytes": bytes,
+				"waitSeconds": waitSeconds, "readSeconds": readSeconds,
+				"parseSeconds": parseSeconds, "error": error}
+			for hook in list(self.hooks):
+				hook(event)
+
+	def increment(self, counter, path, count = 1):
+		"""Adds to one of the retries, cacheHits or cacheMisses counters of path"""
+		with self.lock:
+			stats = self.__stats(path)
+			setattr(stats, counter, getattr(stats, counter) + count)
+
+		if self.hooks:
+			event = {"path": path, counter: count}
+			for hook in list(self.hooks):
+				hook(event)
+
+	def snapshot(self):
+		"""Returns a dict of endpoint path to a dict of its statistics so far"""
+		with self.lock:
+			return dict((path, stats.asDict()) for path, stats in self.endpoints.items())
+
+	def reset(self):
+		with self.lock:
+			self.endpoints.clear()
+			self.profiles = []
+
+	@contextmanager
+	def profiling(self):
+		"""
+			Profiles the calling thread for the duration of the block. The
+			results are kept for profileReport.
+		"""
+		profile = cProfile.Profile()
+		profile.enable()
+		try:
+			yield profile
+		finally:
+			profile.disable()
+			with self.lock:
+				self.profiles.append(profile)
+
+	def profileReport(self, limit = 20, restriction = "mimir"):
+		"""
+			Returns the functions with the most cumulative time over every
+			profiled block, as text, by default only those of this library.
+		"""
+		with self.lock:
+			profiles = list(self.profiles)
+		if not profiles:
+			return ""
+
+		out = StringIO()
+		stats = pstats.Stats(profiles[0], stream = out)
+		for profile in profiles[1:]:
+			stats.add(profile)
+		stats.sort_stats("cumulative").print_stats(restriction, limit)
+		return out.getvalue()
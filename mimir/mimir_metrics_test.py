@@ -0,0 +1,96 @@
+import unittest, random
+from mimir.mimir_metrics import *
+from mimir.mimir_cache import MimirDocumentCache
+from mimir.mimir_fake import MimirFakeServer
+from mimir.mimir_governor import MimirRetry
+from mimir.mimir_helpers import MimirHelper
+
+class TestMimirMetrics(unittest.TestCase):
+	def testRecordPerPath(self):
+		metrics = MimirMetrics()
+		metrics.record("documentId", 0.003, bytes=100, waitSeconds=0.002, parseSeconds=0.001)
+		metrics.record("documentId", 0.3, bytes=50, error=True)
+		metrics.record("postQuery", 0.01)
+
+		snapshot = metrics.snapshot()
+		self.assertEqual(sorted(snapshot), ["documentId", "postQuery"])
+		stats = snapshot["documentId"]
+		self.assertEqual(stats["calls"], 2)
+		self.assertEqual(stats["errors"], 1)
+		self.assertEqual(stats["bytes"], 150)
+		self.assertAlmostEqual(stats["seconds"], 0.303)
+		self.assertAlmostEqual(stats["waitSeconds"], 0.002)
+
+		histogram = dict(stats["histogram"])
+		self.assertEqual(histogram[0.005], 1)
+		self.assertEqual(histogram[0.5], 1)
+		self.assertEqual(sum(histogram.values()), 2)
+
+	def testCountersAndHooks(self):
+		metrics = MimirMetrics()
+		events = []
+		metrics.addHook(events.append)
+		metrics.increment("cacheHits", "documentText")
+		metrics.increment("retries", "documentText", 2)
+		metrics.record("documentText", 0.1)
+		metrics.removeHook(events.append)
+		metrics.record("documentText", 0.1)
+
+		stats = metrics.snapshot()["documentText"]
+		self.assertEqual(stats["cacheHits"], 1)
+		self.assertEqual(stats["retries"], 2)
+		self.assertEqual(stats["calls"], 2)
+		self.assertEqual(len(events), 3)
+		self.assertEqual(events[2]["path"], "documentText")
+
+	def testReset(self):
+		metrics = MimirMetrics()
+		metrics.record("close", 0.1)
+		metrics.reset()
+		self.assertEqual(metrics.snapshot(), {})
+
+	def testProfiling(self):
+		metrics = MimirMetrics()
+		self.assertEqual(metrics.profileReport(), "")
+		with metrics.profiling():
+			metrics.record("documentId", 0.1)
+		self.assertIn("record", metrics.profileReport())
+
+class TestMimirHelperMetrics(unittest.TestCase):
+	def testCallsRecorded(self):
+		metrics = MimirMetrics()
+		with MimirFakeServer(documents=20, documentLength=30) as fake:
+			with MimirHelper(fake.endpoint, metrics=metrics, cache=MimirDocumentCache(),
+					retry=MimirRetry(attempts=50, backoff=0.001)) as mimir:
+				with mimir.query("{Token}") as resultSet:
+					documentId = resultSet.documentId(0)
+					resultSet.documentTextTokens(0, documentId=documentId)
+					resultSet.documentTextTokens(0, documentId=documentId)
+					self.assertEqual(len(list(resultSet.iterDocumentHits(0))), 2)
+
+					random.seed(1)
+					fake.errorRate = 0.5
+					for rank in range(10):
+						resultSet.documentId(rank)
+					fake.errorRate = 0.0
+
+		snapshot = metrics.snapshot()
+		for path in ("postQuery", "documentsCountSync", "documentText", "close"):
+			self.assertEqual(snapshot[path]["calls"], 1)
+			self.assertEqual(snapshot[path]["errors"], 0)
+		self.assertGreater(snapshot["documentText"]["bytes"], 0)
+
+		text = snapshot["documentText"]
+		self.assertEqual((text["cacheMisses"], text["cacheHits"]), (1, 1))
+
+		hits = snapshot["documentHits"]
+		self.assertEqual((hits["calls"], hits["errors"]), (1, 0))
+		self.assertGreater(hits["bytes"], 0)
+
+		ids = snapshot["documentId"]
+		self.assertGreater(ids["retries"], 0)
+		self.assertEqual(ids["errors"], ids["retries"])
+		self.assertEqual(ids["calls"], 11 + ids["retries"])
+
+if __name__ == '__main__':
+    unittest.main()
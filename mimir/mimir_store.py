@@ -0,0 +1,201 @@
+"""
+	On-disk, memory-mapped copies of the results of a query, for result sets
+	larger than memory.
+"""
+import mmap, os, struct, sys
+from array import array
+
+from .mimir_helpers import MimirDocumentHits, _fetchInOrder
+
+# Every table is a flat file of little-endian integers:
+#   ids.bin          int64 documentId of each rank
+#   offsets.bin      int64 start of each rank's UTF-8 text in text.bin, and
+#                    the end of the last
+#   hitOffsets.bin   int64 first hit of each rank in hits.bin, and the end
+#                    of the last
+#   hits.bin         int32 termPosition and length of each hit
+_INT64 = struct.Struct("<q")
+_TABLES = ("ids.bin", "offsets.bin", "hitOffsets.bin", "hits.bin", "text.bin")
+
+def _map(path):
+	"""Returns a read-only memory map of the file at path, or None if it is empty"""
+	with open(path, "rb") as f:
+		if not os.fstat(f.fileno()).st_size:
+			return None
+		return mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+
+class MimirResultStore(object):
+	"""
+		The documentId, text and hits of every rank of a query, kept in files
+		in a directory and read through memory maps.
+
+		Any rank's text and hits can be read without loading the others, and
+		textBytes and hitPairs read them without copying where the platform
+		allows. The operating system shares the mapped pages between every
+		process that opens the same directory. Stores pickle as their
+		directory, so they can be passed to worker processes without
+		serialising their contents.
+
+		Write one with MimirResultStore.write.
+	"""
+	def __init__(self, directory):
+		"""
+			Opens the store written to directory
+
+			@throws IOError if the directory does not hold a store
+		"""
+		self.directory = directory
+		self.maps = dict((name, _map(os.path.join(directory, name))) for name in _TABLES)
+		self.count = len(self.maps["ids.bin"] or b"") // 8
+		self.closed = False
+
+	@classmethod
+	def write(cls, resultSet, directory, workers = 1, window = None, stream = False,
+			limit = None):
+		"""
+			Fetches the documentId, text and hits of every rank of resultSet,
+			appending each to the files of a store in directory as it arrives,
+			and returns the opened store. At most window ranks are held in
+			memory at once, see MimirResultSet.results.
+
+			@throws RequestException if there was a problem with the request
+			@throws MimirException if there was a problem with the mimir query or
+				response could not be read
+			@throws xml.etree.ElementTree.ParseError if parse was not possible on response
+		"""
+		if not os.path.isdir(directory):
+			os.makedirs(directory)
+
+		files = dict((name, open(os.path.join(directory, name), "wb")) for name in _TABLES)
+		try:
+			textEnd = 0
+			hitEnd = 0
+			files["offsets.bin"].write(_INT64.pack(0))
+			files["hitOffsets.bin"].write(_INT64.pack(0))
+
+			fetchers = [resultSet.documentId, resultSet.documentText, resultSet.documentHits]
+			for rank, (documentId, text, hits) in _fetchInOrder(fetchers,
+					resultSet.ranks(stream, limit), max(workers, 1), window):
+				text = text.encode("utf-8")
+				files["text.bin"].write(text)
+				textEnd += len(text)
+
+				pairs = array("i")
+				for termPosition, length in zip(hits.termPositions, hits.lengths):
+					pairs.append(termPosition)
+					pairs.append(length)
+				if sys.byteorder != "little":
+					pairs.byteswap()
+				files["hits.bin"].write(pairs.tobytes() if hasattr(pairs, "tobytes") else pairs.tostring())
+				hitEnd += len(hits)
+
+				files["offsets.bin"].write(_INT64.pack(textEnd))
+				files["hitOffsets.bin"].write(_INT64.pack(hitEnd))
+				files["ids.bin"].write(_INT64.pack(documentId))
+		finally:
+			for f in files.values():
+				f.close()
+
+		return cls(directory)
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, excType, excValue, traceback):
+		self.close()
+
+	def close(self):
+		"""
+			Releases the store's memory maps. A file is unmapped once no view
+			returned by textBytes or hitPairs is still held, so views already
+			returned stay readable. Reading the store itself afterwards raises
+			ValueError.
+		"""
+		# Closing a map with views exported raises BufferError on Python 3,
+		# and invalidates them on Python 2, so leave the unmapping to the
+		# last reference
+		self.maps = dict((name, None) for name in _TABLES)
+		self.closed = True
+
+	def __getstate__(self):
+		return {"directory": self.directory}
+
+	def __setstate__(self, state):
+		self.__init__(state["directory"])
+
+	def __len__(self):
+		return self.count
+
+	def __int64(self, table, index):
+		return _INT64.unpack_from(self.maps[table], index * 8)[0]
+
+	def __rank(self, rank):
+		if self.closed:
+			raise ValueError("store is closed")
+		if rank < 0:
+			rank += self.count
+		if not 0 <= rank < self.count:
+			raise IndexError("Rank %d out of range" % rank)
+		return rank
+
+	def __view(self, table, start, end):
+		"""Returns bytes start to end of a table, without copying where possible"""
+		mapped = self.maps[table]
+		if mapped is None or start == end:
+			return b""
+		try:
+			return memoryview(mapped)[start:end]
+		except TypeError:
+			return buffer(mapped, start, end - start)
+
+	def documentId(self, rank):
+		return self.__int64("ids.bin", self.__rank(rank))
+
+	def textBytes(self, rank):
+		"""
+			Returns the UTF-8 text of the document at rank as a read-only view
+			of the mapped file
+		"""
+		rank = self.__rank(rank)
+		return self.__view("text.bin", self.__int64("offsets.bin", rank),
+			self.__int64("offsets.bin", rank + 1))
+
+	def text(self, rank):
+		"""Returns the text of the document at rank as a string"""
+		return bytes(self.textBytes(rank)).decode("utf-8")
+
+	def hitPairs(self, rank):
+		"""
+			Returns the termPosition and length of each hit at rank, alternating,
+			as a read-only view of the mapped file where the platform allows,
+			else as an array
+		"""
+		rank = self.__rank(rank)
+		view = self.__view("hits.bin", self.__int64("hitOffsets.bin", rank) * 8,
+			self.__int64("hitOffsets.bin", rank + 1) * 8)
+		if isinstance(view, memoryview) and sys.byteorder == "little":
+			return view.cast("i")
+
+		pairs = array("i")
+		if hasattr(pairs, "frombytes"):
+			pairs.frombytes(bytes(view))
+		else:
+			pairs.fromstring(bytes(view))
+		if sys.byteorder != "little":
+			pairs.byteswap()
+		return pairs
+
+	def hits(self, rank):
+		"""Returns the hits of the document at rank as MimirDocumentHits"""
+		pairs = self.hitPairs(rank)
+		termPositions = array("l", pairs[0::2])
+		lengths = array("l", pairs[1::2])
+		documentIds = array("l", [self.documentId(rank)] * len(termPositions))
+		return MimirDocumentHits(documentIds, termPositions, lengths)
+
+	def __iter__(self):
+		"""Yields the (documentId, text, hits) of every rank in order"""
+		if self.closed:
+			raise ValueError("store is closed")
+		for rank in range(self.count):
+			yield self.documentId(rank), self.text(rank), self.hits(rank)
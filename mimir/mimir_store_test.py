@@ -0,0 +1,74 @@
+import unittest, pickle, shutil, tempfile
+from multiprocessing.pool import Pool
+from mimir.mimir_store import *
+from mimir.mimir_fake import MimirFakeServer
+from mimir.mimir_helpers import MimirHelper
+
+def _hitCount(args):
+	store, rank = args
+	return len(store.hits(rank))
+
+class TestMimirResultStore(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+		self.fake = MimirFakeServer(documents=30, documentLength=25, hitsPerDocument=3)
+		self.mimir = MimirHelper(self.fake.start())
+
+	def tearDown(self):
+		self.mimir.shutdown()
+		self.fake.shutdown()
+		shutil.rmtree(self.directory)
+
+	def testWriteAndRead(self):
+		with self.mimir.query("{Token}") as resultSet:
+			expected = list(resultSet.results(workers=4))
+			store = MimirResultStore.write(resultSet, self.directory, workers=4)
+
+		with store:
+			self.assertEqual(len(store), 30)
+			for rank, result in enumerate(expected):
+				self.assertEqual(store.documentId(rank), result.documentId)
+				self.assertEqual(store.text(rank), result.text)
+				self.assertEqual(bytes(store.textBytes(rank)), result.text.encode("utf-8"))
+				self.assertEqual([(hit.documentId, hit.termPosition, hit.length) for hit in store.hits(rank)],
+					[(hit.documentId, hit.termPosition, hit.length) for hit in result.hits])
+			self.assertEqual(list(store.hitPairs(-1)), [0, 1, 8, 1, 16, 1])
+			self.assertEqual([documentId for documentId, text, hits in store],
+				[result.documentId for result in expected])
+			with self.assertRaises(IndexError):
+				store.documentId(30)
+
+	def testViewsOutliveClose(self):
+		with self.mimir.query("{Token}") as resultSet:
+			store = MimirResultStore.write(resultSet, self.directory, limit=2)
+
+		with store:
+			expected = store.text(1)
+			text = store.textBytes(1)
+			pairs = store.hitPairs(1)
+		self.assertEqual(bytes(text).decode("utf-8"), expected)
+		self.assertEqual(list(pairs), [0, 1, 8, 1, 16, 1])
+
+		for read in (store.documentId, store.text, store.textBytes, store.hitPairs, store.hits):
+			with self.assertRaises(ValueError):
+				read(0)
+
+	def testLimitAndSharing(self):
+		with self.mimir.query("{Token}") as resultSet:
+			MimirResultStore.write(resultSet, self.directory, limit=5).close()
+
+		store = MimirResultStore(self.directory)
+		self.assertEqual(len(store), 5)
+		copy = pickle.loads(pickle.dumps(store))
+		self.assertEqual(copy.text(4), store.text(4))
+		pool = Pool(2)
+		try:
+			self.assertEqual(pool.map(_hitCount, [(store, rank) for rank in range(5)]), [3] * 5)
+		finally:
+			pool.close()
+			pool.join()
+		copy.close()
+		store.close()
+
+if __name__ == '__main__':
+    unittest.main()
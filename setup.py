@@ -9,5 +9,10 @@ setup(	name='mimir-python',
 		packages=['mimir'],
 		install_requires=[
 			'requests'
-			]
+			],
+		extras_require={
+			'async': ['aiohttp'],
+			'sets': ['numpy'],
+			'xml': ['lxml']
+			}
 	 )